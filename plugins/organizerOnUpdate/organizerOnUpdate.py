@@ -4,6 +4,7 @@ import sys
 import stashapi.log as log
 from stashapi.stashapp import StashInterface
 
+from progress import ProgressReporter
 from scene_information import SceneInformation
 
 per_page = 100
@@ -119,11 +120,14 @@ def process_all_scenes():
     all_scenes = stash.find_scenes({}, {}, get_count=True)
     log.info("{} scenes to process.".format(all_scenes[0]))
 
+    reporter = ProgressReporter(len(all_scenes[1]), log.progress, log.info)
     for scene in all_scenes[1]:
         log.debug("processing scene: {}".format(scene))
         scene_information = SceneInformation(scene)
 
         process_single_scene(scene_information)
+        reporter.advance()
+    reporter.finish()
 
     return None
 
@@ -0,0 +1,109 @@
+import time
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class ProgressReporter:
+    """Report the progress of a task to Stash without a message per item.
+
+    The progress bar goes from `start` to `end` as `advance()` is called for
+    the `total` items, and is only sent when it moved by `step` or when
+    `interval` seconds passed since the last one. Every `info_interval`
+    seconds an info line gives the rate and the remaining time.
+
+    `done` items are already done (resumed task), they don't count in the rate.
+    `progress` and `info` are the logging functions of the plugin
+    (log.LogProgress/log.LogInfo, or stashapi's log.progress/log.info).
+    """
+
+    def __init__(
+        self,
+        total: int,
+        progress,
+        info=None,
+        step=0.01,
+        interval=2.0,
+        info_interval=30.0,
+        start=0.0,
+        end=1.0,
+        unit="scenes",
+        done=0,
+    ):
+        self.total = total
+        self._progress = progress
+        self._info = info
+        self.step = step
+        self.interval = interval
+        self.info_interval = info_interval
+        self.start = start
+        self.end = end
+        self.unit = unit
+        self.done = done
+        self._initial = done
+        self.sent = 0
+        self._started = time.monotonic()
+        self._last_value = None
+        self._last_sent = self._started
+        self._last_info = self._started
+
+    @property
+    def value(self) -> float:
+        if not self.total:
+            return self.end
+        return self.start + (self.end - self.start) * min(self.done, self.total) / self.total
+
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self._started
+        return (self.done - self._initial) / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        """Seconds left at the current rate, None before the first item."""
+        rate = self.rate()
+        if not rate:
+            return None
+        return max(self.total - self.done, 0) / rate
+
+    def status(self) -> str:
+        percent = self.done * 100 / self.total if self.total else 100
+        text = f"{self.done}/{self.total} {self.unit} ({percent:.1f}%), {self.rate():.1f} {self.unit}/s"
+        eta = self.eta()
+        if eta is not None:
+            text += f", ETA {format_duration(eta)}"
+        return text
+
+    def _send(self, now: float):
+        value = self.value
+        self._progress(value)
+        self._last_value = value
+        self._last_sent = now
+        self.sent += 1
+
+    def advance(self, count=1):
+        self.done += count
+        now = time.monotonic()
+        value = self.value
+        if (
+            self._last_value is None
+            or value - self._last_value >= self.step
+            or (now - self._last_sent >= self.interval and value != self._last_value)
+        ):
+            self._send(now)
+        if self._info and self.info_interval and now - self._last_info >= self.info_interval:
+            self._info(f"Progress: {self.status()}")
+            self._last_info = now
+
+    def finish(self):
+        """Send the last value and a summary line."""
+        now = time.monotonic()
+        if self._last_value != self.value:
+            self._send(now)
+        if self._info:
+            elapsed = format_duration(now - self._started)
+            self._info(f"Done: {self.done - self._initial} {self.unit} in {elapsed} ({self.rate():.1f} {self.unit}/s)")
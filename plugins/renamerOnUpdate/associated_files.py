@@ -0,0 +1,78 @@
+import os
+import threading
+
+
+class AssociatedFiles:
+    """Find the files going with a video (subtitles, funscripts...) in its folder.
+
+    Each folder is listed once with os.scandir and the listing is kept for
+    the run (and updated as files are moved), instead of checking one path
+    per extension. A sibling belongs to the video if it starts with the
+    video's name without extension, followed by a dot, and ends with one of
+    the extensions: "movie.srt" and "movie.en.srt" both go with "movie.mp4".
+    If two videos share the start of their name ("movie.mp4" and
+    "movie.2.mp4"), a sibling goes with the longest one ("movie.2.srt").
+    """
+
+    def __init__(self, extensions):
+        self.extensions = {ext.lower().lstrip(".") for ext in extensions or []}
+        self.listings = {}
+        self.scans = 0
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Forget the listings (a new run: files may have been added since)."""
+        with self._lock:
+            self.listings = {}
+
+    def _listing(self, folder: str) -> set:
+        key = os.path.normcase(folder)
+        listing = self.listings.get(key)
+        if listing is None:
+            try:
+                with os.scandir(folder) as it:
+                    listing = {entry.name for entry in it if entry.is_file()}
+            except OSError:
+                listing = set()
+            self.scans += 1
+            self.listings[key] = listing
+        return listing
+
+    def _is_associated(self, name: str) -> bool:
+        return name.rsplit(".", 1)[-1].lower() in self.extensions
+
+    def find(self, video_path: str) -> list:
+        """Return the names of the files going with the video, in its folder."""
+        if not self.extensions:
+            return []
+        folder, video = os.path.split(video_path)
+        stem = os.path.splitext(video)[0]
+        prefix = os.path.normcase(stem + ".")
+        with self._lock:
+            listing = self._listing(folder)
+            # other files in the folder that can own an associated file
+            stems = {
+                os.path.normcase(os.path.splitext(name)[0] + ".")
+                for name in listing
+                if not self._is_associated(name)
+            }
+            stems.add(prefix)
+            found = []
+            for name in listing:
+                key = os.path.normcase(name)
+                if name == video or not key.startswith(prefix) or not self._is_associated(name):
+                    continue
+                owner = max((s for s in stems if key.startswith(s)), key=len)
+                if owner == prefix:
+                    found.append(name)
+        return sorted(found)
+
+    def moved(self, old_path: str, new_path: str):
+        """Keep the listings up to date after a move."""
+        with self._lock:
+            old = self.listings.get(os.path.normcase(os.path.dirname(old_path)))
+            if old is not None:
+                old.discard(os.path.basename(old_path))
+            new = self.listings.get(os.path.normcase(os.path.dirname(new_path)))
+            if new is not None:
+                new.add(os.path.basename(new_path))
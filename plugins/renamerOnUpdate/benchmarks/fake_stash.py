@@ -0,0 +1,172 @@
+"""Local stand-in for the Stash GraphQL API, answering the queries of the plugin.
+
+Only the queries sent by renamerOnUpdate are known, matched by operation
+name. The scenes come from a synthetic.Library, with the path of their file
+read from the Stash database like Stash does: the renames of the plugin show
+in the next queries. The calls are counted per operation.
+"""
+
+import collections
+import json
+import os
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic import SCHEMA_VERSION
+from graphql_client import operation_name
+
+FILE_PATHS = (
+    "SELECT scenes_files.scene_id, folders.path, files.basename FROM scenes_files "
+    "JOIN files ON files.id = scenes_files.file_id JOIN folders ON folders.id = files.parent_folder_id "
+)
+# updated_at of every synthetic scene, an incremental run finds them all or none
+UPDATED_AT = "2024-01-01T00:00:00Z"
+
+
+class FakeStash:
+    def __init__(self, library, database_path: str):
+        self.library = library
+        self.database_path = database_path
+        self.calls = collections.Counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def server_connection(self, plugin_dir: str) -> dict:
+        """The server_connection of the plugin input, pointing to this server."""
+        return {"Scheme": "http", "Host": "127.0.0.1", "Port": self.port, "PluginDir": plugin_dir}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+    # GraphQL
+
+    def answer(self, query: str, variables: dict) -> dict:
+        name = operation_name(query)
+        with self._lock:
+            self.calls[name] += 1
+        variables = variables or {}
+        if name == "systemStatus":
+            return {"systemStatus": {"databaseSchema": SCHEMA_VERSION}}
+        if name == "Configuration":
+            return {
+                "configuration": {
+                    "general": {"databasePath": self.database_path, "stashes": [{"path": self.library.root}]}
+                }
+            }
+        if name == "FindScene":
+            scene_id = int(variables["id"])
+            if not 1 <= scene_id <= self.library.count:
+                return {"findScene": None}
+            return {"findScene": self._scenes(scene_id, scene_id)[0]}
+        if name == "LastUpdated":
+            return {"findScenes": {"scenes": [{"updated_at": UPDATED_AT}]}}
+        if name in ("FindScenes", "FindScenesByPath"):
+            return {"findScenes": self._find_scenes(variables)}
+        if name == "FindStudio":
+            studio_id = int(variables["id"])
+            studios = self.library.studios
+            return {"findStudio": studios[studio_id - 1] if 1 <= studio_id <= len(studios) else None}
+        if name == "FindStudios":
+            page, per_page = variables["filter"]["page"], variables["filter"]["per_page"]
+            studios = self.library.studios
+            return {
+                "findStudios": {
+                    "count": len(studios),
+                    "studios": studios[(page - 1) * per_page : page * per_page],
+                }
+            }
+        if name == "BulkSceneUpdate":
+            return {"bulkSceneUpdate": [{"id": i} for i in variables["input"]["ids"]]}
+        raise ValueError(f"unknown query {name}")
+
+    def _db(self) -> sqlite3.Connection:
+        # one connection per server thread
+        stash_db = getattr(self._local, "stash_db", None)
+        if stash_db is None:
+            stash_db = self._local.stash_db = sqlite3.connect(self.database_path, timeout=30)
+        return stash_db
+
+    def _paths(self, start: int, stop: int) -> dict:
+        rows = self._db().execute(f"{FILE_PATHS} WHERE scenes_files.scene_id BETWEEN ? AND ?", [start, stop])
+        return {scene_id: os.path.join(folder, basename) for scene_id, folder, basename in rows}
+
+    def _scenes(self, start: int, stop: int) -> list:
+        paths = self._paths(start, stop)
+        scenes = []
+        for scene_id in range(start, stop + 1):
+            scene = self.library.scene(scene_id)
+            scene["updated_at"] = UPDATED_AT
+            scene["files"][0]["path"] = paths.get(scene_id, scene["files"][0]["path"])
+            scenes.append(scene)
+        return scenes
+
+    def _find_scenes(self, variables: dict) -> dict:
+        scene_filter = variables.get("scene_filter") or {}
+        if "path" in scene_filter:
+            # duplicate check: scenes with this path, or this filename
+            value = scene_filter["path"]["value"]
+            if os.path.isabs(value):
+                rows = self._db().execute(
+                    f"{FILE_PATHS} WHERE folders.path = ? AND files.basename = ?",
+                    [os.path.dirname(value), os.path.basename(value)],
+                )
+            else:
+                rows = self._db().execute(f"{FILE_PATHS} WHERE files.basename = ?", [value])
+            found = [{"id": str(scene_id), "title": None} for scene_id, _, _ in rows]
+            return {"count": len(found), "scenes": found}
+        if "updated_at" in scene_filter and scene_filter["updated_at"]["value"] >= UPDATED_AT:
+            return {"count": 0, "scenes": []}
+        page, per_page = variables["filter"]["page"], variables["filter"]["per_page"]
+        start = (page - 1) * per_page + 1
+        stop = min(page * per_page, self.library.count)
+        return {"count": self.library.count, "scenes": self._scenes(start, stop) if start <= stop else []}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are separate writes, Nagle would hold the body for the ACK
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                try:
+                    payload = {"data": fake.answer(body["query"], body.get("variables"))}
+                except Exception as err:
+                    payload = {"error": {"errors": [str(err)]}}
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,216 @@
+"""Measure the renamer throughput on a synthetic library, without Stash.
+
+    python -m benchmarks.run                      # 1k, 10k and 100k scenes, hook and bulk
+    python -m benchmarks.run --sizes 1000 --check # compare to benchmarks/baseline.json
+    python -m benchmarks.run --save-baseline      # record the results as the new baseline
+
+Run from the plugin folder. For each size a library is generated in a
+temporary folder (sparse video files, Stash database), the plugin is copied
+next to a benchmark config.py and run as Stash runs it: a new process fed
+with the plugin input on stdin, talking to a local fake Stash.
+The hook is measured on a sample of scenes (one process per scene), then
+the task renames the whole library.
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_stash import FakeStash
+from benchmarks.synthetic import Library, create_database, create_files
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(PLUGIN_DIR, "benchmarks", "baseline.json")
+
+CONFIG = """from renamerOnUpdate_config import *  # noqa: F401,F403
+
+log_file = {log_file!r}
+log_level = {log_level!r}
+use_default_template = True
+default_template = "$date $title"
+p_use_default_template = True
+p_default_template = {path_template!r}
+"""
+
+
+def setup(size: int, workdir: str, log_level="info"):
+    """Generate the library, the database and the plugin copy, return the library."""
+    library = Library(size, os.path.join(workdir, "library"))
+    create_files(library)
+    create_database(library, os.path.join(workdir, "stash.sqlite"))
+    plugin_dir = os.path.join(workdir, "plugin")
+    os.makedirs(plugin_dir)
+    for path in glob.glob(os.path.join(PLUGIN_DIR, "*.py")):
+        # the benchmark config replaces the user's one
+        if os.path.basename(path) != "config.py":
+            shutil.copy(path, plugin_dir)
+    with open(os.path.join(plugin_dir, "config.py"), "w", encoding="utf-8") as f:
+        f.write(
+            CONFIG.format(
+                log_file=os.path.join(workdir, "rename_log.txt"),
+                log_level=log_level,
+                path_template=os.path.join(library.root, "$studio", "$year"),
+            )
+        )
+    return library
+
+
+def run_plugin(stash: FakeStash, workdir: str, args: dict) -> dict:
+    """Run the plugin once, return its JSON output."""
+    plugin_dir = os.path.join(workdir, "plugin")
+    fragment = {"server_connection": stash.server_connection(plugin_dir), "args": args}
+    with open(os.path.join(workdir, "plugin.log"), "ab") as stderr:
+        process = subprocess.run(
+            [sys.executable, os.path.join(plugin_dir, "renamerOnUpdate.py")],
+            input=json.dumps(fragment).encode("utf-8"),
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+            cwd=plugin_dir,
+            check=False,
+        )
+    lines = process.stdout.decode("utf-8").strip().splitlines()
+    output = json.loads(lines[-1]) if lines else {"output": None, "error": "no output"}
+    if process.returncode or output.get("error"):
+        raise RuntimeError(f"plugin failed ({output.get('error')}), see {workdir}/plugin.log")
+    return output
+
+
+def count_renamed(library: Library) -> int:
+    """Scenes whose file left the incoming folders."""
+    incoming = os.path.join(library.root, "incoming")
+    left = sum(len(files) for _, _, files in os.walk(incoming))
+    return library.count - left
+
+
+def measure(stash: FakeStash, workdir: str, name: str, scenes: int, runs) -> dict:
+    stash.reset_calls()
+    started = time.perf_counter()
+    for args in runs:
+        run_plugin(stash, workdir, args)
+    seconds = time.perf_counter() - started
+    return {
+        "mode": name,
+        "scenes": scenes,
+        "seconds": round(seconds, 3),
+        "scenes_per_second": round(scenes / seconds, 2),
+        "graphql_calls": dict(stash.calls),
+    }
+
+
+def benchmark(size: int, modes, hook_sample: int, keep=False, log_level="info") -> list:
+    # the random part can end with "_", which the path template would strip from the folder name
+    workdir = tempfile.mkdtemp(prefix=f"rou-bench-{size}-", suffix="-run")
+    results = []
+    try:
+        started = time.perf_counter()
+        library = setup(size, workdir, log_level)
+        print(f"[{size}] library generated in {time.perf_counter() - started:.1f}s ({workdir})", file=sys.stderr)
+        with FakeStash(library, os.path.join(workdir, "stash.sqlite")) as stash:
+            if "hook" in modes:
+                sample = min(size, hook_sample)
+                # spread over the library, one process per scene like Stash's hooks
+                ids = [1 + i * size // sample for i in range(sample)]
+                runs = [{"hookContext": {"id": scene_id, "type": "Scene.Update.Post"}} for scene_id in ids]
+                results.append(measure(stash, workdir, "hook", sample, runs))
+            if "bulk" in modes:
+                results.append(measure(stash, workdir, "bulk", size, [{"mode": "bulk_full"}]))
+            for result in results:
+                result["size"] = size
+            results[-1]["renamed"] = count_renamed(library)
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def load_baseline(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    """Return the regressions against the baseline.
+
+    A result is a regression when it is slower by more than the tolerance,
+    or when it sends more GraphQL queries of any operation: the number of
+    queries doesn't depend on the machine, one more round-trip per scene
+    fails the check.
+    """
+    regressions = []
+    for result in results:
+        reference = baseline.get(result["mode"], {}).get(str(result["size"]))
+        if not reference:
+            continue
+        name = f"{result['mode']} {result['size']}"
+        minimum = reference["scenes_per_second"] * (1 - tolerance)
+        if result["scenes_per_second"] < minimum:
+            regressions.append(
+                f"{name}: {result['scenes_per_second']} scenes/s, "
+                f"baseline {reference['scenes_per_second']} (-{tolerance:.0%} = {minimum:.2f})"
+            )
+        expected = reference.get("graphql_calls")
+        if expected is None:
+            continue
+        for operation, calls in sorted(result["graphql_calls"].items()):
+            if calls > expected.get(operation, 0):
+                regressions.append(
+                    f"{name}: {calls} {operation} queries, baseline {expected.get(operation, 0)}"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="library sizes, comma separated")
+    parser.add_argument("--modes", default="hook,bulk", help="hook and/or bulk")
+    parser.add_argument("--hook-sample", type=int, default=50, help="scenes renamed by the hook for each size")
+    parser.add_argument("--log-level", default="info", help="log_level of the plugin")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--check", action="store_true", help="exit with 1 on a regression against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="slowdown allowed by --check (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to the baseline")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the generated library")
+    args = parser.parse_args(argv)
+
+    modes = args.modes.split(",")
+    results = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        for result in benchmark(size, modes, args.hook_sample, args.keep, args.log_level):
+            results.append(result)
+            print(
+                f"{result['mode']:<5} {result['size']:>7} scenes: {result['scenes_per_second']:>9.2f} scenes/s "
+                f"({result['scenes']} in {result['seconds']}s), {sum(result['graphql_calls'].values())} GraphQL queries"
+            )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    baseline = load_baseline(args.baseline)
+    if args.save_baseline:
+        for result in results:
+            baseline.setdefault(result["mode"], {})[str(result["size"])] = {
+                key: result[key] for key in ("scenes_per_second", "seconds", "graphql_calls")
+            }
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if args.check:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
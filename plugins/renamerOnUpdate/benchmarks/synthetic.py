@@ -0,0 +1,207 @@
+"""Synthetic Stash library: scenes, the Stash database and the video files.
+
+Scenes are built from their id with a seeded random generator, so a library
+of any size takes no memory and is the same from one run to the next.
+"""
+
+import os
+import random
+import sqlite3
+
+# Stash database schema with scene codes and the files/folders tables (>= 32 and >= 38)
+SCHEMA_VERSION = 60
+
+STUDIO_WORDS = ["Blue", "Red", "Golden", "Silver", "North", "Night", "Summer", "Wild", "Pixel", "Velvet"]
+STUDIO_SUFFIXES = ["Studios", "Pictures", "Media", "Films", "Productions"]
+FIRST_NAMES = ["Alice", "Bella", "Chloe", "Diana", "Emma", "Fiona", "Grace", "Hannah", "Iris", "Julia", "Kate", "Lena"]
+LAST_NAMES = ["Adams", "Brooks", "Carter", "Dalton", "Evans", "Foster", "Grant", "Hayes", "Irwin", "Jones"]
+TAG_NAMES = [
+    "Outdoor", "Indoor", "HD", "4K", "Interview", "Behind the scenes", "Compilation", "Classic",
+    "Amateur", "Professional", "POV", "Solo", "Couple", "Group", "Vintage", "Remastered",
+]
+TITLE_WORDS = [
+    "summer", "night", "secret", "meeting", "beach", "city", "lights", "morning", "dream", "story",
+    "first", "last", "holiday", "road", "trip", "house", "party", "lesson", "game", "return",
+]
+CODECS = [("h264", "aac"), ("hevc", "aac"), ("h264", "mp3"), ("vp9", "opus")]
+RESOLUTIONS = [(1280, 720), (1920, 1080), (3840, 2160), (854, 480)]
+# files per folder of the incoming library
+FOLDER_SIZE = 1000
+
+
+class Library:
+    """N scenes with realistic studios (with parents), performers and tags."""
+
+    def __init__(self, scenes: int, root: str, seed=1, studios=None, performers=None):
+        self.count = scenes
+        self.root = root
+        self.seed = seed
+        rng = random.Random(seed)
+        studios = studios or max(10, scenes // 200)
+        performers = performers or max(20, scenes // 20)
+        self.studios = []
+        for i in range(1, studios + 1):
+            parent = self.studios[rng.randrange(len(self.studios))] if self.studios and rng.random() < 0.3 else None
+            name = f"{rng.choice(STUDIO_WORDS)} {rng.choice(STUDIO_WORDS)} {rng.choice(STUDIO_SUFFIXES)} {i}"
+            self.studios.append(
+                {
+                    "id": str(i),
+                    "name": name,
+                    "parent_studio": {"id": parent["id"], "name": parent["name"]} if parent else None,
+                }
+            )
+        self.performers = [
+            {
+                "id": str(i),
+                "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}",
+                "gender": "FEMALE" if rng.random() < 0.8 else "MALE",
+                "favorite": rng.random() < 0.1,
+                "rating100": rng.choice([None, 20, 40, 60, 80, 100]),
+                "stash_ids": [],
+            }
+            for i in range(1, performers + 1)
+        ]
+        self.tags = [{"id": str(i), "name": name} for i, name in enumerate(TAG_NAMES, 1)]
+
+    def folder(self, scene_id: int) -> str:
+        return os.path.join(self.root, "incoming", f"{(scene_id - 1) // FOLDER_SIZE:04d}")
+
+    def basename(self, scene_id: int) -> str:
+        return f"scene_{scene_id:07d}.mp4"
+
+    def path(self, scene_id: int) -> str:
+        return os.path.join(self.folder(scene_id), self.basename(scene_id))
+
+    def size(self, scene_id: int) -> int:
+        return random.Random(self.seed * 7919 + scene_id).randrange(100, 4000) * 1048576
+
+    def scene(self, scene_id: int) -> dict:
+        """The scene as returned by Stash's findScene/findScenes."""
+        rng = random.Random(self.seed * 1000003 + scene_id)
+        year = rng.randrange(2005, 2025)
+        date = f"{year}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}"
+        video_codec, audio_codec = rng.choice(CODECS)
+        width, height = rng.choice(RESOLUTIONS)
+        oshash = f"{rng.getrandbits(64):016x}"
+        checksum = f"{rng.getrandbits(128):032x}"
+        title = " ".join(rng.choice(TITLE_WORDS) for _ in range(rng.randrange(2, 6))).capitalize()
+        return {
+            "id": str(scene_id),
+            "title": title,
+            "date": date,
+            "rating100": rng.choice([None, 20, 40, 60, 80, 100]),
+            "organized": rng.random() < 0.9,
+            "updated_at": f"{year}-01-01T00:00:00Z",
+            "code": f"SC-{scene_id}",
+            "stash_ids": [],
+            "files": [
+                {
+                    "id": str(scene_id),
+                    "path": self.path(scene_id),
+                    "video_codec": video_codec,
+                    "audio_codec": audio_codec,
+                    "width": width,
+                    "height": height,
+                    "frame_rate": rng.choice([25, 29.97, 30, 60]),
+                    "duration": rng.randrange(300, 5400),
+                    "bit_rate": rng.randrange(2000000, 20000000),
+                    "phash": f"{rng.getrandbits(64):016x}",
+                    "oshash": oshash,
+                    "checksum": checksum,
+                    "fingerprints": [
+                        {"type": "oshash", "value": oshash},
+                        {"type": "md5", "value": checksum},
+                    ],
+                }
+            ],
+            "studio": rng.choice(self.studios) if rng.random() < 0.95 else None,
+            "tags": rng.sample(self.tags, rng.randrange(0, 6)),
+            "performers": rng.sample(self.performers, min(rng.randrange(0, 4), len(self.performers))),
+            "movies": [],
+        }
+
+    def scenes(self, start=1, stop=None):
+        for scene_id in range(start, min(stop or self.count, self.count) + 1):
+            yield self.scene(scene_id)
+
+
+def create_database(library: Library, path: str):
+    """Write the folders/files/scenes/scenes_files tables of Stash for the library."""
+    stash_db = sqlite3.connect(path)
+    stash_db.executescript(
+        """
+        CREATE TABLE folders (
+            id INTEGER PRIMARY KEY,
+            path varchar(255) NOT NULL,
+            basename varchar(255),
+            parent_folder_id integer,
+            zip_file_id integer,
+            mod_time datetime NOT NULL,
+            created_at datetime NOT NULL,
+            updated_at datetime NOT NULL
+        );
+        CREATE UNIQUE INDEX index_folders_on_path_unique ON folders (path);
+        CREATE INDEX index_folders_on_parent_folder_id ON folders (parent_folder_id);
+        CREATE TABLE files (
+            id INTEGER PRIMARY KEY,
+            basename varchar(255) NOT NULL,
+            zip_file_id integer,
+            parent_folder_id integer NOT NULL,
+            size integer NOT NULL,
+            mod_time datetime NOT NULL,
+            created_at datetime NOT NULL,
+            updated_at datetime NOT NULL
+        );
+        CREATE UNIQUE INDEX index_files_zip_basename_unique ON files (parent_folder_id, basename);
+        CREATE INDEX index_files_on_basename ON files (basename);
+        CREATE TABLE scenes (
+            id INTEGER PRIMARY KEY,
+            title varchar(255),
+            code text,
+            created_at datetime NOT NULL,
+            updated_at datetime NOT NULL
+        );
+        CREATE TABLE scenes_files (
+            scene_id integer NOT NULL,
+            file_id integer NOT NULL,
+            "primary" boolean NOT NULL,
+            PRIMARY KEY (scene_id, file_id)
+        );
+        CREATE INDEX index_scenes_files_file_id ON scenes_files (file_id);
+        """
+    )
+    now = "2024-01-01T00:00:00Z"
+    folder_ids = {}
+
+    def folder_id(folder: str) -> int:
+        if folder not in folder_ids:
+            parent = os.path.dirname(folder)
+            parent_id = folder_id(parent) if folder != library.root else None
+            folder_ids[folder] = len(folder_ids) + 1
+            stash_db.execute(
+                "INSERT INTO folders VALUES (?, ?, ?, ?, NULL, ?, ?, ?)",
+                [folder_ids[folder], folder, os.path.basename(folder), parent_id, now, now, now],
+            )
+        return folder_ids[folder]
+
+    folder_id(library.root)
+    for scene in library.scenes():
+        scene_id = int(scene["id"])
+        stash_db.execute(
+            "INSERT INTO files VALUES (?, ?, NULL, ?, ?, ?, ?, ?)",
+            [scene_id, library.basename(scene_id), folder_id(library.folder(scene_id)), library.size(scene_id), now, now, now],
+        )
+        stash_db.execute("INSERT INTO scenes VALUES (?, ?, ?, ?, ?)", [scene_id, scene["title"], scene["code"], now, now])
+        stash_db.execute("INSERT INTO scenes_files VALUES (?, ?, 1)", [scene_id, scene_id])
+    stash_db.commit()
+    stash_db.close()
+
+
+def create_files(library: Library):
+    """Create the video files, sparse: they have their size but use no disk space."""
+    for scene_id in range(1, library.count + 1):
+        folder = library.folder(scene_id)
+        if scene_id % FOLDER_SIZE == 1:
+            os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, library.basename(scene_id)), "wb") as f:
+            f.truncate(library.size(scene_id))
@@ -0,0 +1,168 @@
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+
+import log
+
+AVAILABLE = hasattr(socket, "AF_UNIX")
+
+
+def default_socket_path() -> str:
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    return os.path.join(tempfile.gettempdir(), f"renamerOnUpdate-{uid}.sock")
+
+
+def _send(sock: socket.socket, message: dict):
+    sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+def _receive(sock: socket.socket):
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    if not data:
+        return None
+    return json.loads(data.decode("utf-8"))
+
+
+def forward(path: str, request: dict, connect_timeout=1.0):
+    """Send a request to the resident renamer.
+
+    Return the daemon's response, or None if no daemon is listening (the
+    caller should then do the work in-process).
+    """
+    if not AVAILABLE or not os.path.exists(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(connect_timeout)
+            sock.connect(path)
+            # a rename can take a while (cross-device move), wait for it
+            sock.settimeout(None)
+            _send(sock, request)
+            return _receive(sock)
+    except (OSError, ValueError):
+        return None
+
+
+def spawn(script: str, fragment: dict, stderr_path=None):
+    """Start the resident renamer as a detached process."""
+    stderr = subprocess.DEVNULL
+    if stderr_path:
+        stderr = open(stderr_path, "a", encoding="utf-8")
+    process = subprocess.Popen(
+        [sys.executable, script],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=stderr,
+        cwd=os.path.dirname(script),
+        start_new_session=True,
+    )
+    process.stdin.write(json.dumps(fragment).encode("utf-8"))
+    process.stdin.close()
+    return process.pid
+
+
+class RenamerDaemon:
+    """Long-lived process serving hook renames over a Unix socket.
+
+    Everything loaded at startup (config, schema version, database path,
+    studio cache, HTTP pool) stays warm between hooks. The log lines of each
+    request are captured and sent back, so the hook process can print them
+    to Stash as if it did the work itself.
+    """
+
+    def __init__(self, path: str, handler, watched_files=(), idle_timeout=3600):
+        # handler(request) does the work, its log output is returned to the client
+        self.path = path
+        self.handler = handler
+        self.idle_timeout = idle_timeout
+        self.watched = {f: os.path.getmtime(f) for f in watched_files}
+        self.served = 0
+
+    def is_stale(self) -> bool:
+        """True if the config or the plugin changed since the daemon started."""
+        for f, mtime in self.watched.items():
+            try:
+                if os.path.getmtime(f) != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def _bind(self) -> socket.socket:
+        if os.path.exists(self.path):
+            if forward(self.path, {"cmd": "ping"}) is not None:
+                raise RuntimeError(f"A daemon is already listening on {self.path}")
+            os.remove(self.path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        os.chmod(self.path, 0o600)
+        server.listen(16)
+        if self.idle_timeout:
+            server.settimeout(self.idle_timeout)
+        return server
+
+    def _handle(self, request: dict) -> dict:
+        cmd = request.get("cmd")
+        if cmd == "ping":
+            return {"status": "ok", "served": self.served}
+        if cmd == "shutdown":
+            return {"status": "shutdown"}
+        if self.is_stale():
+            return {"status": "stale"}
+        output = io.StringIO()
+        # the log buffer is written to the stderr in place when flushed
+        log.flush()
+        stderr = sys.stderr
+        sys.stderr = output
+        status = "ok"
+        try:
+            self.handler(request)
+        except SystemExit as err:
+            # fatal error (e.g. expired session), let the hook retry in-process
+            status = "error"
+            log.LogError(f"[DAEMON] {err}")
+        except Exception as err:
+            log.LogError(f"[DAEMON] main function error: {err}")
+        finally:
+            log.flush()
+            sys.stderr = stderr
+        self.served += 1
+        return {"status": status, "log": output.getvalue()}
+
+    def serve(self):
+        server = self._bind()
+        log.LogInfo(f"[DAEMON] Listening on {self.path}")
+        try:
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    log.LogInfo("[DAEMON] Idle timeout reached, stopping")
+                    break
+                with conn:
+                    try:
+                        request = _receive(conn)
+                        if request is None:
+                            continue
+                        response = self._handle(request)
+                        _send(conn, response)
+                    except (OSError, ValueError) as err:
+                        log.LogWarning(f"[DAEMON] Bad request: {err}")
+                        continue
+                if response["status"] in ("shutdown", "stale"):
+                    log.LogInfo(f"[DAEMON] Stopping ({response['status']})")
+                    break
+        finally:
+            server.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        return self.served
@@ -0,0 +1,269 @@
+import os
+import sqlite3
+import time
+
+
+def normalize_path(path: str) -> str:
+    return os.path.normcase(os.path.normpath(path))
+
+
+class PathIndex:
+    """Every file path known to Stash, loaded once for a bulk run.
+
+    Duplicate checks become set lookups instead of findScenes queries. Renames
+    done (or planned) during the run are recorded so two scenes can't be given
+    the same target path.
+    """
+
+    def __init__(self, paths=()):
+        self.paths = set()
+        for path in paths:
+            self.add(path)
+
+    @classmethod
+    def load(cls, stash_db: sqlite3.Connection, file_refactor=True):
+        cursor = stash_db.cursor()
+        if file_refactor:
+            cursor.execute(
+                "SELECT folders.path, files.basename FROM files JOIN folders ON files.parent_folder_id = folders.id"
+            )
+            rows = (os.path.join(folder, basename) for folder, basename in cursor)
+        else:
+            cursor.execute("SELECT path FROM scenes")
+            rows = (row[0] for row in cursor)
+        index = cls(rows)
+        cursor.close()
+        return index
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __contains__(self, path: str):
+        return normalize_path(path) in self.paths
+
+    def add(self, path: str):
+        self.paths.add(normalize_path(path))
+
+    def discard(self, path: str):
+        self.paths.discard(normalize_path(path))
+
+    def move(self, old_path: str, new_path: str):
+        self.discard(old_path)
+        self.add(new_path)
+
+
+class FolderIndex:
+    """The folders table loaded once for a bulk run.
+
+    Folders are looked up by normalized path (path lookups can miss because
+    of normalization differences) and by (parent_folder_id, basename).
+    Folders inserted during the run are added to the index, so a deep new
+    destination tree is created level by level without a query per level.
+    """
+
+    INSERT = "INSERT INTO 'main'.'folders'('id', 'path', 'basename', 'parent_folder_id', 'mod_time', 'created_at', 'updated_at', 'zip_file_id') VALUES (?, ?, ?, ?, ?, ?, ?, ?);"
+
+    def __init__(self, stash_db: sqlite3.Connection):
+        self.stash_db = stash_db
+        self.by_path = {}
+        self.by_parent = {}
+        # (path key, parent key) of the folders inserted by this run, in order
+        self.inserted = []
+        cursor = stash_db.cursor()
+        cursor.execute("SELECT id, path, basename, parent_folder_id FROM folders")
+        max_id = 0
+        for folder_id, path, basename, parent_id in cursor:
+            self.by_path[normalize_path(path)] = folder_id
+            if parent_id is not None:
+                self.by_parent[(parent_id, basename or os.path.basename(path))] = folder_id
+            max_id = max(max_id, folder_id)
+        cursor.close()
+        self.next_id = max_id + 1
+
+    def __len__(self):
+        return len(self.by_path)
+
+    def get(self, path: str):
+        key = normalize_path(path)
+        if key in self.by_path:
+            return self.by_path[key]
+        parent = os.path.dirname(key)
+        if parent == key:
+            return None
+        parent_id = self.get(parent)
+        if parent_id is None:
+            return None
+        return self.by_parent.get((parent_id, os.path.basename(os.path.normpath(path))))
+
+    def _insert(self, path: str, parent_id, mod_time: str):
+        basename = os.path.basename(path)
+        values = [path, basename, parent_id, mod_time, mod_time, mod_time, None]
+        try:
+            self.stash_db.execute(self.INSERT, [self.next_id] + values)
+        except sqlite3.IntegrityError:
+            # Stash (e.g. a scan) inserted a folder since the index was loaded
+            self.next_id = self.stash_db.execute("SELECT MAX(id) from folders").fetchone()[0] + 1
+            self.stash_db.execute(self.INSERT, [self.next_id] + values)
+        folder_id = self.next_id
+        self.next_id += 1
+        path_key = normalize_path(path)
+        parent_key = (parent_id, basename)
+        self.by_path[path_key] = folder_id
+        self.by_parent[parent_key] = folder_id
+        self.inserted.append((path_key, parent_key))
+        return folder_id
+
+    def ensure(self, path: str, mod_time: str):
+        """Return the id of the folder, creating the missing levels.
+
+        Return None if no parent folder of the path is known to Stash (not in a library).
+        """
+        folder_id = self.get(path)
+        if folder_id is not None:
+            return folder_id
+        missing = [path]
+        parent = os.path.dirname(path)
+        while parent != missing[-1]:
+            parent_id = self.get(parent)
+            if parent_id is not None:
+                break
+            missing.append(parent)
+            parent = os.path.dirname(parent)
+        else:
+            return None
+        for folder in reversed(missing):
+            parent_id = self._insert(folder, parent_id, mod_time)
+        return parent_id
+
+    def forget_since(self, mark: int):
+        """Drop the folders inserted after `mark` (their insert was rolled back)."""
+        for path_key, parent_key in self.inserted[mark:]:
+            self.by_path.pop(path_key, None)
+            self.by_parent.pop(parent_key, None)
+        del self.inserted[mark:]
+
+
+class BulkDBWriter:
+    """Apply the database updates of a bulk run in bounded transactions.
+
+    Folder inserts and file updates go into one open transaction (sqlite3
+    keeps the statements prepared) and are committed every `max_renames`
+    renames or `max_seconds` seconds, also while no rename ends (see
+    `commit_due`). Each rename runs in its own savepoint
+    so a failing one can be undone alone. If a commit fails, the batch is
+    rolled back and `revert` is called with the file moves of that batch,
+    newest first, so the disk matches the database again.
+
+    The keys given to `end_rename` (plan offsets) are passed to `committed`
+    once their batch is committed, and dropped if it is rolled back: only
+    committed renames count as done.
+    """
+
+    def __init__(
+        self, stash_db: sqlite3.Connection, revert, max_renames=100, max_seconds=2.0, folders=None, committed=None
+    ):
+        self.stash_db = stash_db
+        self.revert = revert
+        self.committed = committed
+        # FolderIndex to keep in sync when inserts are rolled back
+        self.folders = folders
+        self.folders_mark_batch = 0
+        self.folders_mark_rename = 0
+        self.max_renames = max_renames
+        self.max_seconds = max_seconds
+        # (old path, new path) moved on disk in the open transaction
+        self.moves = []
+        # keys of the renames in the open transaction
+        self.keys = []
+        self.batch_renames = 0
+        self.batch_started = None
+        self.renames = 0
+        self.commits = 0
+        self.commit_time = 0.0
+        self.started = time.perf_counter()
+
+    def begin_rename(self):
+        if not self.stash_db.in_transaction:
+            self.stash_db.execute("BEGIN")
+            self.batch_started = time.perf_counter()
+            self.folders_mark_batch = self._folders_inserted()
+        self.stash_db.execute("SAVEPOINT rename")
+        self.folders_mark_rename = self._folders_inserted()
+
+    def _folders_inserted(self):
+        return len(self.folders.inserted) if self.folders else 0
+
+    def abort_rename(self):
+        self.stash_db.execute("ROLLBACK TO rename")
+        self.stash_db.execute("RELEASE rename")
+        if self.folders:
+            self.folders.forget_since(self.folders_mark_rename)
+
+    def end_rename(self, moves: list, key=None):
+        self.stash_db.execute("RELEASE rename")
+        self.moves.extend(moves)
+        if key is not None:
+            self.keys.append(key)
+        self.batch_renames += 1
+        if (
+            self.batch_renames >= self.max_renames
+            or time.perf_counter() - self.batch_started >= self.max_seconds
+        ):
+            self.commit()
+
+    def commit_due(self):
+        """Commit the open batch if it is max_seconds old.
+
+        Return the seconds left before the open batch is due, None if there
+        is none. Called while waiting for a slow move, so Stash isn't locked
+        out of its database during a long copy.
+        """
+        if not self.stash_db.in_transaction:
+            return None
+        left = self.batch_started + self.max_seconds - time.perf_counter()
+        if left > 0:
+            return left
+        self.commit()
+        return None
+
+    def commit(self):
+        if not self.stash_db.in_transaction:
+            return
+        start = time.perf_counter()
+        try:
+            self.stash_db.commit()
+        except sqlite3.Error:
+            self.rollback()
+            raise
+        self.commit_time += time.perf_counter() - start
+        self.commits += 1
+        self.renames += self.batch_renames
+        self.moves = []
+        self.batch_renames = 0
+        keys = self.keys
+        self.keys = []
+        if self.committed and keys:
+            self.committed(keys)
+
+    def rollback(self):
+        self.stash_db.rollback()
+        if self.folders:
+            self.folders.forget_since(self.folders_mark_batch)
+        moves = self.moves
+        self.moves = []
+        self.keys = []
+        self.batch_renames = 0
+        self.revert(list(reversed(moves)))
+
+    def close(self):
+        self.commit()
+        return self.stats()
+
+    def stats(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "renames": self.renames,
+            "commits": self.commits,
+            "commits_per_second": round(self.commits / elapsed, 2) if elapsed else 0,
+            "commit_time": round(self.commit_time, 3),
+        }
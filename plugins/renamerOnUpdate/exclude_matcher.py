@@ -0,0 +1,101 @@
+import re
+
+# patterns that can't be merged into one alternation: numbered/named back-references
+# (group numbers shift), named groups (names can collide) and global inline flags
+BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P[<=]")
+GLOBAL_FLAGS = re.compile(r"^\(\?[aiLmsux]+\)")
+
+
+class CategoryMatcher:
+    """The exclude patterns of one category, compiled once.
+
+    Exact patterns go into a dict keyed by their casefolded text, regexes are
+    merged into a single case-insensitive alternation with one named group
+    per pattern, so the pattern that matched can still be reported. A value
+    costs one dict lookup and one regex scan.
+    """
+
+    def __init__(self, category: str, patterns: dict):
+        self.category = category
+        self.exact = {}
+        self.regexes = []
+        self.separate = []
+        alternatives = []
+        for key, pattern_config in patterns.items():
+            pattern = pattern_config.get("pattern", "")
+            if pattern_config.get("type", "exact") != "regex":
+                self.exact.setdefault(pattern.casefold(), pattern)
+                continue
+            try:
+                compiled = re.compile(pattern, re.IGNORECASE)
+            except re.error as err:
+                raise ValueError(f"invalid {category} exclude pattern {key!r} ({err})") from None
+            if compiled.groupindex or BACKREFERENCE.search(pattern) or GLOBAL_FLAGS.match(pattern):
+                self.separate.append((pattern, compiled))
+                continue
+            alternatives.append(f"(?P<p{len(self.regexes)}>{pattern})")
+            self.regexes.append(pattern)
+        self.combined = re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+
+    def __bool__(self):
+        return bool(self.exact or self.combined or self.separate)
+
+    def match(self, value: str):
+        """Return the pattern matching the value, or None."""
+        pattern = self.exact.get(value.casefold())
+        if pattern is not None:
+            return pattern
+        if self.combined is not None:
+            found = self.combined.search(value)
+            if found:
+                return self.regexes[int(found.lastgroup[1:])]
+        for pattern, compiled in self.separate:
+            if compiled.search(value):
+                return pattern
+        return None
+
+
+class ExcludeMatcher:
+    """Tell if a scene is excluded by the exclude_*_patterns of the config.
+
+    A scene is excluded when one of its tags, its studio or parent studio,
+    or the path of its file matches a pattern of that category. Invalid
+    regexes raise ValueError here, at startup, instead of on every scene.
+    """
+
+    def __init__(self, tag_patterns=None, studio_patterns=None, path_patterns=None):
+        self.tags = CategoryMatcher("tag", tag_patterns or {})
+        self.studios = CategoryMatcher("studio", studio_patterns or {})
+        self.paths = CategoryMatcher("path", path_patterns or {})
+
+    def __bool__(self):
+        return bool(self.tags or self.studios or self.paths)
+
+    def match(self, stash_scene: dict):
+        """Return (category, pattern, matched value) of the first match, or None."""
+        if self.tags:
+            for tag in stash_scene.get("tags", []):
+                name = tag.get("name", "")
+                pattern = self.tags.match(name)
+                if pattern is not None:
+                    return "tag", pattern, name
+        if self.studios and stash_scene.get("studio"):
+            studio = stash_scene["studio"]
+            names = [studio.get("name", "")]
+            if studio.get("parent_studio"):
+                names.append(studio["parent_studio"].get("name", ""))
+            for name in names:
+                if not name:
+                    continue
+                pattern = self.studios.match(name)
+                if pattern is not None:
+                    return "studio", pattern, name
+        if self.paths:
+            current_path = stash_scene.get("path") or ""
+            if not current_path and stash_scene.get("files"):
+                current_path = stash_scene["files"][0].get("path", "")
+            if current_path:
+                pattern = self.paths.match(current_path)
+                if pattern is not None:
+                    return "path", pattern, current_path
+        return None
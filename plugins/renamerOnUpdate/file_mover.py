@@ -0,0 +1,202 @@
+import errno
+import os
+import shutil
+
+# large chunks: a 4K scene is tens of GB, each call copies this much without Python in the loop
+CHUNK_SIZE = 64 * 1024 * 1024
+# a copy in progress is written next to its destination under this name
+PART_SUFFIX = ".rou-part"
+# bytes compared at the end of a partial copy before resuming it
+RESUME_CHECK_SIZE = 1024 * 1024
+
+# errors meaning a zero-copy method isn't supported for these files, try the next one
+_UNSUPPORTED = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EBADF,
+    errno.EPERM,
+    # macOS sendfile only writes to sockets
+    getattr(errno, "ENOTSOCK", errno.EINVAL),
+    getattr(errno, "ENOTSUP", errno.EINVAL),
+    getattr(errno, "EOPNOTSUPP", errno.EINVAL),
+}
+
+
+def _copy_file_range(src_fd, dst_fd, offset, count):
+    return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+
+
+def _sendfile(src_fd, dst_fd, offset, count):
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+
+def _read_write(src_fd, dst_fd, offset, count):
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    data = os.read(src_fd, count)
+    view = memoryview(data)
+    while view:
+        view = view[os.write(dst_fd, view):]
+    return len(data)
+
+
+def copy_methods() -> list:
+    """Return the copy methods available here, fastest first."""
+    methods = []
+    if hasattr(os, "copy_file_range"):
+        methods.append(_copy_file_range)
+    if hasattr(os, "sendfile") and os.name == "posix":
+        methods.append(_sendfile)
+    methods.append(_read_write)
+    return methods
+
+
+def resume_offset(source: str, part: str) -> int:
+    """Return how many bytes of a partial copy can be kept (0 to start over)."""
+    try:
+        part_size = os.path.getsize(part)
+    except OSError:
+        return 0
+    if not part_size or part_size > os.path.getsize(source):
+        return 0
+    check = min(part_size, RESUME_CHECK_SIZE)
+    with open(source, "rb") as src, open(part, "rb") as dst:
+        src.seek(part_size - check)
+        dst.seek(part_size - check)
+        if src.read(check) != dst.read(check):
+            return 0
+    return part_size
+
+
+def copy_file(source: str, destination: str, progress=None, chunk_size=CHUNK_SIZE, methods=None) -> int:
+    """Copy source into destination, resuming a partial destination.
+
+    progress(copied, total) is called after each chunk. Return the number
+    of bytes copied by this call.
+    """
+    total = os.path.getsize(source)
+    offset = resume_offset(source, destination)
+    start = offset
+    methods = list(methods or copy_methods())
+    src_fd = os.open(source, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        dst_fd = os.open(destination, os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            os.ftruncate(dst_fd, offset)
+            while offset < total:
+                count = min(chunk_size, total - offset)
+                try:
+                    copied = methods[0](src_fd, dst_fd, offset, count)
+                except OSError as err:
+                    if err.errno not in _UNSUPPORTED or len(methods) == 1:
+                        raise
+                    methods.pop(0)
+                    continue
+                if not copied:
+                    # the file shrank while copying, or the method silently can't copy it
+                    if len(methods) == 1:
+                        raise OSError(errno.EIO, f"Unexpected end of file at {offset}/{total}", source)
+                    methods.pop(0)
+                    continue
+                offset += copied
+                if progress:
+                    progress(offset, total)
+            os.fsync(dst_fd)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    return offset - start
+
+
+def _same_file(a: str, b: str) -> bool:
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+
+def move_file(source: str, destination: str, progress=None, chunk_size=CHUNK_SIZE):
+    """Move a file, renaming it if possible, copying it otherwise.
+
+    A copy is written to `destination + PART_SUFFIX` and renamed to the
+    destination once complete, so the destination is never a partial file.
+    If the move is interrupted, the next move of the same file resumes the
+    partial copy. The source is only removed once the destination is in place.
+    An existing destination is never replaced (FileExistsError), unless it
+    is the source itself (a change of case on a case-insensitive disk).
+    """
+    if os.path.lexists(destination) and not _same_file(source, destination):
+        raise FileExistsError(errno.EEXIST, "Destination already exists", destination)
+    try:
+        os.rename(source, destination)
+        return
+    except OSError as err:
+        if err.errno != errno.EXDEV:
+            raise
+    part = destination + PART_SUFFIX
+    copy_file(source, part, progress, chunk_size)
+    shutil.copystat(source, part)
+    os.replace(part, destination)
+    os.unlink(source)
+
+
+class EmptyFolderPruner:
+    """Remove the folders emptied by a run, in one pass at the end.
+
+    Source folders are recorded as files leave them. `prune()` then goes
+    through them and their parents deepest first, so each folder is listed
+    once and a parent emptied by the removal of its last subfolder goes
+    too. Library roots (`keep`) and folders above them are never removed.
+    """
+
+    def __init__(self, keep=()):
+        self.keep = {os.path.normcase(os.path.normpath(p)) for p in keep}
+        self.touched = set()
+
+    def touch(self, folder: str):
+        self.touched.add(os.path.normpath(folder))
+
+    def _root_of(self, folder: str):
+        key = os.path.normcase(folder)
+        for root in self.keep:
+            if key.startswith(root.rstrip(os.sep) + os.sep):
+                return root
+        return None
+
+    def candidates(self) -> list:
+        folders = set()
+        for folder in self.touched:
+            if os.path.normcase(folder) in self.keep:
+                continue
+            folders.add(folder)
+            if self._root_of(folder) is None:
+                # unknown library, don't go up
+                continue
+            parent = os.path.dirname(folder)
+            while parent != folder and os.path.normcase(parent) not in self.keep:
+                folders.add(parent)
+                folder, parent = parent, os.path.dirname(parent)
+        # deepest first: a folder is listed after all its subfolders were handled
+        return sorted(folders, key=lambda f: (-f.count(os.sep), f))
+
+    def prune(self, on_error=None) -> list:
+        """Remove the empty folders, return them."""
+        removed = []
+        for folder in self.candidates():
+            try:
+                with os.scandir(folder) as it:
+                    if any(it):
+                        continue
+                os.rmdir(folder)
+            except FileNotFoundError:
+                continue
+            except OSError as err:
+                if on_error:
+                    on_error(folder, err)
+                continue
+            removed.append(folder)
+        self.touched = set()
+        return removed
@@ -0,0 +1,191 @@
+import collections
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+OPERATION = re.compile(r"^\s*(?:query|mutation)\s+(\w+)")
+# anonymous query: named after its first field
+FIRST_FIELD = re.compile(r"^\s*{\s*(\w+)")
+
+
+def operation_name(query: str) -> str:
+    match = OPERATION.match(query) or FIRST_FIELD.match(query)
+    return match.group(1) if match else "unknown"
+
+
+class GraphQLClient:
+    """Stash GraphQL client that keeps one pooled HTTP session for the whole run.
+
+    The URL, headers and session cookie are built once, and the connections
+    are kept alive between queries instead of opening a new one every call.
+    Queries are counted by operation name for the run (`calls`) and, inside
+    `scene_calls()`, for the scene being processed by the current thread.
+    """
+
+    def __init__(self, server_connection: dict, on_fatal=None, timeout=20, pool_size=4):
+        graphql_domain = server_connection["Host"]
+        if graphql_domain == "0.0.0.0":
+            graphql_domain = "localhost"
+        # Stash GraphQL endpoint
+        self.url = f"{server_connection['Scheme']}://{graphql_domain}:{server_connection['Port']}/graphql"
+        self.timeout = timeout
+        # called with an error message when the plugin can't continue (network error, 401)
+        self.on_fatal = on_fatal
+
+        self.session = requests.Session()
+        self.session.headers.update(
+            {
+                "Accept-Encoding": "gzip, deflate, br",
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+                "Connection": "keep-alive",
+                "DNT": "1",
+            }
+        )
+        # Session cookie for authentication
+        session_cookie = server_connection.get("SessionCookie")
+        if session_cookie:
+            self.session.cookies.set("session", session_cookie["Value"])
+        # Stash is a single host, one pool with a few keep-alive connections is enough
+        self.adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, pool_block=True
+        )
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+        self.calls = collections.Counter()
+        self._operations = {}
+        self._scene = threading.local()
+
+    def _fatal(self, msg: str):
+        if self.on_fatal:
+            self.on_fatal(msg)
+        raise ConnectionError(msg)
+
+    def call(self, query: str, variables=None):
+        json = {"query": query}
+        if variables is not None:
+            json["variables"] = variables
+        try:
+            response = self.session.post(self.url, json=json, timeout=self.timeout)
+        except Exception as e:
+            self._fatal(f"[FATAL] Error with the graphql request {e}")
+        name = self._operations.get(query)
+        if name is None:
+            name = self._operations[query] = operation_name(query)
+        with self._lock:
+            self.requests_sent += 1
+            self.calls[name] += 1
+        scene_calls = getattr(self._scene, "calls", None)
+        if scene_calls is not None:
+            scene_calls[name] += 1
+        if response.status_code == 200:
+            result = response.json()
+            if result.get("error"):
+                for error in result["error"]["errors"]:
+                    raise Exception(f"GraphQL error: {error}")
+                return None
+            if result.get("data"):
+                return result.get("data")
+        elif response.status_code == 401:
+            self._fatal("HTTP Error 401, Unauthorised.")
+        else:
+            raise ConnectionError(
+                f"GraphQL query failed: {response.status_code} - {response.content}"
+            )
+
+    @contextmanager
+    def scene_calls(self):
+        """Count the queries sent by this thread in the block, yield the counter."""
+        counter = collections.Counter()
+        self._scene.calls = counter
+        try:
+            yield counter
+        finally:
+            self._scene.calls = None
+
+    def merge_calls(self, calls: dict):
+        """Add the queries counted by another client (planning process)."""
+        with self._lock:
+            self.calls.update(calls)
+
+    def connection_stats(self) -> dict:
+        """Return the number of requests sent and TCP connections opened/reused."""
+        pools = self.adapter.poolmanager.pools
+        opened = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+        return {
+            "requests": self.requests_sent,
+            "opened": opened,
+            "reused": max(0, self.requests_sent - opened),
+        }
+
+    def close(self):
+        self.session.close()
+
+
+class PageStream:
+    """Iterate over a paginated find query one page at a time.
+
+    The first page is fetched when the stream is created so `count` (as
+    reported by Stash) is known before iterating. While a page is being
+    consumed, the next one is fetched in a background thread.
+    """
+
+    def __init__(self, fetch_page, items_key: str, page_size=500, limit=-1, start_page=1):
+        # fetch_page(page, per_page) -> {"count": int, items_key: [...]}
+        self.fetch_page = fetch_page
+        self.items_key = items_key
+        self.limit = limit
+        if limit and 0 < limit < page_size:
+            page_size = limit
+        self.page_size = page_size
+        self.page = start_page
+        self._first = fetch_page(start_page, page_size)
+        # matching items in Stash, count is limited to what will be iterated
+        self.total = self._first["count"]
+        self.count = self.total
+        if limit and limit > 0:
+            self.count = min(self.count, limit)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        result = self._first
+        self._first = None
+        if result is None:
+            raise RuntimeError("PageStream can only be iterated once")
+        page = self.page
+        # items on the pages before start_page count as already processed
+        yielded = (page - 1) * self.page_size
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            while True:
+                items = result[self.items_key]
+                remaining = self.count - yielded - len(items)
+                next_page = None
+                if len(items) == self.page_size and remaining > 0:
+                    next_page = prefetcher.submit(self.fetch_page, page + 1, self.page_size)
+                # drop the reference so only the current and next page stay in memory
+                result = None
+                self.page = page
+                for item in items:
+                    if yielded >= self.count:
+                        break
+                    yielded += 1
+                    yield item
+                if next_page is None or yielded >= self.count:
+                    if next_page is not None:
+                        next_page.cancel()
+                    return
+                result = next_page.result()
+                page += 1
@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+
+# status of a journal record
+MOVED = "moved"
+# moved back by the plugin (database update failed, batch rolled back)
+REVERTED = "reverted"
+# moved back by the undo task
+UNDONE = "undone"
+DRY_RUN = "dry_run"
+LENGTH_LIMIT = "length_limit"
+# run of the log_file lines written before the journal, they don't say which run moved them
+LEGACY_RUN = "legacy"
+
+
+def new_run_id() -> str:
+    return time.strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+
+
+class Journal:
+    """Rename journal, one JSON line per file moved.
+
+    The file is opened on the first record and stays open for the run.
+    Records are buffered and the file is flushed and fsynced every
+    `sync_every` records or `sync_ms` milliseconds (checked when a record is
+    written), and when the journal is synced or closed. 0 disables a
+    trigger. A crash can only lose the records written since the last sync,
+    and only the last line can be cut: readers skip it.
+    """
+
+    def __init__(self, path: str, run_id=None, sync_every=100, sync_ms=1000):
+        self.path = path
+        self.run_id = run_id or new_run_id()
+        self.sync_every = sync_every
+        self.sync_ms = sync_ms
+        self.records = 0
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, old: str, new: str, status=MOVED, scene_id=None, file_id=None, oshash=None, kind="file"):
+        line = json.dumps(
+            {
+                "run": self.run_id,
+                "ts": round(time.time(), 3),
+                "status": status,
+                "kind": kind,
+                "scene_id": scene_id,
+                "file_id": file_id,
+                "old": old,
+                "new": new,
+                "oshash": oshash,
+            },
+            ensure_ascii=False,
+        )
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8", buffering=1 << 16)
+            self._file.write(line + "\n")
+            self.records += 1
+            self._pending += 1
+            if (self.sync_every and self._pending >= self.sync_every) or (
+                self.sync_ms and (time.monotonic() - self._last_sync) * 1000 >= self.sync_ms
+            ):
+                self._sync()
+
+    def _sync(self):
+        if self._file is None or not self._pending:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+
+def _legacy_record(line: str):
+    # log_file lines written before the journal: ID|OLD_PATH|NEW_PATH[|OSHASH]
+    parts = line.split("|")
+    if len(parts) < 3:
+        return None
+    return {
+        "run": LEGACY_RUN,
+        "status": MOVED,
+        "kind": "file" if len(parts) > 3 else "associated",
+        "scene_id": parts[0],
+        "file_id": None,
+        "old": parts[1],
+        "new": parts[2],
+        "oshash": parts[3] if len(parts) > 3 else None,
+    }
+
+
+def read_journal(path: str) -> list:
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            if line.startswith("{"):
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # cut by a crash
+                    continue
+            else:
+                record = _legacy_record(line)
+                if record:
+                    records.append(record)
+    return records
+
+
+def moves_to_undo(records: list) -> list:
+    """Return the moves of the last run that weren't moved back yet, newest first.
+
+    Legacy lines are never undone: they would all count as one run, the
+    whole history written before the journal.
+    """
+    outstanding = []
+    for record in records:
+        if record["status"] == MOVED:
+            if record["run"] != LEGACY_RUN:
+                outstanding.append(record)
+        elif record["status"] in (REVERTED, UNDONE):
+            # cancels the latest move in the other direction
+            for i in range(len(outstanding) - 1, -1, -1):
+                move = outstanding[i]
+                if move["old"] == record["new"] and move["new"] == record["old"]:
+                    del outstanding[i]
+                    break
+    if not outstanding:
+        return []
+    run_id = outstanding[-1]["run"]
+    return [move for move in reversed(outstanding) if move["run"] == run_id]
@@ -0,0 +1,49 @@
+import os
+import threading
+
+
+class LockHolderIndex:
+    """Which processes have a file open, built from one scan of the system.
+
+    psutil's open_files() of every process is read once and indexed by
+    path. The index is reused by the next lookups and only rebuilt when a
+    lookup misses, instead of scanning every process each time a file is
+    locked. Only Windows refuses to move an open file (WinError 32), so it
+    is the only place where this is asked.
+    """
+
+    def __init__(self, psutil_module=None):
+        self.psutil = psutil_module
+        self.index = None
+        self.scans = 0
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.psutil is not None
+
+    def refresh(self):
+        index = {}
+        for proc in self.psutil.process_iter():
+            try:
+                for item in proc.open_files():
+                    index.setdefault(os.path.normcase(item.path), set()).add(proc.pid)
+            except Exception:
+                continue
+        self.scans += 1
+        self.index = index
+
+    def clear(self):
+        """Forget the index, the next lookup scans again (pids get reused)."""
+        with self._lock:
+            self.index = None
+
+    def holders(self, path: str) -> list:
+        """Return the pids of the processes having the file open."""
+        if not self.available:
+            return []
+        key = os.path.normcase(path)
+        with self._lock:
+            if self.index is None or key not in self.index:
+                self.refresh()
+            return sorted(self.index.get(key, ()))
@@ -1,4 +1,8 @@
+import atexit
+import os
 import sys
+import threading
+import time
 
 
 # Log messages sent from a plugin instance are transmitted via stderr and are
@@ -11,6 +15,37 @@ import sys
 # formatted methods are intended for use by plugin instances to transmit log
 # messages. The LogProgress method is also intended for sending progress data.
 #
+# Messages below the level set with configure() are dropped before being
+# formatted: pass a callable or %-style arguments instead of an f-string for
+# the costly ones, e.g. LogDebug("Scene information: %s", scene_information)
+# or LogDebug(lambda: f"Template: {template}").
+#
+# Messages are buffered and written to stderr in batches: every
+# `batch_size` messages, `flush_ms` milliseconds after the oldest one, on a
+# warning or an error, and at exit. Call flush() before replacing sys.stderr
+# or leaving with os._exit. A forked process (planning workers) starts with
+# an empty buffer: the parent writes what it had buffered.
+
+LEVELS = {"trace": 0, "debug": 1, "info": 2, "warning": 3, "error": 4}
+
+_min_level = 0
+_batch_size = 100
+_flush_ms = 500
+_buffer = []
+_first_buffered = 0.0
+_lock = threading.Lock()
+
+
+def configure(level="trace", batch_size=100, flush_ms=500):
+    """Set the minimum level logged and how often the messages are written."""
+    global _min_level, _batch_size, _flush_ms
+    _min_level = LEVELS.get(str(level).lower(), 0)
+    _batch_size = batch_size
+    _flush_ms = flush_ms
+
+
+def enabled(level: str) -> bool:
+    return LEVELS[level] >= _min_level
 
 
 def __prefix(level_char):
@@ -21,33 +56,85 @@ def __prefix(level_char):
     return ret.decode()
 
 
-def __log(level_char, s):
+def _flush():
+    if not _buffer:
+        return
+    data = "".join(_buffer)
+    _buffer.clear()
+    try:
+        sys.stderr.write(data)
+        sys.stderr.flush()
+    except (OSError, ValueError):
+        # stderr closed (Stash stopped reading)
+        pass
+
+
+def flush():
+    with _lock:
+        _flush()
+
+
+def _after_fork():
+    global _lock
+    # the lock can be held by another thread of the parent (e.g. the page prefetch)
+    _lock = threading.Lock()
+    _buffer.clear()
+
+
+def __log(level_char, s, urgent=False):
+    global _first_buffered
     if level_char == "":
         return
 
-    print(__prefix(level_char) + s + "\n", file=sys.stderr, flush=True)
+    with _lock:
+        if not _buffer:
+            _first_buffered = time.monotonic()
+        _buffer.append(__prefix(level_char) + s + "\n\n")
+        if (
+            urgent
+            or len(_buffer) >= _batch_size
+            or (time.monotonic() - _first_buffered) * 1000 >= _flush_ms
+        ):
+            _flush()
 
 
-def LogTrace(s):
-    __log(b"t", s)
+def _format(s, args):
+    if callable(s):
+        s = s()
+    if args:
+        s = s % args
+    return s
 
 
-def LogDebug(s):
-    __log(b"d", s)
+def LogTrace(s, *args):
+    if _min_level <= 0:
+        __log(b"t", _format(s, args))
 
 
-def LogInfo(s):
-    __log(b"i", s)
+def LogDebug(s, *args):
+    if _min_level <= 1:
+        __log(b"d", _format(s, args))
 
 
-def LogWarning(s):
-    __log(b"w", s)
+def LogInfo(s, *args):
+    if _min_level <= 2:
+        __log(b"i", _format(s, args))
 
 
-def LogError(s):
-    __log(b"e", s)
+def LogWarning(s, *args):
+    if _min_level <= 3:
+        __log(b"w", _format(s, args), urgent=True)
+
+
+def LogError(s, *args):
+    __log(b"e", _format(s, args), urgent=True)
 
 
 def LogProgress(p):
     progress = min(max(0, p), 1)
     __log(b"p", str(progress))
+
+
+atexit.register(flush)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,150 @@
+import collections
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def device_of(path: str):
+    """Return the st_dev of a path, or of its closest existing parent.
+
+    The destination folder of a move often doesn't exist yet.
+    """
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except FileNotFoundError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                raise
+            path = parent
+
+
+def path_key(path: str) -> str:
+    return os.path.normcase(os.path.normpath(path))
+
+
+class MoveExecutor:
+    """Run file moves concurrently, grouped by (source device, destination device).
+
+    Moves of one group run one after the other, in the order they were
+    submitted. Different groups run at the same time in a thread pool, and
+    at most `per_device` moves touch the same device at once, so a slow copy
+    between two disks doesn't hold back the instant renames on a third one.
+
+    A move into the path another pending move is leaving (a scene renamed
+    to the old name of another one) joins the group of that move, so it
+    runs after it even if its own devices differ.
+
+    Only the moves run in the pool: results are handed back to the thread
+    iterating `map()`, which can update the database on its own connection.
+    With `workers=0` the moves run one by one in that thread (profiling).
+    """
+
+    def __init__(self, move, workers=4, per_device=2, max_pending=256):
+        # move(item) -> result, an exception is returned as the error of the item
+        self.move = move
+        self.per_device = per_device
+        self.max_pending = max(max_pending, workers)
+        self._lock = threading.Lock()
+        self._groups = {}
+        # source of each move not done yet -> its group
+        self._sources = {}
+        self._devices = {}
+        self._results = queue.Queue()
+        self._pending = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers) if workers else None
+
+    def _device_slots(self, device) -> threading.Semaphore:
+        with self._lock:
+            if device not in self._devices:
+                self._devices[device] = threading.Semaphore(self.per_device)
+            return self._devices[device]
+
+    def _run_group(self, key):
+        # devices are always acquired in the same order, two groups can't deadlock
+        slots = [self._device_slots(device) for device in sorted(set(key), key=str)]
+        while True:
+            with self._lock:
+                group = self._groups[key]
+                if not group:
+                    del self._groups[key]
+                    return
+                item, source = group.popleft()
+            for slot in slots:
+                slot.acquire()
+            try:
+                result, error = self.move(item), None
+            except Exception as err:
+                result, error = None, err
+            finally:
+                for slot in reversed(slots):
+                    slot.release()
+            with self._lock:
+                # the source path is free, a move into it can run
+                if self._sources.get(source) == key:
+                    del self._sources[source]
+            self._results.put((item, result, error))
+
+    def submit(self, item, source: str, destination: str):
+        try:
+            key = (device_of(source), device_of(destination))
+        except OSError:
+            # missing source, the move itself reports it
+            key = (None, None)
+        source = path_key(source)
+        with self._lock:
+            key = self._sources.get(path_key(destination), key)
+            start = key not in self._groups
+            if start:
+                self._groups[key] = collections.deque()
+            self._groups[key].append((item, source))
+            self._sources[source] = key
+        self._pending += 1
+        if start:
+            self._pool.submit(self._run_group, key)
+
+    def _take(self, idle=None):
+        while True:
+            timeout = idle() if idle is not None else None
+            try:
+                result = self._results.get(timeout=timeout)
+                break
+            except queue.Empty:
+                continue
+        self._pending -= 1
+        return result
+
+    def map(self, items, idle=None):
+        """Move each (item, source, destination), yield (item, result, error) as they complete.
+
+        While waiting for a move, `idle()` is called: it returns how long to
+        wait before calling it again, or None to wait for the move.
+        """
+        if self._pool is None:
+            for item, _, _ in items:
+                if idle is not None:
+                    idle()
+                try:
+                    yield item, self.move(item), None
+                except Exception as err:
+                    yield item, None, err
+            return
+        for item, source, destination in items:
+            self.submit(item, source, destination)
+            while self._pending >= self.max_pending:
+                yield self._take(idle)
+            while not self._results.empty():
+                yield self._take()
+        while self._pending:
+            yield self._take(idle)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
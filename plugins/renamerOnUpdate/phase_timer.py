@@ -0,0 +1,121 @@
+import json
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+
+# phases of a scene, in the order they run
+PHASES = ("fetch", "extract_info", "render", "duplicate_check", "move", "associated", "db")
+
+
+def percentile(values, fraction: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    rank = max(int(fraction * len(values) + 0.5), 1)
+    return values[min(rank, len(values)) - 1]
+
+
+class PhaseTimer:
+    """Time the phases of each scene and summarize them at the end of a run.
+
+    Durations are kept per phase (for the percentiles) and per scene (for
+    the slowest scenes). Phases not tied to a scene (a page of scenes
+    fetched by the task) only count in the phase. Thread safe: the moves
+    are timed from the MoveExecutor threads.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.scenes = {}
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.durations)
+
+    def add(self, phase: str, seconds: float, scene_id=None):
+        with self._lock:
+            durations = self.durations.get(phase)
+            if durations is None:
+                durations = self.durations[phase] = array("d")
+            durations.append(seconds)
+            if scene_id is not None:
+                scene = self.scenes.setdefault(scene_id, {})
+                scene[phase] = scene.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, phase: str, scene_id=None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - started, scene_id)
+
+    def export(self) -> dict:
+        """Return the timings and start over (sent back by a planning process)."""
+        with self._lock:
+            exported = {
+                "durations": {phase: list(values) for phase, values in self.durations.items()},
+                "scenes": self.scenes,
+            }
+            self.durations = {}
+            self.scenes = {}
+        return exported
+
+    def merge(self, exported: dict):
+        with self._lock:
+            for phase, values in exported["durations"].items():
+                self.durations.setdefault(phase, array("d")).extend(values)
+            for scene_id, phases in exported["scenes"].items():
+                scene = self.scenes.setdefault(scene_id, {})
+                for phase, seconds in phases.items():
+                    scene[phase] = scene.get(phase, 0.0) + seconds
+
+    def summary(self, slowest=10) -> dict:
+        with self._lock:
+            phases = {}
+            ordered = [p for p in PHASES if p in self.durations]
+            ordered += sorted(p for p in self.durations if p not in PHASES)
+            for phase in ordered:
+                values = sorted(self.durations[phase])
+                phases[phase] = {
+                    "count": len(values),
+                    "total": round(sum(values), 6),
+                    "p50": round(percentile(values, 0.5), 6),
+                    "p95": round(percentile(values, 0.95), 6),
+                    "max": round(values[-1], 6),
+                }
+            totals = sorted(
+                ((sum(p.values()), scene_id, p) for scene_id, p in self.scenes.items()),
+                key=lambda item: item[0],
+                reverse=True,
+            )[:slowest]
+        return {
+            "phases": phases,
+            "slowest_scenes": [
+                {
+                    "scene_id": scene_id,
+                    "total": round(total, 6),
+                    "phases": {phase: round(s, 6) for phase, s in p.items()},
+                }
+                for total, scene_id, p in totals
+            ],
+        }
+
+    def report(self, slowest=5) -> list:
+        """Lines of the summary, for the log."""
+        summary = self.summary(slowest)
+        lines = [f"{'phase':<16}{'count':>8}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+        for phase, s in summary["phases"].items():
+            lines.append(
+                f"{phase:<16}{s['count']:>8}{s['total']:>10.2f}"
+                f"{s['p50'] * 1000:>10.1f}{s['p95'] * 1000:>10.1f}{s['max'] * 1000:>10.1f}"
+            )
+        for scene in summary["slowest_scenes"]:
+            worst = max(scene["phases"], key=scene["phases"].get)
+            lines.append(f"Slow scene {scene['scene_id']}: {scene['total'] * 1000:.0f} ms ({worst} {scene['phases'][worst] * 1000:.0f} ms)")
+        return lines
+
+    def write_json(self, path: str, slowest=20):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(slowest), f, indent=2)
@@ -0,0 +1,82 @@
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+
+# allocations of the profiler itself and of the imports are left out of the report
+IGNORED_FILES = (
+    tracemalloc.__file__,
+    cProfile.__file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+    "<unknown>",
+)
+
+
+class Profiler:
+    """Profile a run with cProfile (time) and tracemalloc (memory).
+
+    cProfile only follows the thread that enabled it (before Python 3.12),
+    and only one profiler can run at a time (3.12+): the profiled run keeps
+    all its work in the main thread.
+
+    Everything is only imported and started by the profile task, the other
+    modes don't pay for it.
+    """
+
+    def __init__(self, frames=10):
+        self.frames = frames
+        self.profile = cProfile.Profile()
+        self.snapshot = None
+        self.peak = 0
+        self.seconds = 0.0
+        self._started = 0.0
+
+    def start(self):
+        tracemalloc.start(self.frames)
+        self._started = time.perf_counter()
+        self.profile.enable()
+        return self
+
+    def stop(self):
+        if self.snapshot is not None:
+            return
+        self.profile.disable()
+        self.seconds = time.perf_counter() - self._started
+        self.snapshot = tracemalloc.take_snapshot()
+        self.peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    def stats(self) -> pstats.Stats:
+        return pstats.Stats(self.profile, stream=io.StringIO())
+
+    def allocations(self, top=25) -> list:
+        """The lines that allocated the most memory still in use, biggest first."""
+        snapshot = self.snapshot.filter_traces([tracemalloc.Filter(False, name) for name in IGNORED_FILES])
+        return snapshot.statistics("lineno")[:top]
+
+    def report(self, top=25) -> list:
+        """Lines of the text report: peak memory, top allocations, top functions."""
+        lines = [
+            f"Profiled {self.seconds:.2f}s, peak traced memory {self.peak / 1048576:.1f} MiB",
+            "",
+            f"Top {top} allocations (memory still allocated at the end, by line)",
+        ]
+        for stat in self.allocations(top):
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size / 1024:>10.1f} KiB {stat.count:>8} blocks  {frame.filename}:{frame.lineno}")
+        lines += ["", f"Top {top} functions by cumulative time"]
+        output = io.StringIO()
+        stats = self.stats()
+        stats.stream = output
+        stats.sort_stats("cumulative").print_stats(top)
+        lines += output.getvalue().strip("\n").splitlines()
+        return lines
+
+    def write(self, prof_path: str, report_path: str, top=25):
+        """Write the stats (for pstats/snakeviz) and the text report."""
+        self.stop()
+        self.stats().dump_stats(prof_path)
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.report(top)) + "\n")
@@ -0,0 +1,132 @@
+import json
+import multiprocessing
+import os
+
+# what a plan entry needs to be executed without the scene metadata
+ENTRY_KEYS = (
+    "scene_id",
+    "file_id",
+    "file_index",
+    "current_path",
+    "current_directory",
+    "current_filename",
+    "new_directory",
+    "new_filename",
+    "final_path",
+    "oshash",
+    "primary_file",
+)
+
+
+def change_reason(scene_information: dict) -> str:
+    moved = scene_information["current_directory"] != scene_information["new_directory"]
+    renamed = scene_information["current_filename"] != scene_information["new_filename"]
+    if moved and renamed:
+        return "move+rename"
+    return "move" if moved else "rename"
+
+
+def make_entry(scene_information: dict, suffix="", dry_run=False, clean_tag=None) -> dict:
+    """Return the plan entry of a file, a flat JSON-serialisable dict.
+
+    `dry_run` is the dry_run option of the template: the file is never
+    moved, not even when the plan is applied.
+    """
+    entry = {key: scene_information.get(key) for key in ENTRY_KEYS}
+    entry["suffix"] = suffix
+    entry["reason"] = change_reason(scene_information)
+    entry["dry_run"] = dry_run
+    entry["clean_tag"] = clean_tag or []
+    return entry
+
+
+class PlanWriter:
+    """Write a rename plan as JSON lines, one entry per file.
+
+    The plan is written to a temporary file and moved in place when closed,
+    so an interrupted planning never leaves a half plan behind. Planning can
+    be resumed from `offset()` of the temporary file: what follows is cut.
+    """
+
+    def __init__(self, path: str, resume_offset=None):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.count = 0
+        self.resumed = False
+        if resume_offset is not None and os.path.isfile(self.tmp_path):
+            self._file = open(self.tmp_path, "r+b")
+            self._file.truncate(resume_offset)
+            self._file.seek(0, os.SEEK_END)
+            self.count = sum(1 for _ in read_plan(self.tmp_path))
+            self.resumed = True
+        else:
+            self._file = open(self.tmp_path, "wb")
+
+    def write(self, entry: dict):
+        self._file.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.count += 1
+
+    def offset(self) -> int:
+        """Return the end of the last entry written, flushed to the file."""
+        self._file.flush()
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        self._file.close()
+        os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def iter_plan(path: str, offset=0):
+    """Yield (entry, offset of the next entry) from a plan file, starting at offset."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line.decode("utf-8"))
+            except ValueError:
+                # last line cut by a crash while planning
+                continue
+            yield entry, offset
+
+
+def read_plan(path: str):
+    """Yield the entries of a plan file."""
+    for entry, _ in iter_plan(path):
+        yield entry
+
+
+def can_fork() -> bool:
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def plan_map(func, items, workers=1, initializer=None, chunksize=16):
+    """Yield func(item) for each item, in order.
+
+    With more than one worker the calls run in a pool of forked processes
+    (the workers inherit the loaded config and caches). Where fork isn't
+    available (Windows), the items are planned in-process.
+    """
+    if workers <= 1 or not can_fork():
+        for item in items:
+            yield func(item)
+        return
+    context = multiprocessing.get_context("fork")
+    with context.Pool(workers, initializer) as pool:
+        yield from pool.imap(func, items, chunksize)
@@ -1,5 +1,6 @@
 import difflib
 import json
+import multiprocessing
 import os
 import re
 import shutil
@@ -9,8 +10,6 @@ import time
 import traceback
 from datetime import datetime
 
-import requests
-
 try:
     import psutil  # pip install psutil
 
@@ -25,7 +24,22 @@ try:
 except Exception:
     MODULE_UNIDECODE = False
 
+import daemon
+import journal
 import log
+import rename_plan
+import run_state
+from associated_files import AssociatedFiles
+from db_operations import BulkDBWriter, FolderIndex, PathIndex
+from exclude_matcher import ExcludeMatcher
+from file_mover import EmptyFolderPruner, move_file
+from graphql_client import GraphQLClient, PageStream
+from lock_holders import LockHolderIndex
+from move_executor import MoveExecutor
+from phase_timer import PhaseTimer
+from progress import ProgressReporter
+from studio_registry import StudioRegistry
+from template_engine import compile_template, template_fields
 
 try:
     import config
@@ -33,6 +47,7 @@ except Exception:
     log.LogWarning("Could not import ROU config file, did you rename the template file to 'config.py'? Defaulting to template config file")
     import renamerOnUpdate_config as config
 
+log.configure(getattr(config, "log_level", "trace"))
 
 DB_VERSION_FILE_REFACTOR = 32
 DB_VERSION_SCENE_STUDIO_CODE = 38
@@ -51,65 +66,55 @@ if DRY_RUN:
             os.remove(DRY_RUN_FILE)
     log.LogInfo("Dry mode on")
 
+# what is renamed (log_file) and what a dry run would rename, one JSON line per file
+JOURNAL = None
+DRY_RUN_JOURNAL = None
+if config.log_file:
+    JOURNAL = journal.Journal(
+        config.log_file,
+        sync_every=getattr(config, "journal_sync_every", 100),
+        sync_ms=getattr(config, "journal_sync_ms", 1000),
+    )
+    DRY_RUN_JOURNAL = journal.Journal(
+        DRY_RUN_FILE, JOURNAL.run_id, JOURNAL.sync_every, JOURNAL.sync_ms
+    )
+
+DAEMON_ENABLED = getattr(config, "daemon_enabled", False)
+DAEMON_SOCKET = getattr(config, "daemon_socket", "") or daemon.default_socket_path()
+DAEMON_IDLE_TIMEOUT = getattr(config, "daemon_idle_timeout", 3600)
+DAEMON_LOG_FILE = None
+if config.log_file:
+    DAEMON_LOG_FILE = os.path.join(
+        os.path.dirname(config.log_file), "renamerOnUpdate_daemon.txt"
+    )
+
 START_TIME = time.time()
 FRAGMENT = json.loads(sys.stdin.read())
 
 FRAGMENT_SERVER = FRAGMENT["server_connection"]
 PLUGIN_DIR = FRAGMENT_SERVER["PluginDir"]
+# rename plan of the last task renamer (also the result of a dry run)
+PLAN_FILE = os.path.join(
+    os.path.dirname(config.log_file) if config.log_file else PLUGIN_DIR,
+    "renamerOnUpdate_plan.jsonl",
+)
+# updated_at of the last complete task renamer, only scenes updated since are renamed
+WATERMARK_FILE = os.path.join(os.path.dirname(PLAN_FILE), "renamerOnUpdate_state.json")
+# time spent in each phase of the last run (timing_json in config)
+TIMING_FILE = os.path.join(os.path.dirname(PLAN_FILE), "renamerOnUpdate_timing.json")
+# position of the running task renamer, removed when it ends
+CHECKPOINT_FILE = os.path.join(os.path.dirname(PLAN_FILE), "renamerOnUpdate_checkpoint.json")
+# written by the 'Profile rename' task: cProfile stats (pstats, snakeviz) and the text report
+PROFILE_FILE = os.path.join(os.path.dirname(PLAN_FILE), "renamerOnUpdate.prof")
+PROFILE_REPORT_FILE = os.path.join(os.path.dirname(PLAN_FILE), "renamerOnUpdate_profile.txt")
 
 
 PLUGIN_ARGS = FRAGMENT["args"].get("mode")
+BULK_MODE = bool(PLUGIN_ARGS) and "bulk" in PLUGIN_ARGS
 
 # log.LogDebug("{}".format(FRAGMENT))
 
 
-def callGraphQL(query, variables=None):
-    # Session cookie for authentication
-    graphql_port = str(FRAGMENT_SERVER["Port"])
-    graphql_scheme = FRAGMENT_SERVER["Scheme"]
-    graphql_cookies = {"session": FRAGMENT_SERVER["SessionCookie"]["Value"]}
-    graphql_headers = {
-        "Accept-Encoding": "gzip, deflate, br",
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-        "Connection": "keep-alive",
-        "DNT": "1",
-    }
-    graphql_domain = FRAGMENT_SERVER["Host"]
-    if graphql_domain == "0.0.0.0":
-        graphql_domain = "localhost"
-    # Stash GraphQL endpoint
-    graphql_url = f"{graphql_scheme}://{graphql_domain}:{graphql_port}/graphql"
-
-    json = {"query": query}
-    if variables is not None:
-        json["variables"] = variables
-    try:
-        response = requests.post(
-            graphql_url,
-            json=json,
-            headers=graphql_headers,
-            cookies=graphql_cookies,
-            timeout=20,
-        )
-    except Exception as e:
-        exit_plugin(err=f"[FATAL] Error with the graphql request {e}")
-    if response.status_code == 200:
-        result = response.json()
-        if result.get("error"):
-            for error in result["error"]["errors"]:
-                raise Exception(f"GraphQL error: {error}")
-            return None
-        if result.get("data"):
-            return result.get("data")
-    elif response.status_code == 401:
-        exit_plugin(err="HTTP Error 401, Unauthorised.")
-    else:
-        raise ConnectionError(
-            f"GraphQL query failed: {response.status_code} - {response.content}"
-        )
-
-
 def graphql_getScene(scene_id):
     query = (
         """
@@ -164,16 +169,16 @@ def graphql_getScene(scene_id):
     """
     )
     variables = {"id": scene_id}
-    result = callGraphQL(query, variables)
+    result = GRAPHQL.call(query, variables)
     return result.get("findScene")
 
 
 # used for bulk
-def graphql_findScene(perPage, direc="DESC") -> dict:
+def graphql_findScene(perPage, direc="DESC", page=1, sort="updated_at", scene_filter=None) -> dict:
     query = (
         """
-    query FindScenes($filter: FindFilterType) {
-        findScenes(filter: $filter) {
+    query FindScenes($filter: FindFilterType, $scene_filter: SceneFilterType) {
+        findScenes(filter: $filter, scene_filter: $scene_filter) {
             count
             scenes {
                 ...SlimSceneData
@@ -186,6 +191,7 @@ def graphql_findScene(perPage, direc="DESC") -> dict:
         date
         rating100
         organized
+        updated_at
         stash_ids {
             endpoint
             stash_id
@@ -230,19 +236,37 @@ def graphql_findScene(perPage, direc="DESC") -> dict:
     variables = {
         "filter": {
             "direction": direc,
-            "page": 1,
+            "page": page,
             "per_page": perPage,
-            "sort": "updated_at",
+            "sort": sort,
         }
     }
-    result = callGraphQL(query, variables)
+    if scene_filter:
+        variables["scene_filter"] = scene_filter
+    result = GRAPHQL.call(query, variables)
     return result.get("findScenes")
 
 
+def graphql_lastUpdated():
+    # updated_at of the most recently updated scene
+    query = """
+    query LastUpdated {
+        findScenes(filter: {per_page: 1, sort: "updated_at", direction: DESC}) {
+            scenes {
+                updated_at
+            }
+        }
+    }
+    """
+    result = GRAPHQL.call(query)
+    scenes = result["findScenes"]["scenes"]
+    return scenes[0]["updated_at"] if scenes else None
+
+
 # used to find duplicate
 def graphql_findScenebyPath(path, modifier) -> dict:
     query = """
-    query FindScenes($filter: FindFilterType, $scene_filter: SceneFilterType) {
+    query FindScenesByPath($filter: FindFilterType, $scene_filter: SceneFilterType) {
         findScenes(filter: $filter, scene_filter: $scene_filter) {
             count
             scenes {
@@ -257,7 +281,7 @@ def graphql_findScenebyPath(path, modifier) -> dict:
         "filter": {"direction": "ASC", "page": 1, "per_page": 40, "sort": "updated_at"},
         "scene_filter": {"path": {"modifier": modifier, "value": path}},
     }
-    result = callGraphQL(query, variables)
+    result = GRAPHQL.call(query, variables)
     return result.get("findScenes")
 
 
@@ -267,11 +291,14 @@ def graphql_getConfiguration():
             configuration {
                 general {
                     databasePath
+                    stashes {
+                        path
+                    }
                 }
             }
         }
     """
-    result = callGraphQL(query)
+    result = GRAPHQL.call(query)
     return result.get("configuration")
 
 
@@ -289,10 +316,32 @@ def graphql_getStudio(studio_id):
         }
     """
     variables = {"id": studio_id}
-    result = callGraphQL(query, variables)
+    result = GRAPHQL.call(query, variables)
     return result.get("findStudio")
 
 
+def graphql_findStudios(page, per_page) -> dict:
+    query = """
+        query FindStudios($filter: FindFilterType) {
+            findStudios(filter: $filter) {
+                count
+                studios {
+                    id
+                    name
+                    parent_studio {
+                        id
+                    }
+                }
+            }
+        }
+    """
+    variables = {
+        "filter": {"direction": "ASC", "page": page, "per_page": per_page, "sort": "id"}
+    }
+    result = GRAPHQL.call(query, variables)
+    return result.get("findStudios")
+
+
 def graphql_removeScenesTag(id_scenes: list, id_tags: list):
     query = """
     mutation BulkSceneUpdate($input: BulkSceneUpdateInput!) {
@@ -304,7 +353,7 @@ def graphql_removeScenesTag(id_scenes: list, id_tags: list):
     variables = {
         "input": {"ids": id_scenes, "tag_ids": {"ids": id_tags, "mode": "REMOVE"}}
     }
-    result = callGraphQL(query, variables)
+    result = GRAPHQL.call(query, variables)
     return result
 
 
@@ -316,7 +365,7 @@ def graphql_getBuild():
             }
         }
     """
-    result = callGraphQL(query)
+    result = GRAPHQL.call(query)
     return result["systemStatus"]["databaseSchema"]
 
 
@@ -345,19 +394,12 @@ def find_diff_text(a: str, b: str):
     return
 
 
-def has_handle(fpath, all_result=False):
-    lst = []
-    for proc in psutil.process_iter():
-        try:
-            for item in proc.open_files():
-                if fpath == item.path:
-                    if all_result:
-                        lst.append(proc)
-                    else:
-                        return proc
-        except Exception:
-            pass
-    return lst
+def has_handle(fpath, all_result=False) -> list:
+    # pids of the processes that have the file open
+    pids = LOCK_HOLDERS.holders(fpath)
+    if all_result:
+        return pids
+    return pids[:1]
 
 
 def config_edit(name: str, state: bool):
@@ -398,17 +440,12 @@ def get_template_filename(scene: dict):
             template = config.studio_templates[current_studio["name"]]
             template_found = True
         # by first Parent found
-        while current_studio.get("parent_studio") and not template_found:
-            if config.studio_templates.get(
-                current_studio.get("parent_studio").get("name")
-            ):
-                template = config.studio_templates[
-                    current_studio["parent_studio"]["name"]
-                ]
-                template_found = True
-            current_studio = graphql_getStudio(
-                current_studio.get("parent_studio")["id"]
-            )
+        if current_studio.get("parent_studio") and not template_found:
+            STUDIOS.remember(current_studio)
+            for parent in STUDIOS.ancestors(current_studio["id"]):
+                if config.studio_templates.get(parent["name"]):
+                    template = config.studio_templates[parent["name"]]
+                    break
 
     # Change by Tag
     tags = [x["name"] for x in scene["tags"]]
@@ -480,8 +517,14 @@ def sort_rating(d: dict):
     return new_d
 
 
-def extract_info(scene: dict, template: None):
+def uses_field(fields, *names) -> bool:
+    # fields=None means everything is needed
+    return fields is None or any(name in fields for name in names)
+
+
+def extract_info(scene: dict, template: None, fields=None):
     # Grabbing things from Stash
+    # Only the fields used by the templates are computed (see template_fields)
     scene_information = {}
 
     scene_information["current_path"] = str(scene["path"])
@@ -520,7 +563,7 @@ def extract_info(scene: dict, template: None):
         scene["title"] = scene_information["current_filename"]
 
     # Grab Title (without extension if present)
-    if scene.get("title"):
+    if scene.get("title") and uses_field(fields, "title"):
         # Removing extension if present in title
         scene_information["title"] = re.sub(
             rf"{scene_information['file_extension']}$", "", scene["title"]
@@ -533,7 +576,7 @@ def extract_info(scene: dict, template: None):
 
     # Grab Date
     scene_information["date"] = scene.get("date")
-    if scene_information["date"]:
+    if scene_information["date"] and uses_field(fields, "date", "date_format", "year"):
         # Handle partial dates: Stash may return only YYYY or YYYY-MM instead of YYYY-MM-DD
         raw_date = scene_information["date"]
         date_scene = None
@@ -552,13 +595,14 @@ def extract_info(scene: dict, template: None):
             scene_information["date"] = None
 
     # Grab Duration
-    scene_information["duration"] = scene["file"]["duration"]
-    if config.duration_format:
-        scene_information["duration"] = time.strftime(
-            config.duration_format, time.gmtime(scene_information["duration"])
-        )
-    else:
-        scene_information["duration"] = str(scene_information["duration"])
+    if uses_field(fields, "duration"):
+        scene_information["duration"] = scene["file"]["duration"]
+        if config.duration_format:
+            scene_information["duration"] = time.strftime(
+                config.duration_format, time.gmtime(scene_information["duration"])
+            )
+        else:
+            scene_information["duration"] = str(scene_information["duration"])
 
     # Grab Rating
     if scene.get("rating100"):
@@ -566,7 +610,9 @@ def extract_info(scene: dict, template: None):
 
     # Grab Performer
     scene_information["performer_path"] = None
-    if scene.get("performers"):
+    if scene.get("performers") and uses_field(
+        fields, "performer", "performer_path", "stashid_performer"
+    ):
         perf_list = []
         perf_list_stashid = []
         perf_rating = {"0": []}
@@ -656,7 +702,9 @@ def extract_info(scene: dict, template: None):
         scene_information["performer_path"] = "NoPerformer"
 
     # Grab Studio name
-    if scene.get("studio"):
+    if scene.get("studio") and uses_field(
+        fields, "studio", "parent_studio", "studio_family", "studio_hierarchy"
+    ):
         if SQUEEZE_STUDIO_NAMES:
             scene_information["studio"] = scene["studio"]["name"].replace(" ", "")
         else:
@@ -675,18 +723,18 @@ def extract_info(scene: dict, template: None):
                 ]
             scene_information["studio_family"] = scene_information["parent_studio"]
 
-            studio_p = scene["studio"]
-            while studio_p.get("parent_studio"):
-                studio_p = graphql_getStudio(studio_p["parent_studio"]["id"])
-                if studio_p:
+            # the whole parent chain is only needed for $studio_hierarchy
+            if uses_field(fields, "studio_hierarchy"):
+                STUDIOS.remember(scene["studio"])
+                for studio_p in STUDIOS.ancestors(scene["studio"]["id"]):
                     if SQUEEZE_STUDIO_NAMES:
                         studio_hierarchy.append(studio_p["name"].replace(" ", ""))
                     else:
                         studio_hierarchy.append(studio_p["name"])
-            studio_hierarchy.reverse()
+                studio_hierarchy.reverse()
         scene_information["studio_hierarchy"] = studio_hierarchy
     # Grab Tags
-    if scene.get("tags"):
+    if scene.get("tags") and uses_field(fields, "tags"):
         tag_list = []
         for tag in scene["tags"]:
             # ignore tag in blacklist
@@ -701,27 +749,31 @@ def extract_info(scene: dict, template: None):
         scene_information["tags"] = TAGS_SPLITCHAR.join(tag_list)
 
     # Grab Height (720p,1080p,4k...)
-    scene_information["bit_rate"] = str(
-        round(int(scene["file"]["bit_rate"]) / 1000000, 2)
-    )
-    scene_information["resolution"] = "SD"
-    scene_information["height"] = f"{scene['file']['height']}p"
-    if scene["file"]["height"] >= 720:
-        scene_information["resolution"] = "HD"
-    if scene["file"]["height"] >= 2160:
-        scene_information["height"] = "4k"
-        scene_information["resolution"] = "UHD"
-    if scene["file"]["height"] >= 2880:
-        scene_information["height"] = "5k"
-    if scene["file"]["height"] >= 3384:
-        scene_information["height"] = "6k"
-    if scene["file"]["height"] >= 4320:
-        scene_information["height"] = "8k"
-    # For Phone ?
-    if scene["file"]["height"] > scene["file"]["width"]:
-        scene_information["resolution"] = "VERTICAL"
-
-    if scene.get("movies"):
+    if uses_field(fields, "bit_rate"):
+        scene_information["bit_rate"] = str(
+            round(int(scene["file"]["bit_rate"]) / 1000000, 2)
+        )
+    if uses_field(fields, "resolution", "height"):
+        scene_information["resolution"] = "SD"
+        scene_information["height"] = f"{scene['file']['height']}p"
+        if scene["file"]["height"] >= 720:
+            scene_information["resolution"] = "HD"
+        if scene["file"]["height"] >= 2160:
+            scene_information["height"] = "4k"
+            scene_information["resolution"] = "UHD"
+        if scene["file"]["height"] >= 2880:
+            scene_information["height"] = "5k"
+        if scene["file"]["height"] >= 3384:
+            scene_information["height"] = "6k"
+        if scene["file"]["height"] >= 4320:
+            scene_information["height"] = "8k"
+        # For Phone ?
+        if scene["file"]["height"] > scene["file"]["width"]:
+            scene_information["resolution"] = "VERTICAL"
+
+    if scene.get("movies") and uses_field(
+        fields, "movie_title", "movie_year", "movie_index", "movie_scene"
+    ):
         scene_information["movie_title"] = scene["movies"][0]["movie"]["name"]
         if scene["movies"][0]["movie"].get("date"):
             scene_information["movie_year"] = scene["movies"][0]["movie"]["date"][0:4]
@@ -798,55 +850,10 @@ def remove_consecutive_nonword(text: str):
     return text
 
 
-def field_replacer(text: str, scene_information: dict):
-    field_found = re.findall(r"\$\w+", text)
-    result = text
-    title = None
-    replaced_word = ""
-    if field_found:
-        field_found.sort(key=len, reverse=True)
-    for i in range(0, len(field_found)):
-        f = field_found[i].replace("$", "").strip("_")
-        # If $performer is before $title, prevent having duplicate text.
-        if (
-            f == "performer"
-            and len(field_found) > i + 1
-            and scene_information.get("performer")
-        ):
-            if (
-                field_found[i + 1] == "$title"
-                and scene_information.get("title")
-                and PREVENT_TITLE_PERF
-            ):
-                if re.search(
-                    f"^{scene_information['performer'].lower()}",
-                    scene_information["title"].lower(),
-                ):
-                    log.LogDebug(
-                        "Ignoring the performer field because it's already in start of title"
-                    )
-                    result = result.replace("$performer", "")
-                    continue
-        replaced_word = scene_information.get(f)
-        if not replaced_word:
-            replaced_word = ""
-        if FIELD_REPLACER.get(f"${f}"):
-            replaced_word = replaced_word.replace(
-                FIELD_REPLACER[f"${f}"]["replace"], FIELD_REPLACER[f"${f}"]["with"]
-            )
-        if f == "title":
-            title = replaced_word.strip()
-            continue
-        if replaced_word == "":
-            result = result.replace(field_found[i], replaced_word)
-        else:
-            result = result.replace(f"${f}", replaced_word)
-    return result, title
-
-
 def makeFilename(scene_information: dict, query: str) -> str:
-    new_filename = str(query)
-    r, t = field_replacer(new_filename, scene_information)
+    r, t = compile_template(str(query)).render(
+        scene_information, FIELD_REPLACER, PREVENT_TITLE_PERF
+    )
     if FILENAME_REPLACEWORDS:
         r = replace_text(r)
     if not t:
@@ -860,9 +867,9 @@ def makeFilename(scene_information: dict, query: str) -> str:
 
 
 def makePath(scene_information: dict, query: str) -> str:
-    new_filename = str(query)
-    new_filename = new_filename.replace("$performer", "$performer_path")
-    r, t = field_replacer(new_filename, scene_information)
+    r, t = compile_template(str(query), path=True).render(
+        scene_information, FIELD_REPLACER, PREVENT_TITLE_PERF
+    )
     if not t:
         r = r.replace("$title", "")
     r = cleanup_text(r)
@@ -1026,6 +1033,11 @@ def connect_db(path: str):
 
 
 def checking_duplicate_db(scene_info: dict):
+    if PATH_INDEX is not None:
+        if scene_info["final_path"] in PATH_INDEX:
+            log.LogError("Duplicate path detected")
+            return 1
+        return
     scenes = graphql_findScenebyPath(scene_info["final_path"], "EQUALS")
     if scenes["count"] > 0:
         log.LogError("Duplicate path detected")
@@ -1039,18 +1051,34 @@ def checking_duplicate_db(scene_info: dict):
                 log.LogWarning(f"Duplicate filename: [{dupl_row['id']}]")
 
 
-def db_rename(stash_db: sqlite3.Connection, scene_info):
+def db_rename(stash_db: sqlite3.Connection, scene_info, commit=True):
     cursor = stash_db.cursor()
     # Database rename
     cursor.execute(
         "UPDATE scenes SET path=? WHERE id=?;",
         [scene_info["final_path"], scene_info["scene_id"]],
     )
-    stash_db.commit()
+    if commit:
+        stash_db.commit()
     # Close DB
     cursor.close()
 
 
+def db_has_new_location(stash_db: sqlite3.Connection, entry: dict) -> bool:
+    """Return True if the database already has the file of a plan entry at its new path."""
+    if DB_VERSION >= DB_VERSION_FILE_REFACTOR:
+        row = stash_db.execute(
+            "SELECT 1 FROM files JOIN folders ON folders.id = files.parent_folder_id "
+            "WHERE files.id=? AND folders.path=? AND files.basename=?",
+            [entry["file_id"], os.path.dirname(entry["final_path"]), os.path.basename(entry["final_path"])],
+        ).fetchone()
+    else:
+        row = stash_db.execute(
+            "SELECT 1 FROM scenes WHERE id=? AND path=?", [entry["scene_id"], entry["final_path"]]
+        ).fetchone()
+    return row is not None
+
+
 def files_table_has_path(stash_db: sqlite3.Connection, folder_path: str, basename: str) -> bool:
     """Return True if the files table already has a record at (folder_path, basename).
     Used to detect file-level UNIQUE constraint conflicts before the OS move."""
@@ -1071,11 +1099,7 @@ def files_table_has_path(stash_db: sqlite3.Connection, folder_path: str, basenam
     return len(conflict) > 0
 
 
-def db_rename_refactor(stash_db: sqlite3.Connection, scene_info):
-    cursor = stash_db.cursor()
-    # 2022-09-17T11:25:52+02:00
-    mod_time = datetime.now().astimezone().isoformat("T", "seconds")
-
+def db_find_folders(cursor, stash_db: sqlite3.Connection, scene_info, mod_time, commit=True):
     # get the next id that we should use if needed
     cursor.execute("SELECT MAX(id) from folders")
     new_id = cursor.fetchall()[0][0] + 1
@@ -1125,11 +1149,29 @@ def db_rename_refactor(stash_db: sqlite3.Connection, scene_info):
                             None,
                         ],
                     )
-                    stash_db.commit()
+                    if commit:
+                        stash_db.commit()
                     folder_id = new_id
                 break
     else:
         folder_id = folder_id[0][0]
+    return old_folder_id, folder_id
+
+
+def db_rename_refactor(stash_db: sqlite3.Connection, scene_info, commit=True, folders=None):
+    # commit=False leaves the changes in the open transaction (bulk writer)
+    # folders: FolderIndex loaded for the run, replaces the folder queries below
+    cursor = stash_db.cursor()
+    # 2022-09-17T11:25:52+02:00
+    mod_time = datetime.now().astimezone().isoformat("T", "seconds")
+
+    if folders is not None:
+        old_folder_id = folders.get(scene_info["current_directory"])
+        folder_id = folders.ensure(scene_info["new_directory"], mod_time)
+        if folder_id is not None and commit:
+            stash_db.commit()
+    else:
+        old_folder_id, folder_id = db_find_folders(cursor, stash_db, scene_info, mod_time, commit)
     if folder_id:
         cursor.execute(
             "SELECT file_id from scenes_files WHERE scene_id=?",
@@ -1166,7 +1208,8 @@ def db_rename_refactor(stash_db: sqlite3.Connection, scene_info):
                 [scene_info["new_filename"], folder_id, mod_time, file_id],
             )
             cursor.close()
-            stash_db.commit()
+            if commit:
+                stash_db.commit()
         else:
             raise Exception("Failed to find file_id")
     else:
@@ -1176,7 +1219,25 @@ def db_rename_refactor(stash_db: sqlite3.Connection, scene_info):
         )
 
 
-def file_rename(current_path: str, new_path: str, scene_info: dict):
+def copy_progress(path: str):
+    # A move between two disks is a copy, report how far it is (at most every second)
+    last_report = [0.0]
+
+    def report(copied: int, total: int):
+        now = time.perf_counter()
+        if copied < total and now - last_report[0] < 1:
+            return
+        last_report[0] = now
+        if BULK_MODE:
+            # the task progress bar follows the whole run
+            log.LogDebug(f"[OS] Copying {path}: {copied * 100 // total}% of {total // 1048576} MB")
+        else:
+            log.LogProgress(copied / total)
+
+    return report
+
+
+def file_rename(current_path: str, new_path: str, scene_info: dict, status=journal.MOVED):
     # OS Rename
     if not os.path.isfile(current_path):
         log.LogWarning(f"[OS] File doesn't exist in your Disk/Drive ({current_path})")
@@ -1186,9 +1247,14 @@ def file_rename(current_path: str, new_path: str, scene_info: dict):
     current_dir = os.path.dirname(current_path)
     if not os.path.exists(new_dir):
         log.LogInfo(f"Creating folder because it don't exist ({new_dir})")
-        os.makedirs(new_dir)
+        # another move of the task renamer can create it at the same time
+        os.makedirs(new_dir, exist_ok=True)
     try:
-        shutil.move(current_path, new_path)
+        move_file(current_path, new_path, copy_progress(new_path))
+    except FileExistsError:
+        # another file took the name since the duplicate check (or since the plan was written)
+        log.LogError(f"[OS] A file already exists at the new path, not replaced ({new_path})")
+        return 1
     except PermissionError as err:
         if "[WinError 32]" in str(err) and MODULE_PSUTIL:
             log.LogWarning(
@@ -1200,12 +1266,16 @@ def file_rename(current_path: str, new_path: str, scene_info: dict):
                 # Terminate the process then try again to rename
                 log.LogDebug(f"Process that uses this file: {process_use}")
                 if PROCESS_KILL:
-                    p = psutil.Process(process_use.pid)
-                    p.terminate()
-                    p.wait(10)
+                    for pid in process_use:
+                        try:
+                            p = psutil.Process(pid)
+                            p.terminate()
+                            p.wait(10)
+                        except psutil.Error as err:
+                            log.LogDebug(f"Process {pid} not terminated ({err})")
                     # If process is not terminated, this will create an error again.
                     try:
-                        shutil.move(current_path, new_path)
+                        move_file(current_path, new_path, copy_progress(new_path))
                     except Exception as err:
                         log.LogError(
                             f"Something still prevents renaming the file. {err}"
@@ -1220,6 +1290,7 @@ def file_rename(current_path: str, new_path: str, scene_info: dict):
     # checking if the move/rename work correctly
     if os.path.isfile(new_path):
         log.LogInfo(f"[OS] File Renamed! ({current_path} -> {new_path})")
+        ASSOCIATED.moved(current_path, new_path)
         try:
             # File: chown nobody:users (UID 99, GID 100), chmod 664
             os.chown(new_path, 99, 100)
@@ -1232,58 +1303,79 @@ def file_rename(current_path: str, new_path: str, scene_info: dict):
             log.LogDebug(f"Set permissions for file and directory ({new_path})")
         except Exception as e:
             log.LogWarning(f"Could not set file permissions: {e}")
-        if LOGFILE:
+        if JOURNAL:
             try:
-                with open(LOGFILE, "a", encoding="utf-8") as f:
-                    f.write(
-                        f"{scene_info['scene_id']}|{current_path}|{new_path}|{scene_info['oshash']}\n"
-                    )
+                JOURNAL.record(
+                    current_path,
+                    new_path,
+                    status,
+                    scene_info["scene_id"],
+                    scene_info.get("file_id"),
+                    scene_info.get("oshash"),
+                )
             except Exception as err:
                 shutil.move(new_path, current_path)
                 log.LogError(
                     f"Restoring the original path, error writing the logfile: {err}"
                 )
                 return 1
-        if REMOVE_EMPTY_FOLDER:
-            with os.scandir(current_dir) as it:
-                if not any(it):
-                    log.LogInfo(f"Removing empty folder ({current_dir})")
-                    try:
-                        os.rmdir(current_dir)
-                    except Exception as err:
-                        log.logWarning(
-                            f"Fail to delete empty folder {current_dir} - {err}"
-                        )
+        if REMOVE_EMPTY_FOLDER and FOLDER_PRUNER is not None:
+            # the task renamer removes the empty folders once, at the end
+            FOLDER_PRUNER.touch(current_dir)
+        elif REMOVE_EMPTY_FOLDER:
+            try:
+                with os.scandir(current_dir) as it:
+                    empty = not any(it)
+            except FileNotFoundError:
+                # already removed after another move out of the same folder
+                empty = False
+            if empty:
+                log.LogInfo(f"Removing empty folder ({current_dir})")
+                try:
+                    os.rmdir(current_dir)
+                except Exception as err:
+                    log.LogWarning(
+                        f"Fail to delete empty folder {current_dir} - {err}"
+                    )
     else:
         # I don't think it's possible.
         log.LogError(f"[OS] Failed to rename the file ? {new_path}")
         return 1
 
 
-def associated_rename(scene_info: dict):
-    if ASSOCIATED_EXT:
-        for ext in ASSOCIATED_EXT:
-            p = os.path.splitext(scene_info["current_path"])[0] + "." + ext
-            p_new = os.path.splitext(scene_info["final_path"])[0] + "." + ext
-            if os.path.isfile(p):
-                try:
-                    shutil.move(p, p_new)
-                except Exception as err:
-                    log.LogError(
-                        f"Something prevents renaming this file '{p}' - err: {err}"
-                    )
-                    continue
-            if os.path.isfile(p_new):
-                log.LogInfo(f"[OS] Associate file renamed ({p_new})")
-                if LOGFILE:
-                    try:
-                        with open(LOGFILE, "a", encoding="utf-8") as f:
-                            f.write(f"{scene_info['scene_id']}|{p}|{p_new}\n")
-                    except Exception as err:
-                        shutil.move(p_new, p)
-                        log.LogError(
-                            f"Restoring the original name, error writing the logfile: {err}"
-                        )
+def associated_rename(scene_info: dict, associated=None):
+    # associated: names of the files found with the video before it was moved
+    moved = []
+    if associated is None:
+        associated = ASSOCIATED.find(scene_info["current_path"])
+    current_dir = os.path.dirname(scene_info["current_path"])
+    current_stem = os.path.splitext(os.path.basename(scene_info["current_path"]))[0]
+    new_stem = os.path.splitext(scene_info["final_path"])[0]
+    for name in associated:
+        p = os.path.join(current_dir, name)
+        # keep what follows the video name (movie.en.srt -> new name.en.srt)
+        p_new = new_stem + name[len(current_stem):]
+        try:
+            shutil.move(p, p_new)
+        except Exception as err:
+            log.LogError(
+                f"Something prevents renaming this file '{p}' - err: {err}"
+            )
+            continue
+        ASSOCIATED.moved(p, p_new)
+        moved.append((p, p_new))
+        log.LogInfo(f"[OS] Associate file renamed ({p_new})")
+        if JOURNAL:
+            try:
+                JOURNAL.record(p, p_new, scene_id=scene_info["scene_id"], kind="associated")
+            except Exception as err:
+                shutil.move(p_new, p)
+                ASSOCIATED.moved(p_new, p)
+                moved.pop()
+                log.LogError(
+                    f"Restoring the original name, error writing the logfile: {err}"
+                )
+    return moved
 
 
 def get_missing_required_fields(template_str: str, scene_info: dict) -> list:
@@ -1298,77 +1390,35 @@ def get_missing_required_fields(template_str: str, scene_info: dict) -> list:
         - $studio and $date are optional (inside {})
         - $title is required (outside {})
     """
-    # Strip optional groups so only required field references remain
-    required_part = re.sub(r"\{[^{}]*\}", "", template_str)
-    required_fields = re.findall(r"\$(\w+)", required_part)
     missing = []
-    for field in required_fields:
+    for field in compile_template(template_str).required:
         # Normalise: strip trailing underscore variants (e.g. performer_path)
-        key = field.strip("_")
+        key = field[1:].strip("_")
         if not scene_info.get(key):
-            missing.append(f"${field}")
+            missing.append(field)
     return missing
 
 
-def _matches_pattern(value: str, pattern_config: dict) -> bool:
-    """Check if a value matches a pattern config dict with type (exact|regex) and pattern."""
-    import re as _re
-    ptype = pattern_config.get("type", "exact")
-    pattern = pattern_config.get("pattern", "")
-    if ptype == "regex":
-        return bool(_re.search(pattern, value, _re.IGNORECASE))
-    # exact
-    return value.lower() == pattern.lower()
-
-
 def is_excluded(stash_scene: dict) -> bool:
     """Return True if the scene should be excluded from renaming based on config patterns."""
-    if not EXCLUDE_ENABLED:
+    if not EXCLUDE_MATCHER:
+        return False
+    matched = EXCLUDE_MATCHER.match(stash_scene)
+    if matched is None:
         return False
+    category, pattern, value = matched
+    log.LogDebug(f"Scene excluded by {category} pattern '{pattern}' (matched '{value}')")
+    return True
 
-    # Check tag patterns
-    if EXCLUDE_TAG_PATTERNS:
-        scene_tags = [t.get("name", "") for t in stash_scene.get("tags", [])]
-        for _key, pat in EXCLUDE_TAG_PATTERNS.items():
-            for tag_name in scene_tags:
-                if _matches_pattern(tag_name, pat):
-                    log.LogDebug(f"Scene excluded by tag pattern '{pat['pattern']}' (matched '{tag_name}')")
-                    return True
-
-    # Check studio patterns (studio + parent studio)
-    if EXCLUDE_STUDIO_PATTERNS:
-        studios_to_check = []
-        if stash_scene.get("studio"):
-            studios_to_check.append(stash_scene["studio"].get("name", ""))
-            parent = stash_scene["studio"].get("parent_studio")
-            if parent:
-                studios_to_check.append(parent.get("name", ""))
-        for _key, pat in EXCLUDE_STUDIO_PATTERNS.items():
-            for studio_name in studios_to_check:
-                if studio_name and _matches_pattern(studio_name, pat):
-                    log.LogDebug(f"Scene excluded by studio pattern '{pat['pattern']}' (matched '{studio_name}')")
-                    return True
-
-    # Check path patterns
-    if EXCLUDE_PATH_PATTERNS:
-        current_path = stash_scene.get("path") or ""
-        if not current_path and stash_scene.get("files"):
-            current_path = stash_scene["files"][0].get("path", "")
-        for _key, pat in EXCLUDE_PATH_PATTERNS.items():
-            if current_path and _matches_pattern(current_path, pat):
-                log.LogDebug(f"Scene excluded by path pattern '{pat['pattern']}' (matched '{current_path}')")
-                return True
-
-    return False
 
+def plan_scene(stash_scene: dict) -> list:
+    """Compute the new path of each file of a scene, without touching the disk or the database.
 
-def renamer(scene_id, db_conn=None):
+    Return a list of (scene_information, template, option_dryrun), one per file to rename.
+    """
     option_dryrun = False
-    if type(scene_id) is dict:
-        stash_scene = scene_id
-        scene_id = stash_scene["id"]
-    elif type(scene_id) is int:
-        stash_scene = graphql_getScene(scene_id)
+    scene_id = stash_scene["id"]
+    planned = []
 
     if (
         config.only_organized
@@ -1376,11 +1426,11 @@ def renamer(scene_id, db_conn=None):
         and not PATH_NON_ORGANIZED
     ):
         log.LogDebug(f"[{scene_id}] Scene ignored (not organized)")
-        return
+        return planned
 
     if is_excluded(stash_scene):
         log.LogDebug(f"[{scene_id}] Scene excluded by exclude pattern")
-        return
+        return planned
 
     # refractor file support
     fingerprint = []
@@ -1399,7 +1449,6 @@ def renamer(scene_id, db_conn=None):
         del stash_scene["files"]
     else:
         scene_files = []
-    stash_db = None
     for i in range(0, len(scene_files)):
         scene_file = scene_files[i]
         # refractor file support
@@ -1442,15 +1491,23 @@ def renamer(scene_id, db_conn=None):
 
         if not template["filename"] and not template["path"]:
             log.LogWarning(f"[{scene_id}] No template for this scene.")
-            return
+            return planned
 
         # log.LogDebug("Using this template: {}".format(filename_template))
-        scene_information = extract_info(stash_scene, template)
-        log.LogDebug(f"[{scene_id}] Scene information: {scene_information}")
-        log.LogDebug(f"[{scene_id}] Template: {template}")
+        fields = template_fields(
+            template["filename"],
+            template["path"]["destination"] if template.get("path") else None,
+        )
+        with TIMER.measure("extract_info", scene_id):
+            scene_information = extract_info(stash_scene, template, fields)
+        log.LogDebug("[%s] Scene information: %s", scene_id, scene_information)
+        log.LogDebug("[%s] Template: %s", scene_id, template)
 
         scene_information["scene_id"] = scene_id
+        scene_information["file_id"] = scene_file.get("id")
         scene_information["file_index"] = i
+        # associated files (subtitles, ...) follow the first file of the scene
+        scene_information["primary_file"] = i == 0
 
         # Check that all required (non-optional) template fields are present
         if REQUIRE_FIELDS:
@@ -1466,6 +1523,7 @@ def renamer(scene_id, db_conn=None):
                 )
                 continue
 
+        render_started = time.perf_counter()
         for removed_field in ORDER_SHORTFIELD:
             if removed_field:
                 if scene_information.get(removed_field.replace("$", "")):
@@ -1495,13 +1553,13 @@ def renamer(scene_id, db_conn=None):
             # check length of path
             if IGNORE_PATH_LENGTH or len(scene_information["final_path"]) <= 240:
                 break
+        TIMER.add("render", time.perf_counter() - render_started, scene_id)
 
         if check_longpath(scene_information["final_path"]):
-            if (DRY_RUN or option_dryrun) and LOGFILE:
-                with open(DRY_RUN_FILE, "a", encoding="utf-8") as f:
-                    f.write(
-                        f"[LENGTH LIMIT] {scene_information['scene_id']}|{scene_information['final_path']}\n"
-                    )
+            if DRY_RUN or option_dryrun:
+                # recorded in the dry-run journal by the main process
+                scene_information["skip"] = journal.LENGTH_LIMIT
+                planned.append((scene_information, template, option_dryrun))
             continue
 
         # log.LogDebug(f"Filename: {scene_information['current_filename']} -> {scene_information['new_filename']}")
@@ -1518,7 +1576,7 @@ def renamer(scene_id, db_conn=None):
 
         if scene_information["current_filename"] != scene_information["new_filename"]:
             log.LogInfo("The filename will be changed")
-            if ALT_DIFF_DISPLAY:
+            if ALT_DIFF_DISPLAY and log.enabled("debug"):
                 find_diff_text(
                     scene_information["current_filename"],
                     scene_information["new_filename"],
@@ -1527,119 +1585,621 @@ def renamer(scene_id, db_conn=None):
                 log.LogDebug(f"[OLD filename] {scene_information['current_filename']}")
                 log.LogDebug(f"[NEW filename] {scene_information['new_filename']}")
 
-        if (DRY_RUN or option_dryrun) and LOGFILE:
-            with open(DRY_RUN_FILE, "a", encoding="utf-8") as f:
-                f.write(
-                    f"{scene_information['scene_id']}|{scene_information['current_path']}|{scene_information['final_path']}\n"
-                )
-            continue
-        # check if there is already a file where the new path is
-        err = checking_duplicate_db(scene_information)
-        while err and scene_information["file_index"] <= len(DUPLICATE_SUFFIX):
-            log.LogDebug("Duplicate filename detected, increasing file index")
-            scene_information["file_index"] = scene_information["file_index"] + 1
-            scene_information["new_filename"] = create_new_filename(
-                scene_information, template["filename"]
-            )
-            scene_information["final_path"] = os.path.join(
-                scene_information["new_directory"], scene_information["new_filename"]
-            )
-            log.LogDebug(f"[NEW filename] {scene_information['new_filename']}")
-            log.LogDebug(f"[NEW path] {scene_information['final_path']}")
-            err = checking_duplicate_db(scene_information)
-        # abort
-        if err:
-            raise Exception("duplicate")
-        # connect to the db
-        if not db_conn:
-            stash_db = connect_db(STASH_DATABASE)
-            if stash_db is None:
-                return
-        else:
-            stash_db = db_conn
+        planned.append((scene_information, template, option_dryrun))
+    return planned
+
+
+def plan_scene_worker(stash_scene: dict):
+    # Runs in a planning process, an error must not stop the whole pool
+    log.LogDebug(f"** Checking scene: {stash_scene['title']} - {stash_scene['id']} **")
+    in_pool = multiprocessing.current_process().name != "MainProcess"
+    with GRAPHQL.scene_calls() as calls:
         try:
-            # Check the files table for a (parent_folder_id, basename) conflict BEFORE
-            # moving the file on disk. The GraphQL duplicate check queries scenes, not
-            # files, so it can miss conflicts when multiple resolution variants of the
-            # same scene are renamed concurrently and resolve to the same suffixed name
-            # (as configured via duplicate_suffix).
-            target_dir = scene_information["new_directory"]
-            target_base = scene_information["new_filename"]
-            while files_table_has_path(stash_db, target_dir, target_base):
-                log.LogDebug(
-                    f"[FILES TABLE] Conflict for '{target_base}' in '{target_dir}', increasing file index"
-                )
-                scene_information["file_index"] = scene_information["file_index"] + 1
-                if scene_information["file_index"] > len(DUPLICATE_SUFFIX):
-                    raise Exception("duplicate")
-                scene_information["new_filename"] = create_new_filename(
-                    scene_information, template["filename"]
-                )
-                scene_information["final_path"] = os.path.join(
-                    target_dir, scene_information["new_filename"]
-                )
-                target_base = scene_information["new_filename"]
-                log.LogDebug(f"[NEW filename] {scene_information['new_filename']}")
-                log.LogDebug(f"[NEW path] {scene_information['final_path']}")
+            planned = plan_scene(stash_scene)
+        except Exception as err:
+            log.LogError(f"[{stash_scene['id']}] planning error: {err}")
+            # counted as a failure by the main process
+            planned = None
+        finally:
+            # the pool ends its processes with os._exit, the buffer would be lost
+            if in_pool:
+                log.flush()
+    # the timings and queries of a planning process are merged by the main process
+    return stash_scene["id"], planned, TIMER.export() if in_pool else None, calls
 
-            # rename file on your disk
-            err = file_rename(
+
+def planning_worker_init():
+    # A forked process must not share the parent's HTTP connections
+    # and a fatal error only fails the scene (exit_plugin would print to Stash from the worker)
+    global GRAPHQL
+    GRAPHQL = GraphQLClient(FRAGMENT_SERVER)
+
+
+def resolve_duplicates(scene_information: dict, template: dict, stash_db=None):
+    """Pick the suffix of the new filename so it doesn't collide with another file.
+
+    Return the suffix used, raise an Exception("duplicate") if every suffix is taken.
+    """
+    # check if there is already a file where the new path is
+    err = checking_duplicate_db(scene_information)
+    while err and scene_information["file_index"] <= len(DUPLICATE_SUFFIX):
+        log.LogDebug("Duplicate filename detected, increasing file index")
+        scene_information["file_index"] = scene_information["file_index"] + 1
+        scene_information["new_filename"] = create_new_filename(
+            scene_information, template["filename"]
+        )
+        scene_information["final_path"] = os.path.join(
+            scene_information["new_directory"], scene_information["new_filename"]
+        )
+        log.LogDebug(f"[NEW filename] {scene_information['new_filename']}")
+        log.LogDebug(f"[NEW path] {scene_information['final_path']}")
+        err = checking_duplicate_db(scene_information)
+    # abort
+    if err:
+        raise Exception("duplicate")
+    # Check the files table for a (parent_folder_id, basename) conflict BEFORE
+    # moving the file on disk. The GraphQL duplicate check queries scenes, not
+    # files, so it can miss conflicts when multiple resolution variants of the
+    # same scene are renamed concurrently and resolve to the same suffixed name
+    # (as configured via duplicate_suffix).
+    # The bulk path index is built from the files table, so it already covered this.
+    target_dir = scene_information["new_directory"]
+    target_base = scene_information["new_filename"]
+    while (
+        PATH_INDEX is None
+        and stash_db is not None
+        and files_table_has_path(stash_db, target_dir, target_base)
+    ):
+        log.LogDebug(
+            f"[FILES TABLE] Conflict for '{target_base}' in '{target_dir}', increasing file index"
+        )
+        scene_information["file_index"] = scene_information["file_index"] + 1
+        if scene_information["file_index"] > len(DUPLICATE_SUFFIX):
+            raise Exception("duplicate")
+        scene_information["new_filename"] = create_new_filename(
+            scene_information, template["filename"]
+        )
+        scene_information["final_path"] = os.path.join(
+            target_dir, scene_information["new_filename"]
+        )
+        target_base = scene_information["new_filename"]
+        log.LogDebug(f"[NEW filename] {scene_information['new_filename']}")
+        log.LogDebug(f"[NEW path] {scene_information['final_path']}")
+    file_index = scene_information["file_index"]
+    if template["filename"] and file_index < len(DUPLICATE_SUFFIX):
+        return DUPLICATE_SUFFIX[file_index]
+    return ""
+
+
+def plan_entry(scene_information: dict, template: dict, option_dryrun: bool, stash_db=None):
+    """Resolve the duplicates of a planned file and return its plan entry (None if it can't be renamed)."""
+    if scene_information.get("skip"):
+        if DRY_RUN_JOURNAL:
+            DRY_RUN_JOURNAL.record(
                 scene_information["current_path"],
                 scene_information["final_path"],
-                scene_information,
+                scene_information["skip"],
+                scene_information["scene_id"],
+                scene_information.get("file_id"),
             )
-            if err:
-                raise Exception("rename")
-            # rename file on your db
+        return None
+    try:
+        with TIMER.measure("duplicate_check", scene_information["scene_id"]):
+            suffix = resolve_duplicates(scene_information, template, stash_db)
+    except Exception as err:
+        log.LogError(f"[{scene_information['scene_id']}] Can't rename {scene_information['current_path']} ({err})")
+        count_failure()
+        return None
+    clean_tag = None
+    if template.get("path") and "clean_tag" in template["path"]["option"]:
+        clean_tag = template["path"]["opt_details"]["clean_tag"]
+    # only the dry_run option of the template is kept: a plan written in dry-run is applied later
+    entry = rename_plan.make_entry(scene_information, suffix, option_dryrun, clean_tag)
+    if (DRY_RUN or entry["dry_run"]) and DRY_RUN_JOURNAL:
+        DRY_RUN_JOURNAL.record(
+            entry["current_path"],
+            entry["final_path"],
+            journal.DRY_RUN,
+            entry["scene_id"],
+            entry["file_id"],
+            entry["oshash"],
+        )
+    return entry
+
+
+def move_entry(entry: dict) -> list:
+    """Move the file of a plan entry (and its associated files), return the moves done."""
+    # list the associated files while the video is still next to them
+    if not os.path.isfile(entry["current_path"]) and os.path.isfile(entry["final_path"]):
+        # moved by the interrupted run being resumed, only the database is left
+        log.LogInfo(f"[{entry['scene_id']}] Already moved ({entry['final_path']})")
+        entry["already_moved"] = True
+        return [(entry["current_path"], entry["final_path"])]
+    associated = []
+    if entry["primary_file"]:
+        with TIMER.measure("associated", entry["scene_id"]):
+            associated = ASSOCIATED.find(entry["current_path"])
+    # rename file on your disk
+    with TIMER.measure("move", entry["scene_id"]):
+        err = file_rename(entry["current_path"], entry["final_path"], entry)
+    if err:
+        raise Exception("rename")
+    moves = [(entry["current_path"], entry["final_path"])]
+    if associated:
+        with TIMER.measure("associated", entry["scene_id"]):
+            moves.extend(associated_rename(entry, associated))
+    return moves
+
+
+def record_entry(entry: dict, stash_db: sqlite3.Connection, moves: list) -> bool:
+    """Update the database after the files of a plan entry were moved.
+
+    Return True if the update waits in the batch of DB_WRITER: the entry is
+    only done once that batch is committed.
+    """
+    started = time.perf_counter()
+    if entry.get("already_moved") and db_has_new_location(stash_db, entry):
+        # committed by the interrupted run after its last checkpoint, nothing to update (or revert)
+        log.LogDebug(f"[{entry['scene_id']}] Database already up to date")
+        if PATH_INDEX is not None:
+            PATH_INDEX.move(entry["current_path"], entry["final_path"])
+        return False
+    # rename file on your db
+    try:
+        if DB_WRITER:
+            DB_WRITER.begin_rename()
+        if DB_VERSION >= DB_VERSION_FILE_REFACTOR:
+            db_rename_refactor(stash_db, entry, DB_WRITER is None, FOLDER_INDEX)
+        else:
+            db_rename(stash_db, entry, DB_WRITER is None)
+    except Exception as err:
+        if DB_WRITER:
+            DB_WRITER.abort_rename()
+        log.LogError(
+            f"error when trying to update the database ({err}), revert the move..."
+        )
+        for old_path, new_path in reversed(moves[1:]):
             try:
-                if DB_VERSION >= DB_VERSION_FILE_REFACTOR:
-                    db_rename_refactor(stash_db, scene_information)
-                else:
-                    db_rename(stash_db, scene_information)
+                shutil.move(new_path, old_path)
             except Exception as err:
-                log.LogError(
-                    f"error when trying to update the database ({err}), revert the move..."
-                )
-                err = file_rename(
-                    scene_information["final_path"],
-                    scene_information["current_path"],
-                    scene_information,
-                )
-                if err:
-                    raise Exception("rename")
-                raise Exception("database update")
-            if i == 0:
-                associated_rename(scene_information)
-            if template.get("path"):
-                if "clean_tag" in template["path"]["option"]:
-                    graphql_removeScenesTag(
-                        [scene_information["scene_id"]],
-                        template["path"]["opt_details"]["clean_tag"],
-                    )
+                log.LogError(f"[OS] Failed to revert {new_path} -> {old_path} ({err})")
+                continue
+            ASSOCIATED.moved(new_path, old_path)
+            if JOURNAL:
+                JOURNAL.record(new_path, old_path, journal.REVERTED, entry["scene_id"], kind="associated")
+        err = file_rename(entry["final_path"], entry["current_path"], entry, journal.REVERTED)
+        if err:
+            raise Exception("rename")
+        raise Exception("database update")
+    if PATH_INDEX is not None:
+        PATH_INDEX.move(entry["current_path"], entry["final_path"])
+    if DB_WRITER:
+        DB_WRITER.end_rename(moves, entry.get("plan_offset"))
+    TIMER.add("db", time.perf_counter() - started, entry["scene_id"])
+    if entry["clean_tag"]:
+        # Stash needs the write lock for the mutation
+        if DB_WRITER:
+            DB_WRITER.commit()
+        graphql_removeScenesTag([entry["scene_id"]], entry["clean_tag"])
+    return DB_WRITER is not None
+
+
+def execute_entry(entry: dict, stash_db: sqlite3.Connection):
+    """Move the file of a plan entry and update the database."""
+    record_entry(entry, stash_db, move_entry(entry))
+
+
+def renamer(scene_id, db_conn=None):
+    with GRAPHQL.scene_calls() as calls:
+        rename_scene(scene_id, db_conn)
+    check_call_budget(scene_id, calls)
+
+
+def check_call_budget(scene_id, calls):
+    global SCENES_COUNTED, SCENES_OVER_BUDGET
+    SCENES_COUNTED += 1
+    total = sum(calls.values())
+    if not GRAPHQL_SCENE_BUDGET or total <= GRAPHQL_SCENE_BUDGET:
+        return
+    SCENES_OVER_BUDGET += 1
+    # a query in a loop repeats for every scene, the first ones are enough to find it
+    if SCENES_OVER_BUDGET <= 10:
+        detail = ", ".join(f"{name} {count}" for name, count in calls.most_common())
+        log.LogWarning(f"[{scene_id}] {total} GraphQL queries for this scene, budget {GRAPHQL_SCENE_BUDGET} ({detail})")
+
+
+def report_graphql():
+    if not GRAPHQL.calls:
+        return
+    lines = [f"{'GraphQL query':<20}{'calls':>8}{'per scene':>11}"]
+    for name, count in GRAPHQL.calls.most_common():
+        per_scene = f"{count / SCENES_COUNTED:.2f}" if SCENES_COUNTED else "-"
+        lines.append(f"{name:<20}{count:>8}{per_scene:>11}")
+    if SCENES_OVER_BUDGET:
+        lines.append(f"{SCENES_OVER_BUDGET} scene(s) over the budget of {GRAPHQL_SCENE_BUDGET} queries")
+    for line in lines:
+        if BULK_MODE:
+            log.LogInfo(line)
+        else:
+            log.LogDebug(line)
+
+
+def rename_scene(scene_id, db_conn=None):
+    if type(scene_id) is dict:
+        stash_scene = scene_id
+        scene_id = stash_scene["id"]
+    elif type(scene_id) is int:
+        with TIMER.measure("fetch", str(scene_id)):
+            stash_scene = graphql_getScene(scene_id)
+
+    stash_db = db_conn
+    for scene_information, template, option_dryrun in plan_scene(stash_scene):
+        if not (DRY_RUN or option_dryrun) and stash_db is None:
+            # connect to the db
+            stash_db = connect_db(STASH_DATABASE)
+            if stash_db is None:
+                return
+        entry = plan_entry(scene_information, template, option_dryrun, stash_db)
+        if entry is None or DRY_RUN or entry["dry_run"]:
+            continue
+        try:
+            execute_entry(entry, stash_db)
         except Exception as err:
             log.LogError(f"Error during database operation ({err})")
-            if not db_conn:
-                log.LogDebug("[SQLITE] Database closed")
-                stash_db.close()
             continue
     if not db_conn and stash_db:
         stash_db.close()
         log.LogInfo("[SQLITE] Database updated and closed!")
 
 
+def count_failure():
+    # a scene that couldn't be renamed, the watermark must not skip it next time
+    global RUN_FAILURES
+    RUN_FAILURES += 1
+
+
+def save_checkpoint(checkpoint, **values):
+    # the journal is synced first, so everything the checkpoint counts as done is on disk
+    if JOURNAL:
+        JOURNAL.sync()
+    values["failures"] = RUN_FAILURES
+    checkpoint.save(**values)
+
+
+def plan_bulk(scenes, stash_db: sqlite3.Connection, plan_path: str, checkpoint=None, resume=None) -> int:
+    """Plan the renames of every scene and write them to the plan file.
+
+    When resuming, the scenes up to the checkpoint are skipped and the plan
+    written so far is kept. Return the number of files to rename.
+    """
+    workers = 1
+    # the profiler only sees this process
+    if scenes.count >= PLAN_MIN_SCENES and PROFILER is None:
+        workers = PLAN_WORKERS or os.cpu_count() or 1
+    last_scene_id = 0
+    plan = rename_plan.PlanWriter(plan_path, resume["plan_offset"] if resume else None)
+    if plan.resumed:
+        last_scene_id = resume["last_scene_id"]
+        # the paths taken by the kept entries
+        for entry in rename_plan.read_plan(plan.tmp_path):
+            PATH_INDEX.move(entry["current_path"], entry["final_path"])
+        log.LogInfo(f"Plan resumed after scene {last_scene_id} ({plan.count} file(s) planned)")
+    processed = (scenes.page - 1) * scenes.page_size
+    reporter = ProgressReporter(
+        scenes.count,
+        log.LogProgress,
+        log.LogInfo,
+        PROGRESS_STEP,
+        info_interval=PROGRESS_INFO_SECONDS,
+        end=0.5,
+        done=processed,
+    )
+    todo = (scene for scene in scenes if int(scene["id"]) > last_scene_id)
+    in_pool = workers > 1 and rename_plan.can_fork()
+    for scene_id, planned, timings, calls in rename_plan.plan_map(
+        plan_scene_worker, todo, workers, planning_worker_init
+    ):
+        if in_pool:
+            TIMER.merge(timings)
+            GRAPHQL.merge_calls(calls)
+        check_call_budget(scene_id, calls)
+        if planned is None:
+            count_failure()
+            planned = []
+        for scene_information, template, option_dryrun in planned:
+            # Suffixes are chosen here, in order, so two scenes can't get the same path
+            entry = plan_entry(scene_information, template, option_dryrun, stash_db)
+            if entry is None:
+                continue
+            PATH_INDEX.move(entry["current_path"], entry["final_path"])
+            plan.write(entry)
+        processed += 1
+        if checkpoint and checkpoint.due():
+            save_checkpoint(
+                checkpoint,
+                last_scene_id=int(scene_id),
+                # page of the next scene, a resumed run starts one page before
+                page=processed // scenes.page_size + 1,
+                plan_offset=plan.offset(),
+                plan_count=plan.count,
+            )
+        reporter.advance()
+    reporter.finish()
+    plan.close()
+    log.LogInfo(f"Plan: {plan.count} file(s) to rename ({plan_path})")
+    return plan.count
+
+
+def execute_plan(plan_path: str, stash_db: sqlite3.Connection, count: int, progress=0.5, checkpoint=None, offset=0):
+    """Move the files of the plan, starting at the byte offset of an entry."""
+    reporter = ProgressReporter(
+        count,
+        log.LogProgress,
+        log.LogInfo,
+        PROGRESS_STEP,
+        info_interval=PROGRESS_INFO_SECONDS,
+        start=progress,
+        unit="files",
+    )
+    done = run_state.OrderedProgress(offset)
+
+    def committed(offsets):
+        for end in offsets:
+            done.finished(end)
+
+    # an entry only counts as done once its batch is committed: a resume redoes a rolled back batch
+    DB_WRITER.committed = committed
+
+    def entries():
+        for entry, end in rename_plan.iter_plan(plan_path, offset):
+            done.submitted(end)
+            if entry["dry_run"]:
+                done.finished(end)
+                reporter.advance()
+                continue
+            entry["plan_offset"] = end
+            yield entry, entry["current_path"], entry["final_path"]
+
+    # the moves run in threads, the database is only used from this thread.
+    # The profiler only sees this thread: the moves run in it while profiling.
+    workers = 0 if PROFILER else MOVE_WORKERS
+
+    def commit_due():
+        # waiting for a move (a copy between disks can take minutes): the open batch can't wait
+        try:
+            return DB_WRITER.commit_due()
+        except sqlite3.Error as err:
+            log.LogError(f"[SQLITE] Batch failed ({err}), its files were moved back")
+            count_failure()
+            return None
+
+    with MoveExecutor(move_entry, workers, MOVE_PER_DEVICE) as executor:
+        for entry, moves, err in executor.map(entries(), commit_due):
+            in_batch = False
+            try:
+                if err:
+                    raise err
+                in_batch = record_entry(entry, stash_db, moves)
+            except Exception as err:
+                log.LogError(f"[{entry['scene_id']}] main function error: {err}")
+                count_failure()
+                # a failed commit rolled back the batch with this entry
+                in_batch = isinstance(err, sqlite3.Error)
+            if not in_batch:
+                done.finished(entry["plan_offset"])
+            if checkpoint and checkpoint.due():
+                save_checkpoint(checkpoint, plan_offset=done.position)
+            reporter.advance()
+    reporter.finish()
+
+
+def undo_move(record: dict) -> list:
+    # runs in a MoveExecutor thread
+    if os.path.exists(record["old"]):
+        raise FileExistsError(f"{record['old']} already exists")
+    os.makedirs(os.path.dirname(record["old"]), exist_ok=True)
+    move_file(record["new"], record["old"], copy_progress(record["old"]))
+    return [(record["new"], record["old"])]
+
+
+def undo_last_run(stash_db: sqlite3.Connection) -> int:
+    """Move back the files of the last run in the journal and update the database."""
+    records = journal.moves_to_undo(journal.read_journal(LOGFILE))
+    if not records:
+        log.LogInfo("Nothing to undo")
+        return 0
+    log.LogInfo(f"Undo run {records[0]['run']}: {len(records)} file(s) to move back")
+    if DRY_RUN:
+        for record in records:
+            log.LogInfo(f"[DRY-RUN] {record['new']} -> {record['old']}")
+        return 0
+    undone = 0
+    items = ((record, record["new"], record["old"]) for record in records)
+    with MoveExecutor(undo_move, MOVE_WORKERS, MOVE_PER_DEVICE) as executor:
+        for record, moves, err in executor.map(items):
+            if err:
+                log.LogError(f"[OS] Can't move back {record['new']} ({err})")
+                continue
+            if record["kind"] == "file" and record["scene_id"]:
+                entry = {
+                    "scene_id": record["scene_id"],
+                    "current_directory": os.path.dirname(record["new"]),
+                    "new_directory": os.path.dirname(record["old"]),
+                    "new_filename": os.path.basename(record["old"]),
+                    "final_path": record["old"],
+                }
+                try:
+                    if DB_VERSION >= DB_VERSION_FILE_REFACTOR:
+                        db_rename_refactor(stash_db, entry, True, FOLDER_INDEX)
+                    else:
+                        db_rename(stash_db, entry)
+                except Exception as err:
+                    # keep the disk and the database in agreement, the move stays in the journal
+                    log.LogError(f"[{record['scene_id']}] Database not updated ({err}), moving the file again")
+                    try:
+                        move_file(record["old"], record["new"])
+                    except OSError as err:
+                        log.LogError(f"[OS] Failed to move {record['old']} -> {record['new']} ({err})")
+                    continue
+            JOURNAL.record(
+                record["new"],
+                record["old"],
+                journal.UNDONE,
+                record["scene_id"],
+                record.get("file_id"),
+                record.get("oshash"),
+                record.get("kind", "file"),
+            )
+            undone += 1
+            log.LogInfo(f"[OS] Moved back ({record['new']} -> {record['old']})")
+    return undone
+
+
+def revert_moves(moves: list):
+    # Used when a batch of database updates can't be committed
+    log.LogError(f"[SQLITE] Batch rolled back, reverting {len(moves)} move(s)...")
+    for old_path, new_path in moves:
+        try:
+            shutil.move(new_path, old_path)
+        except Exception as err:
+            log.LogError(f"[OS] Failed to revert {new_path} -> {old_path} ({err})")
+            continue
+        ASSOCIATED.moved(new_path, old_path)
+        if JOURNAL:
+            JOURNAL.record(new_path, old_path, journal.REVERTED)
+        if PATH_INDEX is not None:
+            PATH_INDEX.move(new_path, old_path)
+
+
+def start_daemon():
+    if not daemon.AVAILABLE:
+        log.LogError("The daemon needs Unix sockets, not available on this system.")
+        return 0
+    if daemon.forward(DAEMON_SOCKET, {"cmd": "ping"}):
+        log.LogInfo(f"Daemon already running ({DAEMON_SOCKET})")
+        return 1
+    fragment = dict(FRAGMENT)
+    fragment["args"] = {"mode": "daemon_serve"}
+    pid = daemon.spawn(os.path.abspath(__file__), fragment, DAEMON_LOG_FILE)
+    log.LogInfo(f"Daemon started (pid {pid}, socket {DAEMON_SOCKET})")
+    if not DAEMON_ENABLED:
+        log.LogWarning("daemon_enabled is False in config, hooks won't use the daemon.")
+    return 1
+
+
+def stop_daemon():
+    response = daemon.forward(DAEMON_SOCKET, {"cmd": "shutdown"})
+    if response is None:
+        log.LogInfo("No daemon running")
+    else:
+        log.LogInfo("Daemon stopped")
+    return 1
+
+
+def daemon_rename(request: dict):
+    # the session cookie can change between Stash restarts
+    if request.get("session"):
+        GRAPHQL.session.cookies.set("session", request["session"])
+    # each hook is its own run in the journal
+    if JOURNAL:
+        JOURNAL.run_id = journal.new_run_id()
+    # the folder listings of a run only last one hook: subtitles get added between two
+    ASSOCIATED.clear()
+    # and the pids of the lock holders get reused
+    LOCK_HOLDERS.clear()
+    try:
+        renamer(request["scene_id"])
+    finally:
+        close_journals()
+        report_timings()
+        # each hook has its own timings
+        TIMER.export()
+
+
+def report_timings():
+    if not TIMER:
+        return
+    # one line per phase in the task log, only in debug for a single scene
+    for line in TIMER.report():
+        if BULK_MODE:
+            log.LogInfo(line)
+        else:
+            log.LogDebug(line)
+    if TIMING_JSON:
+        try:
+            TIMER.write_json(TIMING_FILE)
+        except OSError as err:
+            log.LogWarning(f"Can't write the timings ({err})")
+
+
+def write_profile():
+    try:
+        PROFILER.write(PROFILE_FILE, PROFILE_REPORT_FILE, PROFILE_TOP)
+    except OSError as err:
+        log.LogWarning(f"Can't write the profile ({err})")
+        return
+    log.LogInfo(f"Profile written to {PROFILE_FILE}, top allocations and functions in {PROFILE_REPORT_FILE}")
+
+
+def close_journals():
+    for j in (JOURNAL, DRY_RUN_JOURNAL):
+        if j:
+            try:
+                j.close()
+            except OSError as err:
+                log.LogError(f"Error writing the journal {j.path}: {err}")
+
+
 def exit_plugin(msg=None, err=None):
     if msg is None and err is None:
         msg = "plugin ended"
+    if GRAPHQL.requests_sent:
+        stats = GRAPHQL.connection_stats()
+        log.LogDebug(
+            f"GraphQL: {stats['requests']} requests, {stats['opened']} connection(s) opened, {stats['reused']} reused"
+        )
+    if STUDIOS.calls_avoided:
+        log.LogDebug(
+            f"Studio cache: {STUDIOS.calls_made} GraphQL call(s) made, {STUDIOS.calls_avoided} avoided"
+        )
+    close_journals()
+    report_timings()
+    report_graphql()
+    if PROFILER:
+        write_profile()
     log.LogDebug("Execution time: {}s".format(round(time.time() - START_TIME, 5)))
+    log.flush()
     output_json = {"output": msg, "error": err}
     print(json.dumps(output_json))
     sys.exit()
 
 
+TIMER = PhaseTimer()
+# GraphQL queries per scene, see check_call_budget
+GRAPHQL_SCENE_BUDGET = getattr(config, "graphql_scene_budget", 5)
+SCENES_COUNTED = 0
+SCENES_OVER_BUDGET = 0
+# scenes of the task that failed (planning, duplicate, move or database), see count_failure
+RUN_FAILURES = 0
+# set by the 'Profile rename' task only
+PROFILER = None
+PROFILE_SCENES = getattr(config, "profile_scenes", 200)
+PROFILE_TOP = getattr(config, "profile_top", 25)
+GRAPHQL = GraphQLClient(FRAGMENT_SERVER, on_fatal=lambda msg: exit_plugin(err=msg))
+STUDIOS = StudioRegistry(graphql_getStudio, graphql_findStudios)
+
 if PLUGIN_ARGS:
     log.LogDebug("--Starting Plugin 'Renamer'--")
-    if "bulk" not in PLUGIN_ARGS:
-        if "enable" in PLUGIN_ARGS:
+    if (
+        "bulk" not in PLUGIN_ARGS
+        and "daemon_serve" not in PLUGIN_ARGS
+        and "undo" not in PLUGIN_ARGS
+    ):
+        if "daemon_start" in PLUGIN_ARGS:
+            success = start_daemon()
+        elif "daemon_stop" in PLUGIN_ARGS:
+            success = stop_daemon()
+        elif "enable" in PLUGIN_ARGS:
             log.LogInfo("Enable hook")
             success = config_edit("enable_hook", True)
         elif "disable" in PLUGIN_ARGS:
@@ -1661,6 +2221,22 @@ else:
     log.LogDebug("--Starting Hook 'Renamer'--")
     FRAGMENT_HOOK_TYPE = FRAGMENT["args"]["hookContext"]["type"]
     FRAGMENT_SCENE_ID = FRAGMENT["args"]["hookContext"]["id"]
+    if DAEMON_ENABLED:
+        session_cookie = FRAGMENT_SERVER.get("SessionCookie") or {}
+        response = daemon.forward(
+            DAEMON_SOCKET,
+            {
+                "cmd": "rename",
+                "scene_id": FRAGMENT_SCENE_ID,
+                "session": session_cookie.get("Value"),
+            },
+        )
+        if response and response["status"] == "ok":
+            log.flush()
+            sys.stderr.write(response["log"])
+            sys.stderr.flush()
+            exit_plugin("Successful! (daemon)")
+        log.LogDebug("Daemon not available, renaming in-process")
 
 LOGFILE = config.log_file
 
@@ -1674,6 +2250,8 @@ STASH_DATABASE = STASH_CONFIG["general"]["databasePath"]
 # READING CONFIG
 
 ASSOCIATED_EXT = config.associated_extension
+# each folder is listed once, "movie.en.srt" goes with "movie.mp4" too
+ASSOCIATED = AssociatedFiles(ASSOCIATED_EXT)
 
 FIELD_WHITESPACE_SEP = config.field_whitespaceSeperator
 FIELD_REPLACER = config.field_replacer
@@ -1712,6 +2290,8 @@ REMOVE_EMPTY_FOLDER = config.remove_emptyfolder
 
 PROCESS_KILL = config.process_kill_attach
 PROCESS_ALLRESULT = config.process_getall
+# one scan of the open files for the whole run, rebuilt only when a locked file isn't in it
+LOCK_HOLDERS = LockHolderIndex(psutil if MODULE_PSUTIL else None)
 UNICODE_USE = config.use_ascii
 
 ORDER_SHORTFIELD = config.order_field
@@ -1729,14 +2309,42 @@ EXCLUDE_ENABLED = getattr(config, "exclude_enabled", False)
 EXCLUDE_TAG_PATTERNS = getattr(config, "exclude_tag_patterns", {})
 EXCLUDE_STUDIO_PATTERNS = getattr(config, "exclude_studio_patterns", {})
 EXCLUDE_PATH_PATTERNS = getattr(config, "exclude_path_patterns", {})
+# compiled once, None when excluding is off
+EXCLUDE_MATCHER = None
+if EXCLUDE_ENABLED:
+    try:
+        EXCLUDE_MATCHER = ExcludeMatcher(EXCLUDE_TAG_PATTERNS, EXCLUDE_STUDIO_PATTERNS, EXCLUDE_PATH_PATTERNS)
+    except ValueError as err:
+        exit_plugin(err=str(err))
 
 # Require all template fields setting
 REQUIRE_FIELDS = getattr(config, "require_fields", True)
 
+# Only used for bulk runs, see PathIndex and BulkDBWriter
+PATH_INDEX = None
+FOLDER_INDEX = None
+DB_WRITER = None
+FOLDER_PRUNER = None
+DB_BATCH_SIZE = getattr(config, "db_batch_size", 100)
+DB_BATCH_SECONDS = getattr(config, "db_batch_seconds", 2)
+
+BATCH_PAGE_SIZE = getattr(config, "batch_page_size", 500)
+STUDIO_PRELOAD = getattr(config, "studio_preload", True)
+PLAN_WORKERS = getattr(config, "plan_workers", 0)
+MOVE_WORKERS = getattr(config, "move_workers", 4)
+MOVE_PER_DEVICE = getattr(config, "move_per_device", 2)
+# below this number of scenes, starting the planning processes costs more than it saves
+PLAN_MIN_SCENES = 200
+CHECKPOINT_INTERVAL = getattr(config, "checkpoint_interval", 5)
+PROGRESS_STEP = getattr(config, "progress_step", 0.01)
+PROGRESS_INFO_SECONDS = getattr(config, "progress_info_seconds", 30)
+TIMING_JSON = getattr(config, "timing_json", False)
+
 DB_VERSION = graphql_getBuild()
 if DB_VERSION >= DB_VERSION_FILE_REFACTOR:
     FILE_QUERY = """
             files {
+                id
                 path
                 video_codec
                 audio_codec
@@ -1771,24 +2379,200 @@ if DB_VERSION >= DB_VERSION_SCENE_STUDIO_CODE:
     FILE_QUERY = f"        code{FILE_QUERY}"
 
 if PLUGIN_ARGS:
-    if "bulk" in PLUGIN_ARGS:
-        scenes = graphql_findScene(config.batch_number_scene, "ASC")
-        log.LogDebug(f"Count scenes: {len(scenes['scenes'])}")
-        progress = 0
-        progress_step = 1 / len(scenes["scenes"])
+    if "daemon_serve" in PLUGIN_ARGS:
+        served = daemon.RenamerDaemon(
+            DAEMON_SOCKET,
+            daemon_rename,
+            [config.__file__, os.path.abspath(__file__)],
+            DAEMON_IDLE_TIMEOUT,
+        ).serve()
+        log.LogInfo(f"[DAEMON] {served} hook(s) served")
+    elif "undo" in PLUGIN_ARGS:
+        if not LOGFILE or not os.path.isfile(LOGFILE):
+            exit_plugin(err="Nothing to undo, set log_file in config to keep a journal of the renames")
         stash_db = connect_db(STASH_DATABASE)
         if stash_db is None:
             exit_plugin()
-        for scene in scenes["scenes"]:
-            log.LogDebug(f"** Checking scene: {scene['title']} - {scene['id']} **")
-            try:
-                renamer(scene, stash_db)
-            except Exception as err:
-                log.LogError(f"main function error: {err}")
-            progress += progress_step
-            log.LogProgress(progress)
+        if DB_VERSION >= DB_VERSION_FILE_REFACTOR:
+            FOLDER_INDEX = FolderIndex(stash_db)
+        undone = undo_last_run(stash_db)
+        stash_db.close()
+        log.LogInfo(f"{undone} file(s) moved back")
+    elif "bulk" in PLUGIN_ARGS:
+        if "bulk_profile" in PLUGIN_ARGS:
+            from profiling import Profiler
+
+            PROFILER = Profiler().start()
+            log.LogInfo(f"Profiling the renaming of {PROFILE_SCENES} scene(s)")
+        # Incremental: a settings (or plugin) change means every scene has to be checked again
+        run_hash = run_state.config_hash(
+            config,
+            [
+                os.path.abspath(__file__),
+                os.path.join(os.path.dirname(os.path.abspath(__file__)), "template_engine.py"),
+            ],
+        )
+        resume = None
+        if "bulk_resume" in PLUGIN_ARGS:
+            if DRY_RUN:
+                exit_plugin("Dry-run is on, disable it to resume a run")
+            resume = run_state.Checkpoint.load(CHECKPOINT_FILE)
+            if resume is None:
+                exit_plugin("No interrupted run to resume")
+            if resume["config_hash"] != run_hash:
+                exit_plugin(err="The settings changed since the interrupted run, start a new run")
+            log.LogInfo(f"Resuming run {resume['run_id']} ({resume['phase']})")
+            # same run: the undo task moves back the files of both parts
+            if JOURNAL and resume["run_id"]:
+                JOURNAL.run_id = resume["run_id"]
+            mode = resume["mode"]
+            RUN_FAILURES = resume.get("failures", 0)
+        else:
+            mode = PLUGIN_ARGS
+        apply_only = "bulk_apply" in mode
+        plan_phase = not apply_only and (resume is None or resume["phase"] == "plan")
+        if resume is None and apply_only:
+            if DRY_RUN:
+                exit_plugin("Dry-run is on, disable it to apply the rename plan")
+            if not os.path.isfile(PLAN_FILE):
+                exit_plugin(err=f"No rename plan to apply ({PLAN_FILE})")
+        checkpoint = None
+        if not DRY_RUN:
+            checkpoint = run_state.Checkpoint(
+                CHECKPOINT_FILE,
+                resume
+                or {
+                    "mode": mode,
+                    "run_id": JOURNAL.run_id if JOURNAL else None,
+                    "config_hash": run_hash,
+                    "phase": "execute" if apply_only else "plan",
+                    "watermark": None,
+                    "run_updated_at": None,
+                    "complete_run": False,
+                    "page": 1,
+                    "page_size": BATCH_PAGE_SIZE,
+                    "last_scene_id": 0,
+                    "plan_offset": 0,
+                    "plan_count": 0,
+                    "failures": 0,
+                },
+                CHECKPOINT_INTERVAL,
+            )
+        if plan_phase:
+            if resume and os.path.isfile(f"{PLAN_FILE}.tmp"):
+                watermark = resume["watermark"]
+                run_updated_at = resume["run_updated_at"]
+                # the scenes before are skipped by id, a page earlier covers deleted scenes
+                start_page = max(1, resume["page"] - 1)
+                page_size = resume["page_size"]
+            else:
+                # nothing planned to keep, the planning starts over
+                resume = None
+                watermark = None
+                # a profile always takes the first scenes, like a full run
+                if "bulk_full" not in mode and "bulk_profile" not in mode:
+                    watermark = run_state.load_watermark(WATERMARK_FILE, run_hash)
+                # taken before the scenes: a scene updated during the run is checked next time
+                run_updated_at = graphql_lastUpdated()
+                start_page = 1
+                page_size = BATCH_PAGE_SIZE
+            scene_filter = None
+            if watermark:
+                log.LogInfo(f"Scenes updated after {watermark} (use 'Rename all scenes' to check every scene)")
+                scene_filter = {"updated_at": {"value": watermark, "modifier": "GREATER_THAN"}}
+            # Sorted by id so renaming a scene (which can touch updated_at) doesn't shift the next pages
+
+            def fetch_scenes(page, per_page):
+                # a page of scenes, not counted in the scenes' own time
+                with TIMER.measure("fetch"):
+                    return graphql_findScene(per_page, "ASC", page, "id", scene_filter)
+
+            scenes = PageStream(
+                fetch_scenes,
+                "scenes",
+                page_size=page_size,
+                limit=PROFILE_SCENES if "bulk_profile" in mode else config.batch_number_scene,
+                start_page=start_page,
+            )
+            log.LogDebug(f"Count scenes: {scenes.count}")
+            if not scenes.count:
+                if checkpoint:
+                    checkpoint.clear()
+                exit_plugin("No scene to rename")
+            if checkpoint:
+                checkpoint.state.update(
+                    watermark=watermark, run_updated_at=run_updated_at, page_size=scenes.page_size
+                )
+            if STUDIO_PRELOAD:
+                log.LogDebug(f"Studios preloaded: {STUDIOS.preload()}")
+        stash_db = connect_db(STASH_DATABASE)
+        if stash_db is None:
+            exit_plugin()
+        plan_offset = 0
+        if plan_phase:
+            PATH_INDEX = PathIndex.load(stash_db, DB_VERSION >= DB_VERSION_FILE_REFACTOR)
+            log.LogDebug(f"Path index: {len(PATH_INDEX)} file(s)")
+            plan_count = plan_bulk(scenes, stash_db, PLAN_FILE, checkpoint, resume)
+            progress = 0.5
+            if DRY_RUN:
+                stash_db.close()
+                exit_plugin(f"Dry-run: {plan_count} file(s) to rename, plan written to {PLAN_FILE}")
+            # every matching scene was planned, the next run can start from here
+            save_checkpoint(
+                checkpoint,
+                phase="execute",
+                plan_offset=0,
+                plan_count=plan_count,
+                complete_run=scenes.count == scenes.total,
+            )
+        elif resume:
+            plan_count = resume["plan_count"]
+            plan_offset = resume["plan_offset"]
+            progress = 0.5
+        else:
+            plan_count = sum(1 for _ in rename_plan.read_plan(PLAN_FILE))
+            progress = 0
+            save_checkpoint(checkpoint, plan_count=plan_count)
+        if DB_VERSION >= DB_VERSION_FILE_REFACTOR:
+            FOLDER_INDEX = FolderIndex(stash_db)
+            log.LogDebug(f"Folder index: {len(FOLDER_INDEX)} folder(s)")
+        DB_WRITER = BulkDBWriter(
+            stash_db, revert_moves, DB_BATCH_SIZE, DB_BATCH_SECONDS, FOLDER_INDEX
+        )
+        if REMOVE_EMPTY_FOLDER:
+            FOLDER_PRUNER = EmptyFolderPruner(
+                stash["path"] for stash in STASH_CONFIG["general"].get("stashes") or []
+            )
+        execute_plan(PLAN_FILE, stash_db, plan_count, progress, checkpoint, plan_offset)
+        last_batch_failed = False
+        try:
+            stats = DB_WRITER.close()
+            log.LogInfo(
+                f"[SQLITE] {stats['renames']} rename(s) in {stats['commits']} commit(s) ({stats['commits_per_second']} commits/s)"
+            )
+        except sqlite3.Error as err:
+            log.LogError(f"[SQLITE] Last batch failed ({err})")
+            count_failure()
+            last_batch_failed = True
         stash_db.close()
         log.LogInfo("[SQLITE] Database closed!")
+        state = checkpoint.state
+        if not apply_only and state["complete_run"] and state["run_updated_at"]:
+            if RUN_FAILURES:
+                # the next 'Rename scenes' goes again through the scenes updated since the previous watermark
+                log.LogWarning(f"{RUN_FAILURES} scene(s) failed, the next run checks the same scenes again")
+            else:
+                run_state.save_watermark(WATERMARK_FILE, state["run_updated_at"], run_hash)
+        if last_batch_failed:
+            # its files were moved back, the checkpoint only counts the committed entries
+            log.LogWarning("Use 'Resume rename' to rename the files of the last batch")
+        else:
+            checkpoint.clear()
+        if FOLDER_PRUNER is not None:
+            for folder in FOLDER_PRUNER.prune(
+                lambda folder, err: log.LogWarning(f"Fail to delete empty folder {folder} - {err}")
+            ):
+                log.LogInfo(f"Empty folder removed ({folder})")
 else:
     try:
         renamer(FRAGMENT_SCENE_ID)
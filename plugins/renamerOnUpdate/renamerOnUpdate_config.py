@@ -107,15 +107,23 @@ p_tag_option = {}
 ######################################
 #               Logging              #
 
-# File to save what is renamed, can be useful if you need to revert changes.
-# Will look like: IDSCENE|OLD_PATH|NEW_PATH
+# File to save what is renamed, can be useful if you need to revert changes (task 'Undo last run').
+# One JSON line per file: {"run", "ts", "status", "kind", "scene_id", "file_id", "old", "new", "oshash"}
 # Leave Blank ("") or use None if you don't want to use a log file, or a working path like: C:\Users\USERNAME\.stash\plugins\Hooks\rename_log.txt
 log_file = r""
+# The log file stays open during a run. It is written to disk every journal_sync_every renames,
+# every journal_sync_ms milliseconds and at the end (0 = only at the end).
+journal_sync_every = 100
+journal_sync_ms = 1000
+# minimum level of the messages sent to the Stash log: "trace", "debug", "info", "warning" or "error".
+# Set "info" on big libraries, the debug messages of each scene aren't even built.
+log_level = "trace"
 
 ######################################
 #               Settings             #
 
-# rename associated file (subtitle, funscript) if present
+# rename associated file (subtitle, funscript) if present.
+# Files named like the video with something in between also match (movie.en.srt for movie.mp4).
 associated_extension = ["srt", "vtt", "funscript"]
 
 # use filename as title if no title is set
@@ -276,6 +284,40 @@ alt_diff_display = False
 
 # number of scene process by the task renamer. -1 = all scenes
 batch_number_scene = -1
+# number of scenes requested from Stash at once by the task renamer.
+# The next page is loaded in the background while the current one is renamed.
+batch_page_size = 500
+# load every studio (name and parent) once at the start of the task renamer,
+# instead of asking Stash for each parent studio of each scene.
+studio_preload = True
+# the task renamer commits its database changes every db_batch_size renames or db_batch_seconds seconds.
+# If a batch can't be committed, the files of that batch are moved back.
+db_batch_size = 100
+db_batch_seconds = 2
+# the task renamer first plans every rename (written to renamerOnUpdate_plan.jsonl, next to log_file),
+# then applies the plan. Number of processes used to plan, 0 = one per CPU (not used on Windows).
+plan_workers = 0
+# files on different disks are moved at the same time by the task renamer.
+# move_workers = number of moves running at once, move_per_device = at most this many on the same disk.
+move_workers = 4
+move_per_device = 2
+# seconds between two saves of the task renamer position (renamerOnUpdate_checkpoint.json), used by 'Resume rename'
+checkpoint_interval = 5
+# the task progress bar is updated when it moved by progress_step (0.01 = 1%) or every 2 seconds,
+# and a line with the rate and the remaining time is logged every progress_info_seconds (0 = never).
+progress_step = 0.01
+progress_info_seconds = 30
+# the time spent in each phase (fetch, extract_info, render, duplicate_check, move, associated, db) is logged at the end,
+# set True to also write it to renamerOnUpdate_timing.json (next to log_file, or in the plugin folder).
+timing_json = False
+# log a warning when renaming a scene takes more GraphQL queries than this (0 = no limit),
+# a query repeated in a loop makes big libraries slow. The queries of a task are summed up at the end.
+graphql_scene_budget = 5
+# the 'Profile rename' task renames the first profile_scenes scenes (like 'Rename all scenes', dry_run is respected)
+# under cProfile and tracemalloc, then writes renamerOnUpdate.prof and renamerOnUpdate_profile.txt
+# (next to log_file, or in the plugin folder) with the profile_top biggest allocations and slowest functions.
+profile_scenes = 200
+profile_top = 25
 
 # disable/enable the hook. You can edit this value in 'Plugin Tasks' inside of Stash.
 enable_hook = True
@@ -284,13 +326,23 @@ enable_hook = True
 dry_run = False
 # Choose if you want to append to (True) or overwrite (False) the dry-run log file.
 dry_run_append = True
+
+# Resident renamer (Linux/macOS only). Start it with the 'Start daemon' task.
+# When enabled, the hook sends the scene id to the running daemon instead of
+# loading everything again for each updated scene. If the daemon isn't running,
+# the hook renames the scene itself as usual.
+# The daemon stops by itself when config.py changes or after daemon_idle_timeout seconds without work.
+daemon_enabled = False
+# Path of the Unix socket, leave empty to use the temp directory.
+daemon_socket = ""
+daemon_idle_timeout = 3600
 ######################################
 #            Module Related          #
 
 # ! OPTIONAL module settings. Not needed for basic operation !
 
 # = psutil module (https://pypi.org/project/psutil/) =
-# Gets a list of all processes instead of stopping after the first one. Enabling it slows down the plugin
+# Gets a list of all processes using a locked file instead of only the first one.
 process_getall = False
 # If the file is used by a process, the plugin will kill it. IT CAN MAKE STASH CRASH TOO.
 process_kill_attach = False
@@ -0,0 +1,157 @@
+import collections
+import datetime
+import hashlib
+import json
+import os
+import time
+
+# settings that change how the plugin runs, not what the files are renamed to
+OPERATIONAL_SETTINGS = {
+    "batch_number_scene",
+    "batch_page_size",
+    "checkpoint_interval",
+    "daemon_enabled",
+    "daemon_idle_timeout",
+    "daemon_socket",
+    "db_batch_seconds",
+    "db_batch_size",
+    "dry_run",
+    "dry_run_append",
+    "enable_hook",
+    "graphql_scene_budget",
+    "journal_sync_every",
+    "journal_sync_ms",
+    "log_file",
+    "log_level",
+    "move_per_device",
+    "move_workers",
+    "plan_workers",
+    "profile_scenes",
+    "profile_top",
+    "progress_info_seconds",
+    "progress_step",
+    "studio_preload",
+    "timing_json",
+}
+
+
+def config_hash(config, code_files=()) -> str:
+    """Hash the settings that decide the new paths, and the code rendering them.
+
+    Comments, formatting and operational settings (dry-run, batch sizes...)
+    don't change the hash.
+    """
+    settings = {
+        name: repr(value)
+        for name, value in vars(config).items()
+        if not name.startswith("_")
+        and name not in OPERATIONAL_SETTINGS
+        and not callable(value)
+        and not hasattr(value, "__file__")
+    }
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    for path in code_files:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def write_json(path: str, data: dict):
+    """Replace the file atomically, a crash leaves the previous version."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def read_json(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_watermark(path: str, current_hash: str):
+    """Return the updated_at of the last complete run, None if it can't be used."""
+    state = read_json(path)
+    if not state or state.get("config_hash") != current_hash:
+        return None
+    return state.get("updated_at")
+
+
+def _second_before(updated_at: str) -> str:
+    try:
+        moment = datetime.datetime.fromisoformat(updated_at.replace("Z", "+00:00"))
+    except ValueError:
+        return updated_at
+    return (moment - datetime.timedelta(seconds=1)).isoformat()
+
+
+def save_watermark(path: str, updated_at: str, current_hash: str):
+    """Save the updated_at of a complete run, one second earlier.
+
+    updated_at has a one second resolution: a scene updated in the same
+    second, after it was read, must still be newer than the watermark.
+    Checking a scene again is harmless.
+    """
+    write_json(path, {"updated_at": _second_before(updated_at), "config_hash": current_hash})
+
+
+class Checkpoint:
+    """Position of a bulk run, saved so an interrupted run can be resumed.
+
+    `save` replaces the file atomically without fsync: it is cheap enough to
+    be called every few seconds, and a crash leaves the previous checkpoint,
+    which only makes the resumed run redo a bit more work. Callers check
+    `due()` before gathering the values to save.
+    """
+
+    def __init__(self, path: str, state: dict, interval=5.0):
+        self.path = path
+        self.state = dict(state)
+        self.interval = interval
+        self.saves = 0
+        self._last_save = time.monotonic()
+
+    @staticmethod
+    def load(path: str):
+        return read_json(path)
+
+    def due(self) -> bool:
+        return time.monotonic() - self._last_save >= self.interval
+
+    def save(self, **values):
+        self.state.update(values)
+        write_json(self.path, self.state)
+        self.saves += 1
+        self._last_save = time.monotonic()
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class OrderedProgress:
+    """Track the items of a sequence finishing out of order.
+
+    `position` is the key of the last item for which it and every item
+    before it are finished, the point a resumed run can start from.
+    """
+
+    def __init__(self, position=0):
+        self.position = position
+        self._pending = collections.deque()
+        self._finished = set()
+
+    def submitted(self, key):
+        self._pending.append(key)
+
+    def finished(self, key):
+        self._finished.add(key)
+        while self._pending and self._pending[0] in self._finished:
+            self._finished.discard(self._pending[0])
+            self.position = self._pending.popleft()
+        return self.position
@@ -0,0 +1,97 @@
+class StudioRegistry:
+    """In-memory studio hierarchy (id, name, parent id).
+
+    Studios are either preloaded with one paginated findStudios sweep or
+    fetched lazily with findStudio and memoized, so walking up the parent
+    chain doesn't cost a GraphQL round-trip per ancestor and per file.
+    """
+
+    def __init__(self, find_studio, find_studios=None):
+        # find_studio(id) -> {"id", "name", "parent_studio": {"id", "name"} | None}
+        # find_studios(page, per_page) -> {"count": int, "studios": [...]}
+        self.find_studio = find_studio
+        self.find_studios = find_studios
+        self.studios = {}
+        self.calls_made = 0
+        self.calls_avoided = 0
+
+    def remember(self, studio: dict):
+        """Add a studio already known from another query (e.g. a scene's studio).
+
+        That query returns the studio as it is now: a renamed or moved studio
+        replaces the cached one, and the cached chain of a renamed parent is
+        fetched again. The rest of the registry stays warm.
+        """
+        parent = studio.get("parent_studio")
+        known = self.studios.get(str(studio["id"]))
+        if (
+            known is None
+            or known["name"] != studio["name"]
+            or known["parent_id"] != (str(parent["id"]) if parent else None)
+        ):
+            self._add(studio)
+        if parent and parent.get("name"):
+            cached_parent = self.studios.get(str(parent["id"]))
+            if cached_parent and cached_parent["name"] != parent["name"]:
+                # the parent may have moved too, its chain is fetched again
+                self._forget_chain(str(parent["id"]))
+
+    def _forget_chain(self, studio_id: str):
+        while studio_id in self.studios:
+            studio_id = self.studios.pop(studio_id)["parent_id"]
+
+    def _add(self, studio: dict):
+        parent = studio.get("parent_studio")
+        self.studios[str(studio["id"])] = {
+            "id": studio["id"],
+            "name": studio["name"],
+            "parent_id": str(parent["id"]) if parent else None,
+        }
+
+    def preload(self, page_size=1000):
+        page = 1
+        while True:
+            result = self.find_studios(page, page_size)
+            self.calls_made += 1
+            for studio in result["studios"]:
+                self._add(studio)
+            if len(result["studios"]) < page_size or len(self.studios) >= result["count"]:
+                break
+            page += 1
+        return len(self.studios)
+
+    def _lookup(self, studio_id):
+        studio_id = str(studio_id)
+        if studio_id in self.studios:
+            self.calls_avoided += 1
+            return self.studios[studio_id]
+        studio = self.find_studio(studio_id)
+        self.calls_made += 1
+        if not studio:
+            return None
+        self._add(studio)
+        return self.studios[studio_id]
+
+    def get(self, studio_id):
+        """Return the studio shaped like a findStudio result."""
+        studio = self._lookup(studio_id)
+        if studio is None:
+            return None
+        parent = None
+        if studio["parent_id"]:
+            parent_studio = self._lookup(studio["parent_id"])
+            if parent_studio:
+                parent = {"id": parent_studio["id"], "name": parent_studio["name"]}
+        return {"id": studio["id"], "name": studio["name"], "parent_studio": parent}
+
+    def ancestors(self, studio_id) -> list:
+        """Return the parent chain of a studio, closest parent first."""
+        chain = []
+        seen = {str(studio_id)}
+        studio = self.studios.get(str(studio_id)) or self._lookup(studio_id)
+        while studio and studio["parent_id"] and studio["parent_id"] not in seen:
+            seen.add(studio["parent_id"])
+            studio = self._lookup(studio["parent_id"])
+            if studio:
+                chain.append(studio)
+        return chain
@@ -0,0 +1,100 @@
+import re
+from functools import lru_cache
+
+FIELD_PATTERN = re.compile(r"\$\w+")
+OPTIONAL_GROUP_PATTERN = re.compile(r"\{[^{}]*\}")
+
+
+class CompiledTemplate:
+    """A filename/path template parsed once into literal and field tokens.
+
+    Rendering is a single pass over the tokens. `$title` is kept as a
+    placeholder in the output and its value returned separately, so the
+    caller can clean up the text before putting the title back.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        # ("literal", text) or ("field", raw token, field name, title follows)
+        self.tokens = []
+        self.fields = set()
+        # fields outside of optional {} groups
+        self.required = FIELD_PATTERN.findall(OPTIONAL_GROUP_PATTERN.sub("", text))
+
+        fields = []
+        position = 0
+        for match in FIELD_PATTERN.finditer(text):
+            if match.start() > position:
+                self.tokens.append(("literal", text[position:match.start()]))
+            raw = match.group(0)
+            name = raw[1:].strip("_")
+            fields.append(len(self.tokens))
+            self.tokens.append(("field", raw, name, False))
+            self.fields.add(name)
+            position = match.end()
+        if position < len(text):
+            self.tokens.append(("literal", text[position:]))
+
+        # If $performer is directly followed by $title, the performer can be dropped
+        # when the title already starts with it.
+        for current, following in zip(fields, fields[1:]):
+            _, raw, name, _ = self.tokens[current]
+            if name == "performer" and self.tokens[following][2] == "title":
+                self.tokens[current] = ("field", raw, name, True)
+
+    def render(self, scene_information: dict, field_replacer=None, prevent_title_performer=False):
+        """Return the rendered text (with the $title placeholder) and the title."""
+        field_replacer = field_replacer or {}
+        title = None
+        performer = scene_information.get("performer")
+        scene_title = scene_information.get("title")
+        result = []
+        for token in self.tokens:
+            if token[0] == "literal":
+                result.append(token[1])
+                continue
+            _, raw, name, title_follows = token
+            if (
+                title_follows
+                and prevent_title_performer
+                and performer
+                and scene_title
+                and scene_title.lower().startswith(performer.lower())
+            ):
+                # Ignoring the performer field because it's already in start of title
+                continue
+            value = scene_information.get(name)
+            value = str(value) if value else ""
+            replacer = field_replacer.get(f"${name}")
+            if replacer:
+                value = value.replace(replacer["replace"], replacer["with"])
+            if name == "title":
+                title = value.strip()
+                result.append(raw)
+            elif value == "":
+                continue
+            elif raw.startswith(f"${name}"):
+                # keep the separator written right after the field ($year_$title)
+                result.append(value + raw[len(name) + 1:])
+            else:
+                result.append(raw)
+        return "".join(result), title
+
+
+@lru_cache(maxsize=1024)
+def compile_template(text: str, path=False) -> CompiledTemplate:
+    """Return the compiled template, each distinct template is parsed once."""
+    if path:
+        # a folder only contains the performer(s) selected for the path
+        text = text.replace("$performer", "$performer_path")
+    return CompiledTemplate(text)
+
+
+def template_fields(filename_template=None, path_template=None) -> set:
+    """Return the names of the fields used by a filename and a path template."""
+    fields = set()
+    if filename_template:
+        fields |= compile_template(filename_template).fields
+    if path_template:
+        fields |= compile_template(path_template, path=True).fields
+    return fields
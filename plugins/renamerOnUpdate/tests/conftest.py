@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The plugin modules live next to renamerOnUpdate.py and are imported by name,
+# the same way Stash runs the plugin from its directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
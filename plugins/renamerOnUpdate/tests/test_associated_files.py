@@ -0,0 +1,64 @@
+"""
+Unit tests for associated_files.py
+"""
+
+import pytest
+
+from associated_files import AssociatedFiles
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for name in (
+        "movie.mp4",
+        "movie.srt",
+        "movie.en.srt",
+        "movie.EN.VTT",
+        "movie.funscript",
+        "movie.nfo",
+        "movie.2.mp4",
+        "movie.2.srt",
+        "movies.srt",
+        "other.srt",
+    ):
+        (tmp_path / name).write_bytes(b"")
+    (tmp_path / "movie.srt.d").mkdir()
+    return tmp_path
+
+
+class TestAssociatedFiles:
+    def test_find(self, folder):
+        associated = AssociatedFiles(["srt", "vtt", "funscript"])
+        assert associated.find(str(folder / "movie.mp4")) == [
+            "movie.EN.VTT",
+            "movie.en.srt",
+            "movie.funscript",
+            "movie.srt",
+        ]
+        assert associated.find(str(folder / "movie.2.mp4")) == ["movie.2.srt"]
+        assert associated.scans == 1
+
+    def test_no_extension_no_scan(self, folder):
+        associated = AssociatedFiles([])
+        assert associated.find(str(folder / "movie.mp4")) == []
+        assert associated.scans == 0
+
+    def test_moved_updates_listing(self, folder, tmp_path):
+        associated = AssociatedFiles(["srt"])
+        assert associated.find(str(folder / "other.mp4")) == ["other.srt"]
+        associated.moved(str(folder / "other.srt"), str(folder / "new.srt"))
+        assert associated.find(str(folder / "other.mp4")) == []
+        assert associated.find(str(folder / "new.mp4")) == ["new.srt"]
+        assert associated.scans == 1
+
+    def test_clear_lists_again(self, folder):
+        associated = AssociatedFiles(["srt"])
+        assert associated.find(str(folder / "late.mp4")) == []
+        (folder / "late.srt").write_bytes(b"")
+        associated.clear()
+        assert associated.find(str(folder / "late.mp4")) == ["late.srt"]
+        assert associated.scans == 2
+
+    def test_missing_folder(self, tmp_path):
+        associated = AssociatedFiles(["srt"])
+        assert associated.find(str(tmp_path / "gone" / "movie.mp4")) == []
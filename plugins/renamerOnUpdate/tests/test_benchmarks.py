@@ -0,0 +1,110 @@
+"""
+Tests for the benchmark harness (benchmarks/)
+"""
+
+import os
+import sqlite3
+
+import requests
+
+from benchmarks.fake_stash import FakeStash
+from benchmarks.run import benchmark, compare, count_renamed, run_plugin, setup
+from benchmarks.synthetic import Library, create_database, create_files
+
+
+def _library(tmp_path, scenes=30):
+    library = Library(scenes, str(tmp_path / "library"))
+    create_files(library)
+    create_database(library, str(tmp_path / "stash.sqlite"))
+    return library
+
+
+class TestSynthetic:
+    def test_scenes_are_reproducible(self, tmp_path):
+        a = Library(100, str(tmp_path))
+        b = Library(100, str(tmp_path))
+        assert a.scene(42) == b.scene(42)
+        assert a.scene(42) != a.scene(43)
+        assert Library(100, str(tmp_path), seed=2).scene(42) != a.scene(42)
+
+    def test_files_and_database(self, tmp_path):
+        library = _library(tmp_path)
+        path = library.path(7)
+        assert os.path.getsize(path) == library.size(7)
+        stash_db = sqlite3.connect(str(tmp_path / "stash.sqlite"))
+        row = stash_db.execute(
+            "SELECT folders.path, files.basename FROM scenes_files JOIN files ON files.id = scenes_files.file_id "
+            "JOIN folders ON folders.id = files.parent_folder_id WHERE scene_id = 7"
+        ).fetchone()
+        assert os.path.join(*row) == path
+        # every folder up to the library root is known
+        assert stash_db.execute("SELECT COUNT(*) FROM folders WHERE path = ?", [library.root]).fetchone()[0] == 1
+        stash_db.close()
+
+
+class TestFakeStash:
+    def test_queries(self, tmp_path):
+        library = _library(tmp_path)
+        with FakeStash(library, str(tmp_path / "stash.sqlite")) as stash:
+            url = f"http://127.0.0.1:{stash.port}/graphql"
+
+            def call(query, variables=None):
+                return requests.post(url, json={"query": query, "variables": variables}).json()["data"]
+
+            assert call("{ systemStatus { databaseSchema } }")["systemStatus"]["databaseSchema"] >= 38
+            page = call(
+                "query FindScenes($filter: FindFilterType) { ... }",
+                {"filter": {"page": 2, "per_page": 20, "sort": "id", "direction": "ASC"}},
+            )["findScenes"]
+            assert page["count"] == 30
+            assert [s["id"] for s in page["scenes"]] == [str(i) for i in range(21, 31)]
+            found = call(
+                "query FindScenes($scene_filter: SceneFilterType) { ... }",
+                {"scene_filter": {"path": {"value": library.path(3), "modifier": "EQUALS"}}},
+            )["findScenes"]
+            assert [s["id"] for s in found["scenes"]] == ["3"]
+            assert call("query FindScene($id: ID!) { ... }", {"id": 5})["findScene"]["files"][0]["path"] == library.path(5)
+            assert stash.calls == {"systemStatus": 1, "FindScenes": 2, "FindScene": 1}
+
+
+class TestRun:
+    def test_bulk_renames_the_library(self):
+        results = benchmark(60, ["bulk"], hook_sample=0)
+        assert results[0]["mode"] == "bulk"
+        assert results[0]["scenes_per_second"] > 0
+        # scenes without a studio are skipped ($studio is required)
+        assert results[0]["renamed"] >= 50
+        assert results[0]["graphql_calls"]["FindScenes"] >= 1
+
+    def test_apply_a_dry_run_plan(self, tmp_path):
+        library = setup(40, str(tmp_path))
+        config = tmp_path / "plugin" / "config.py"
+        written = config.read_text(encoding="utf-8")
+        config.write_text(written + "dry_run = True\n", encoding="utf-8")
+        with FakeStash(library, str(tmp_path / "stash.sqlite")) as stash:
+            run_plugin(stash, str(tmp_path), {"mode": "bulk_full"})
+            planned = (tmp_path / "renamerOnUpdate_plan.jsonl").read_text(encoding="utf-8").splitlines()
+            assert len(planned) >= 30
+            assert count_renamed(library) == 0
+            # the same plan, dry-run disabled
+            config.write_text(written, encoding="utf-8")
+            run_plugin(stash, str(tmp_path), {"mode": "bulk_apply"})
+        assert count_renamed(library) == len(planned)
+
+    def test_compare(self):
+        baseline = {"bulk": {"1000": {"scenes_per_second": 100}}}
+        results = [
+            {"mode": "bulk", "size": 1000, "scenes_per_second": 80},
+            {"mode": "hook", "size": 1000, "scenes_per_second": 1},
+        ]
+        assert compare(results, baseline, 0.25) == []
+        results[0]["scenes_per_second"] = 70
+        assert len(compare(results, baseline, 0.25)) == 1
+
+    def test_compare_graphql_calls(self):
+        baseline = {"hook": {"1000": {"scenes_per_second": 1, "graphql_calls": {"FindScene": 50}}}}
+        results = [{"mode": "hook", "size": 1000, "scenes_per_second": 1, "graphql_calls": {"FindScene": 50}}]
+        assert compare(results, baseline, 0.25) == []
+        # a query added in a loop
+        results[0]["graphql_calls"]["FindStudio"] = 50
+        assert compare(results, baseline, 0.25) == ["hook 1000: 50 FindStudio queries, baseline 0"]
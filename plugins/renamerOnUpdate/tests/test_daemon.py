@@ -0,0 +1,73 @@
+"""
+Unit tests for daemon.py
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+
+import daemon
+import log
+
+pytestmark = pytest.mark.skipif(not daemon.AVAILABLE, reason="needs Unix sockets")
+
+
+@pytest.fixture
+def socket_path():
+    # AF_UNIX paths are limited to ~100 characters, keep it short
+    directory = tempfile.mkdtemp(prefix="rou")
+    yield os.path.join(directory, "d.sock")
+
+
+def _start(socket_path, handler, watched=()):
+    server = daemon.RenamerDaemon(socket_path, handler, watched, idle_timeout=10)
+    thread = threading.Thread(target=server.serve, daemon=True)
+    thread.start()
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.01)
+    return server, thread
+
+
+class TestDaemon:
+    def test_forward_without_daemon(self, socket_path):
+        assert daemon.forward(socket_path, {"cmd": "ping"}) is None
+
+    def test_rename_request_and_log_capture(self, socket_path):
+        received = []
+
+        def handler(request):
+            received.append(request["scene_id"])
+            log.LogInfo(f"renamed {request['scene_id']}")
+
+        _, thread = _start(socket_path, handler)
+        response = daemon.forward(socket_path, {"cmd": "rename", "scene_id": 42})
+        assert response["status"] == "ok"
+        assert received == [42]
+        assert "\x01i\x02renamed 42" in response["log"]
+        assert daemon.forward(socket_path, {"cmd": "shutdown"})["status"] == "shutdown"
+        thread.join(2)
+        assert not os.path.exists(socket_path)
+
+    def test_fatal_error_reported(self, socket_path):
+        def handler(request):
+            raise SystemExit("401")
+
+        _start(socket_path, handler)
+        response = daemon.forward(socket_path, {"cmd": "rename", "scene_id": 1})
+        assert response["status"] == "error"
+        daemon.forward(socket_path, {"cmd": "shutdown"})
+
+    def test_stale_when_config_changes(self, socket_path, tmp_path):
+        config_file = tmp_path / "config.py"
+        config_file.write_text("a = 1\n")
+        _, thread = _start(socket_path, lambda r: None, [str(config_file)])
+        assert daemon.forward(socket_path, {"cmd": "rename", "scene_id": 1})["status"] == "ok"
+        os.utime(config_file, (0, 0))
+        assert daemon.forward(socket_path, {"cmd": "rename", "scene_id": 1})["status"] == "stale"
+        thread.join(2)
+        assert daemon.forward(socket_path, {"cmd": "ping"}) is None
@@ -0,0 +1,215 @@
+"""
+Unit tests for db_operations.py
+
+Uses an in-memory SQLite database with the subset of Stash's schema the
+plugin touches.
+"""
+
+import os
+import sqlite3
+
+import pytest
+
+from db_operations import BulkDBWriter, FolderIndex, PathIndex
+
+SCHEMA = """
+CREATE TABLE folders (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    basename TEXT,
+    parent_folder_id INTEGER,
+    mod_time TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    zip_file_id INTEGER
+);
+CREATE TABLE files (
+    id INTEGER PRIMARY KEY,
+    basename TEXT NOT NULL,
+    parent_folder_id INTEGER NOT NULL,
+    updated_at TEXT,
+    UNIQUE (parent_folder_id, basename)
+);
+CREATE TABLE scenes_files (
+    scene_id INTEGER,
+    file_id INTEGER
+);
+"""
+
+
+@pytest.fixture
+def stash_db():
+    db = sqlite3.connect(":memory:")
+    db.executescript(SCHEMA)
+    root = os.path.join(os.sep, "data")
+    db.execute("INSERT INTO folders (id, path, basename) VALUES (1, ?, 'data')", [root])
+    db.execute(
+        "INSERT INTO folders (id, path, basename, parent_folder_id) VALUES (2, ?, 'a', 1)",
+        [os.path.join(root, "a")],
+    )
+    db.execute("INSERT INTO files (id, basename, parent_folder_id) VALUES (1, 'x.mp4', 1)")
+    db.execute("INSERT INTO files (id, basename, parent_folder_id) VALUES (2, 'y.mp4', 2)")
+    db.execute("INSERT INTO scenes_files VALUES (10, 1), (20, 2)")
+    db.commit()
+    yield db
+    db.close()
+
+
+class TestPathIndex:
+    def test_load_from_files_table(self, stash_db):
+        index = PathIndex.load(stash_db)
+        assert len(index) == 2
+        assert os.path.join(os.sep, "data", "x.mp4") in index
+        assert os.path.join(os.sep, "data", "a", "y.mp4") in index
+        assert os.path.join(os.sep, "data", "a", "x.mp4") not in index
+
+    def test_normalized_lookup(self, stash_db):
+        index = PathIndex.load(stash_db)
+        assert os.path.join(os.sep, "data", "a", "..", "x.mp4") in index
+
+    def test_move_records_planned_target(self, stash_db):
+        index = PathIndex.load(stash_db)
+        old = os.path.join(os.sep, "data", "x.mp4")
+        new = os.path.join(os.sep, "data", "a", "z.mp4")
+        index.move(old, new)
+        assert old not in index
+        assert new in index
+
+
+class TestBulkDBWriter:
+    def _rename(self, writer, stash_db, file_id, basename, move, key=None):
+        writer.begin_rename()
+        stash_db.execute("UPDATE files SET basename=? WHERE id=?", [basename, file_id])
+        writer.end_rename([move], key)
+
+    def _basenames(self, path):
+        db = sqlite3.connect(path)
+        rows = dict(db.execute("SELECT id, basename FROM files"))
+        db.close()
+        return rows
+
+    @pytest.fixture
+    def file_db(self, tmp_path, stash_db):
+        path = str(tmp_path / "stash.sqlite")
+        db = sqlite3.connect(path)
+        stash_db.backup(db)
+        yield path, db
+        db.close()
+
+    def test_commits_every_n_renames(self, file_db):
+        path, db = file_db
+        writer = BulkDBWriter(db, lambda moves: None, max_renames=2, max_seconds=60)
+        self._rename(writer, db, 1, "a.mp4", ("x", "a"))
+        # not visible from another connection yet
+        assert self._basenames(path)[1] == "x.mp4"
+        self._rename(writer, db, 2, "b.mp4", ("y", "b"))
+        assert self._basenames(path) == {1: "a.mp4", 2: "b.mp4"}
+        assert writer.close()["commits"] == 1
+
+    def test_close_commits_remaining(self, file_db):
+        path, db = file_db
+        writer = BulkDBWriter(db, lambda moves: None, max_renames=100, max_seconds=60)
+        self._rename(writer, db, 1, "a.mp4", ("x", "a"))
+        stats = writer.close()
+        assert stats["renames"] == 1 and stats["commits"] == 1
+        assert self._basenames(path)[1] == "a.mp4"
+
+    def test_commit_due(self, file_db):
+        path, db = file_db
+        writer = BulkDBWriter(db, lambda moves: None, max_renames=100, max_seconds=60)
+        assert writer.commit_due() is None
+        self._rename(writer, db, 1, "a.mp4", ("x", "a"))
+        assert 0 < writer.commit_due() <= 60
+        assert self._basenames(path)[1] == "x.mp4"
+        # the batch is old enough while the next move still runs
+        writer.batch_started -= 60
+        assert writer.commit_due() is None
+        assert self._basenames(path)[1] == "a.mp4"
+        assert writer.stats()["commits"] == 1
+
+    def test_abort_rename_keeps_batch(self, file_db):
+        path, db = file_db
+        writer = BulkDBWriter(db, lambda moves: None, max_renames=100, max_seconds=60)
+        self._rename(writer, db, 1, "a.mp4", ("x", "a"))
+        writer.begin_rename()
+        db.execute("UPDATE files SET basename='b.mp4' WHERE id=2")
+        writer.abort_rename()
+        writer.close()
+        assert self._basenames(path) == {1: "a.mp4", 2: "y.mp4"}
+
+    def test_rollback_reverts_moves(self, file_db):
+        path, db = file_db
+        reverted = []
+        writer = BulkDBWriter(db, reverted.extend, max_renames=100, max_seconds=60)
+        self._rename(writer, db, 1, "a.mp4", ("x", "a"))
+        self._rename(writer, db, 2, "b.mp4", ("y", "b"))
+        writer.rollback()
+        assert reverted == [("y", "b"), ("x", "a")]
+        assert self._basenames(path) == {1: "x.mp4", 2: "y.mp4"}
+
+    def test_keys_released_on_commit_only(self, file_db):
+        _, db = file_db
+        committed = []
+        writer = BulkDBWriter(db, lambda moves: None, max_renames=2, max_seconds=60, committed=committed.extend)
+        self._rename(writer, db, 1, "a.mp4", ("x", "a"), key=10)
+        assert committed == []
+        self._rename(writer, db, 2, "b.mp4", ("y", "b"), key=20)
+        assert committed == [10, 20]
+        # a rolled back batch is never done
+        self._rename(writer, db, 1, "c.mp4", ("a", "c"), key=30)
+        writer.rollback()
+        writer.close()
+        assert committed == [10, 20]
+
+
+class TestFolderIndex:
+    def _path(self, *parts):
+        return os.path.join(os.sep, "data", *parts)
+
+    def test_lookup(self, stash_db):
+        folders = FolderIndex(stash_db)
+        assert len(folders) == 2
+        assert folders.get(self._path()) == 1
+        assert folders.get(self._path("a")) == 2
+        assert folders.get(self._path("a") + os.sep) == 2
+        assert folders.get(self._path("b")) is None
+
+    def test_lookup_by_parent_and_basename(self, stash_db):
+        # path stored differently than it's looked up
+        stash_db.execute(
+            "INSERT INTO folders (id, path, basename, parent_folder_id) VALUES (3, 'weird', 'c', 2)"
+        )
+        folders = FolderIndex(stash_db)
+        assert folders.get(self._path("a", "c")) == 3
+
+    def test_ensure_creates_missing_levels(self, stash_db):
+        folders = FolderIndex(stash_db)
+        new_dir = self._path("a", "b", "c")
+        folder_id = folders.ensure(new_dir, "2024-01-01T00:00:00+00:00")
+        rows = {
+            path: (folder_id, parent)
+            for folder_id, path, parent in stash_db.execute("SELECT id, path, parent_folder_id FROM folders")
+        }
+        assert rows[self._path("a", "b")] == (3, 2)
+        assert rows[new_dir] == (4, 3)
+        assert folder_id == 4
+        # now served from memory
+        assert folders.ensure(new_dir, "") == 4
+
+    def test_ensure_outside_library(self, stash_db):
+        folders = FolderIndex(stash_db)
+        assert folders.ensure(os.path.join(os.sep, "elsewhere", "x"), "") is None
+
+    def test_ensure_recovers_from_id_conflict(self, stash_db):
+        folders = FolderIndex(stash_db)
+        stash_db.execute("INSERT INTO folders (id, path, basename) VALUES (3, '/other', 'other')")
+        assert folders.ensure(self._path("b"), "") == 4
+
+    def test_writer_abort_forgets_inserted_folders(self, stash_db):
+        folders = FolderIndex(stash_db)
+        writer = BulkDBWriter(stash_db, lambda moves: None, folders=folders)
+        writer.begin_rename()
+        folders.ensure(self._path("new"), "")
+        writer.abort_rename()
+        assert folders.get(self._path("new")) is None
+        assert stash_db.execute("SELECT COUNT(*) FROM folders").fetchone()[0] == 2
@@ -0,0 +1,106 @@
+"""
+Unit tests for exclude_matcher.py
+"""
+
+import pytest
+
+from exclude_matcher import CategoryMatcher, ExcludeMatcher
+from tests.test_renamer import _scene, is_excluded
+
+TAGS = {
+    "wip": {"type": "exact", "pattern": "WIP"},
+    "western": {"type": "exact", "pattern": "!1. Western"},
+    "temp": {"type": "regex", "pattern": r"temp.*"},
+    "draft": {"type": "regex", "pattern": r"^(draft|rough) cut$"},
+}
+STUDIOS = {
+    "test": {"type": "exact", "pattern": "Test Studio"},
+    "network": {"type": "regex", "pattern": r"network \d+"},
+}
+PATHS = {
+    "loeschen": {"type": "regex", "pattern": r".*/loeschen/.*"},
+    "tosort": {"type": "exact", "pattern": "/data/tosort/video.mkv"},
+}
+
+
+class TestCategoryMatcher:
+    def test_exact_ignores_case(self):
+        matcher = CategoryMatcher("tag", TAGS)
+        assert matcher.match("wip") == "WIP"
+        assert matcher.match("!1. WESTERN") == "!1. Western"
+        assert matcher.match("WIP 2") is None
+
+    def test_reports_the_regex_that_matched(self):
+        matcher = CategoryMatcher("tag", TAGS)
+        assert matcher.match("Temporary") == r"temp.*"
+        assert matcher.match("Rough Cut") == r"^(draft|rough) cut$"
+        assert matcher.match("rough cut extended") is None
+        # all the regexes are one compiled pattern
+        assert matcher.combined.pattern.count("(?P<p") == 2
+
+    def test_patterns_kept_apart(self):
+        matcher = CategoryMatcher(
+            "tag",
+            {
+                "double": {"type": "regex", "pattern": r"(a)\1"},
+                "named": {"type": "regex", "pattern": r"(?P<word>x+)"},
+                "flags": {"type": "regex", "pattern": r"(?s)a.b"},
+                "plain": {"type": "regex", "pattern": r"b"},
+            },
+        )
+        assert len(matcher.separate) == 3
+        assert matcher.match("aa") == r"(a)\1"
+        assert matcher.match("ab") == r"b"
+        assert matcher.match("xx") == r"(?P<word>x+)"
+        assert matcher.match("a\nc") is None
+
+    def test_invalid_regex(self):
+        with pytest.raises(ValueError, match="invalid path exclude pattern 'broken'"):
+            CategoryMatcher("path", {"broken": {"type": "regex", "pattern": r"data/("}})
+
+    def test_empty(self):
+        assert not CategoryMatcher("tag", {})
+        assert CategoryMatcher("tag", {"a": {"pattern": "a"}})
+
+
+class TestExcludeMatcher:
+    def test_match(self):
+        matcher = ExcludeMatcher(TAGS, STUDIOS, PATHS)
+        assert matcher.match(_scene(tags=["Action", "wip"])) == ("tag", "WIP", "wip")
+        assert matcher.match(_scene(studio="Sub", parent_studio="Network 7")) == ("studio", r"network \d+", "Network 7")
+        assert matcher.match(_scene(path="/data/loeschen/a.mkv")) == ("path", r".*/loeschen/.*", "/data/loeschen/a.mkv")
+        assert matcher.match(_scene(tags=["Action"], studio="Other")) is None
+
+    def test_path_of_the_file(self):
+        scene = _scene(path="/data/tosort/video.mkv")
+        scene["path"] = None
+        assert ExcludeMatcher(path_patterns=PATHS).match(scene)[0] == "path"
+
+    def test_empty(self):
+        assert not ExcludeMatcher()
+        assert ExcludeMatcher({}, {}, PATHS)
+
+    @pytest.mark.parametrize(
+        "scene",
+        [
+            _scene(),
+            _scene(tags=["Temp files"]),
+            _scene(tags=["Draft cut", "HD"]),
+            _scene(tags=["draft cut 2"]),
+            _scene(studio="test studio"),
+            _scene(studio="Test Studio Extra"),
+            _scene(studio="Child", parent_studio="The Network 12"),
+            _scene(path="/DATA/LOESCHEN/x.mkv"),
+            _scene(path="/data/tosort/video.mkv"),
+            _scene(path="/data/tosort/other.mkv"),
+        ],
+    )
+    def test_same_result_as_the_loops(self, scene):
+        # the pattern by pattern matching it replaces (see test_renamer)
+        expected = is_excluded(
+            scene,
+            exclude_tag_patterns=TAGS,
+            exclude_studio_patterns=STUDIOS,
+            exclude_path_patterns=PATHS,
+        )
+        assert (ExcludeMatcher(TAGS, STUDIOS, PATHS).match(scene) is not None) == expected
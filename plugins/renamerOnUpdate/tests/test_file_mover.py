@@ -0,0 +1,186 @@
+"""
+Unit tests for file_mover.py
+"""
+
+import errno
+import os
+from unittest import mock
+
+import pytest
+
+import file_mover
+from file_mover import (
+    PART_SUFFIX,
+    EmptyFolderPruner,
+    copy_file,
+    copy_methods,
+    move_file,
+    resume_offset,
+)
+
+DATA = bytes(range(256)) * 4096  # 1 MiB
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "src" / "scene.mp4"
+    path.parent.mkdir()
+    path.write_bytes(DATA)
+    return path
+
+
+def _cross_device():
+    def rename(src, dst):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    return mock.patch.object(file_mover.os, "rename", rename)
+
+
+class TestCopyFile:
+    @pytest.mark.parametrize("method", copy_methods())
+    def test_each_method(self, source, tmp_path, method):
+        destination = tmp_path / "copy.mp4"
+        progress = []
+        copied = copy_file(str(source), str(destination), lambda c, t: progress.append(c), 100000, [method])
+        assert copied == len(DATA)
+        assert destination.read_bytes() == DATA
+        assert progress[-1] == len(DATA)
+        assert len(progress) == -(-len(DATA) // 100000)
+
+    def test_falls_back_when_unsupported(self, source, tmp_path):
+        def unsupported(src_fd, dst_fd, offset, count):
+            raise OSError(errno.EXDEV, "not here")
+
+        destination = tmp_path / "copy.mp4"
+        copy_file(str(source), str(destination), methods=[unsupported, file_mover._read_write])
+        assert destination.read_bytes() == DATA
+
+    def test_real_error_is_raised(self, source, tmp_path):
+        def full(src_fd, dst_fd, offset, count):
+            raise OSError(errno.ENOSPC, "No space left on device")
+
+        with pytest.raises(OSError):
+            copy_file(str(source), str(tmp_path / "copy.mp4"), methods=[full, file_mover._read_write])
+
+
+class TestResume:
+    def test_resumes_valid_part(self, source, tmp_path):
+        part = tmp_path / "copy.mp4"
+        part.write_bytes(DATA[:300000])
+        assert resume_offset(str(source), str(part)) == 300000
+        assert copy_file(str(source), str(part)) == len(DATA) - 300000
+        assert part.read_bytes() == DATA
+
+    def test_restarts_corrupted_part(self, source, tmp_path):
+        part = tmp_path / "copy.mp4"
+        part.write_bytes(DATA[:299999] + b"\xff")
+        assert resume_offset(str(source), str(part)) == 0
+        assert copy_file(str(source), str(part)) == len(DATA)
+        assert part.read_bytes() == DATA
+
+    def test_restarts_part_bigger_than_source(self, source, tmp_path):
+        part = tmp_path / "copy.mp4"
+        part.write_bytes(DATA + b"extra")
+        assert resume_offset(str(source), str(part)) == 0
+
+
+class TestMoveFile:
+    def test_same_filesystem_rename(self, source, tmp_path):
+        destination = tmp_path / "renamed.mp4"
+        move_file(str(source), str(destination))
+        assert not source.exists()
+        assert destination.read_bytes() == DATA
+
+    def test_cross_device_copy(self, source, tmp_path):
+        destination = tmp_path / "other" / "renamed.mp4"
+        destination.parent.mkdir()
+        os.utime(source, (1000000000, 1000000000))
+        with _cross_device():
+            move_file(str(source), str(destination))
+        assert not source.exists()
+        assert destination.read_bytes() == DATA
+        assert os.path.getmtime(destination) == 1000000000
+        assert not os.path.exists(str(destination) + PART_SUFFIX)
+
+    @pytest.mark.parametrize("cross_device", [False, True])
+    def test_existing_destination_is_kept(self, source, tmp_path, cross_device):
+        destination = tmp_path / "taken.mp4"
+        destination.write_bytes(b"other video")
+        with pytest.raises(FileExistsError):
+            if cross_device:
+                with _cross_device():
+                    move_file(str(source), str(destination))
+            else:
+                move_file(str(source), str(destination))
+        assert source.read_bytes() == DATA
+        assert destination.read_bytes() == b"other video"
+
+    def test_same_file_destination(self, source):
+        # a change of case on a case-insensitive disk: the destination "exists", it's the source
+        with mock.patch.object(file_mover, "_same_file", return_value=True), mock.patch.object(
+            file_mover.os.path, "lexists", return_value=True
+        ):
+            move_file(str(source), str(source.with_name("Scene.mp4")))
+        assert source.with_name("Scene.mp4").read_bytes() == DATA
+
+    def test_interrupted_copy_keeps_source(self, source, tmp_path):
+        destination = tmp_path / "renamed.mp4"
+
+        def crash(copied, total):
+            raise KeyboardInterrupt
+
+        with _cross_device(), pytest.raises(KeyboardInterrupt):
+            move_file(str(source), str(destination), crash, chunk_size=100000)
+        assert source.read_bytes() == DATA
+        assert not destination.exists()
+        assert os.path.getsize(str(destination) + PART_SUFFIX) == 100000
+        # the next move picks the copy up where it stopped
+        progress = []
+        with _cross_device():
+            move_file(str(source), str(destination), lambda c, t: progress.append(c), 100000)
+        assert progress[0] == 200000
+        assert destination.read_bytes() == DATA
+
+
+class TestEmptyFolderPruner:
+    def test_prunes_bottom_up_within_library(self, tmp_path):
+        library = tmp_path / "library"
+        (library / "Studio" / "2020" / "Scene").mkdir(parents=True)
+        (library / "Studio" / "2021").mkdir()
+        (library / "Other" / "kept").mkdir(parents=True)
+        (library / "Other" / "kept" / "scene.mp4").write_bytes(b"x")
+        pruner = EmptyFolderPruner([str(library)])
+        pruner.touch(str(library / "Studio" / "2020" / "Scene"))
+        pruner.touch(str(library / "Studio" / "2021"))
+        pruner.touch(str(library / "Other" / "kept"))
+        removed = pruner.prune()
+        assert sorted(removed) == sorted(
+            str(library / p) for p in ("Studio/2020/Scene", "Studio/2020", "Studio/2021", "Studio")
+        )
+        assert library.is_dir()
+        assert (library / "Other" / "kept").is_dir()
+
+    def test_library_root_is_kept(self, tmp_path):
+        library = tmp_path / "library"
+        library.mkdir()
+        pruner = EmptyFolderPruner([str(library) + os.sep])
+        pruner.touch(str(library))
+        assert pruner.prune() == []
+        assert library.is_dir()
+
+    def test_unknown_library_does_not_go_up(self, tmp_path):
+        folder = tmp_path / "outside" / "empty"
+        folder.mkdir(parents=True)
+        pruner = EmptyFolderPruner([str(tmp_path / "library")])
+        pruner.touch(str(folder))
+        assert pruner.prune() == [str(folder)]
+        assert (tmp_path / "outside").is_dir()
+
+    def test_each_folder_listed_once(self, tmp_path):
+        library = tmp_path / "library"
+        (library / "a" / "b").mkdir(parents=True)
+        pruner = EmptyFolderPruner([str(library)])
+        for _ in range(3):
+            pruner.touch(str(library / "a" / "b"))
+            pruner.touch(str(library / "a"))
+        assert pruner.candidates() == [str(library / "a" / "b"), str(library / "a")]
@@ -0,0 +1,157 @@
+"""
+Unit tests for graphql_client.py
+
+Tests run against a small local HTTP server standing in for Stash.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from graphql_client import GraphQLClient, PageStream, operation_name
+
+
+class _StashHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.cookies.append(self.headers.get("Cookie"))
+        if self.server.status != 200:
+            payload = b"nope"
+        else:
+            payload = json.dumps({"data": {"echo": body.get("variables")}}).encode()
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stash_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StashHandler)
+    server.cookies = []
+    server.status = 200
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _fragment(server):
+    return {
+        "Scheme": "http",
+        "Host": "127.0.0.1",
+        "Port": server.server_address[1],
+        "SessionCookie": {"Value": "abc"},
+    }
+
+
+class TestGraphQLClient:
+    def test_returns_data(self, stash_server):
+        client = GraphQLClient(_fragment(stash_server))
+        assert client.call("query X { x }", {"id": 1}) == {"echo": {"id": 1}}
+
+    def test_session_cookie_sent(self, stash_server):
+        client = GraphQLClient(_fragment(stash_server))
+        client.call("query X { x }")
+        assert stash_server.cookies == ["session=abc"]
+
+    def test_connection_reused(self, stash_server):
+        client = GraphQLClient(_fragment(stash_server))
+        for i in range(5):
+            client.call("query X { x }", {"i": i})
+        stats = client.connection_stats()
+        assert stats == {"requests": 5, "opened": 1, "reused": 4}
+
+    def test_http_error_raises(self, stash_server):
+        stash_server.status = 500
+        client = GraphQLClient(_fragment(stash_server))
+        with pytest.raises(ConnectionError):
+            client.call("query X { x }")
+
+    def test_unauthorised_is_fatal(self, stash_server):
+        stash_server.status = 401
+        fatal = []
+        client = GraphQLClient(_fragment(stash_server), on_fatal=fatal.append)
+        with pytest.raises(ConnectionError):
+            client.call("query X { x }")
+        assert fatal == ["HTTP Error 401, Unauthorised."]
+
+    def test_calls_by_operation(self, stash_server):
+        client = GraphQLClient(_fragment(stash_server))
+        client.call("query FindScene($id: ID!) { x }")
+        with client.scene_calls() as calls:
+            client.call("query FindStudio($id: ID!) { x }")
+            client.call("query FindStudio($id: ID!) { x }")
+            # other threads don't count in this scene
+            thread = threading.Thread(target=client.call, args=("mutation BulkSceneUpdate { x }",))
+            thread.start()
+            thread.join()
+        client.call("{ systemStatus { databaseSchema } }")
+        assert calls == {"FindStudio": 2}
+        assert client.calls == {"FindScene": 1, "FindStudio": 2, "BulkSceneUpdate": 1, "systemStatus": 1}
+        client.merge_calls({"FindStudio": 3})
+        assert client.calls["FindStudio"] == 5
+
+    def test_operation_name(self):
+        assert operation_name("\n    query FindScenesByPath($filter: FindFilterType) {") == "FindScenesByPath"
+        assert operation_name("\n        {\n            systemStatus {") == "systemStatus"
+        assert operation_name("garbage") == "unknown"
+
+    def test_localhost_rewrite(self):
+        client = GraphQLClient({"Scheme": "http", "Host": "0.0.0.0", "Port": 9999})
+        assert client.url == "http://localhost:9999/graphql"
+
+
+def _pager(total):
+    calls = []
+
+    def fetch_page(page, per_page):
+        calls.append((page, per_page))
+        start = (page - 1) * per_page
+        return {"count": total, "scenes": list(range(start, min(start + per_page, total)))}
+
+    return fetch_page, calls
+
+
+class TestPageStream:
+    def test_streams_all_pages(self):
+        fetch_page, calls = _pager(25)
+        stream = PageStream(fetch_page, "scenes", page_size=10)
+        assert stream.count == 25
+        assert list(stream) == list(range(25))
+        assert calls == [(1, 10), (2, 10), (3, 10)]
+
+    def test_exact_multiple_stops_without_extra_query(self):
+        fetch_page, calls = _pager(20)
+        assert list(PageStream(fetch_page, "scenes", page_size=10)) == list(range(20))
+        assert len(calls) == 2
+
+    def test_limit(self):
+        fetch_page, calls = _pager(100)
+        stream = PageStream(fetch_page, "scenes", page_size=10, limit=15)
+        assert stream.count == 15
+        assert list(stream) == list(range(15))
+
+    def test_limit_smaller_than_page(self):
+        fetch_page, calls = _pager(100)
+        assert list(PageStream(fetch_page, "scenes", page_size=10, limit=3)) == [0, 1, 2]
+        assert calls == [(1, 3)]
+
+    def test_empty(self):
+        fetch_page, _ = _pager(0)
+        stream = PageStream(fetch_page, "scenes", page_size=10)
+        assert stream.count == 0
+        assert list(stream) == []
+
+    def test_start_page(self):
+        fetch_page, _ = _pager(25)
+        assert list(PageStream(fetch_page, "scenes", page_size=10, start_page=3)) == list(range(20, 25))
@@ -0,0 +1,96 @@
+"""
+Unit tests for journal.py
+"""
+
+from unittest import mock
+
+import journal
+from journal import MOVED, REVERTED, UNDONE, Journal, moves_to_undo, read_journal
+
+
+class TestJournal:
+    def test_records_are_buffered_until_sync(self, tmp_path):
+        path = tmp_path / "rename_log.txt"
+        j = Journal(str(path), "run1", sync_every=3, sync_ms=0)
+        with mock.patch.object(journal.os, "fsync") as fsync:
+            j.record("/a/1.mp4", "/b/1.mp4", scene_id="1", file_id="10", oshash="h1")
+            j.record("/a/1.srt", "/b/1.srt", scene_id="1", kind="associated")
+            assert fsync.call_count == 0
+            assert path.read_text() == ""
+            j.record("/a/2.mp4", "/b/2.mp4", scene_id="2")
+            assert fsync.call_count == 1
+            assert len(path.read_text().splitlines()) == 3
+            j.record("/a/3.mp4", "/b/3.mp4", scene_id="3")
+            j.close()
+            assert fsync.call_count == 2
+        records = read_journal(str(path))
+        assert [r["new"] for r in records] == ["/b/1.mp4", "/b/1.srt", "/b/2.mp4", "/b/3.mp4"]
+        assert records[0]["file_id"] == "10"
+        assert records[0]["oshash"] == "h1"
+        assert records[1]["kind"] == "associated"
+        assert {r["run"] for r in records} == {"run1"}
+
+    def test_time_based_sync(self, tmp_path):
+        j = Journal(str(tmp_path / "log"), sync_every=0, sync_ms=500)
+        j.record("/a", "/b")
+        assert (tmp_path / "log").read_text() == ""
+        # half a second later
+        j._last_sync -= 0.5
+        j.record("/c", "/d")
+        assert (tmp_path / "log").read_text().count("\n") == 2
+
+    def test_no_file_until_first_record(self, tmp_path):
+        j = Journal(str(tmp_path / "log"))
+        j.close()
+        assert not (tmp_path / "log").exists()
+
+    def test_cut_last_line_and_legacy_lines(self, tmp_path):
+        path = tmp_path / "log"
+        path.write_text(
+            "5|/a/old.mp4|/a/new.mp4|abc\n"
+            "5|/a/old.srt|/a/new.srt\n"
+            '{"run": "r", "status": "moved", "old": "/x", "new": "/y"}\n'
+            '{"run": "r", "status": "mov'
+        )
+        records = read_journal(str(path))
+        assert len(records) == 3
+        assert records[0]["run"] == "legacy"
+        assert records[0]["oshash"] == "abc"
+        assert records[1]["kind"] == "associated"
+
+
+def _move(run, old, new, status=MOVED):
+    return {"run": run, "status": status, "old": old, "new": new}
+
+
+class TestMovesToUndo:
+    def test_last_run_newest_first(self):
+        records = [
+            _move("r1", "/a", "/b"),
+            _move("r2", "/c", "/d"),
+            _move("r2", "/e", "/f"),
+        ]
+        assert [m["old"] for m in moves_to_undo(records)] == ["/e", "/c"]
+
+    def test_reverted_and_undone_moves_are_skipped(self):
+        records = [
+            _move("r1", "/a", "/b"),
+            _move("r2", "/c", "/d"),
+            _move("r2", "/d", "/c", REVERTED),
+            _move("r2", "/e", "/f"),
+            _move("u", "/f", "/e", UNDONE),
+        ]
+        # run r2 is fully moved back, the previous run comes next
+        assert [m["old"] for m in moves_to_undo(records)] == ["/a"]
+
+    def test_legacy_lines_are_not_undone(self):
+        records = [
+            _move("legacy", "/a", "/b"),
+            _move("r1", "/c", "/d"),
+            _move("legacy", "/e", "/f"),
+        ]
+        assert [m["old"] for m in moves_to_undo(records)] == ["/c"]
+        assert moves_to_undo(records[:1]) == []
+
+    def test_nothing_to_undo(self):
+        assert moves_to_undo([_move("r1", "/a", "/b"), _move("u", "/b", "/a", UNDONE)]) == []
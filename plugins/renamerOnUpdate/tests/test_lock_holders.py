@@ -0,0 +1,64 @@
+"""
+Unit tests for lock_holders.py
+"""
+
+from types import SimpleNamespace
+
+from lock_holders import LockHolderIndex
+
+
+def _psutil(open_files: dict):
+    # open_files: {pid: [paths]}, None when the process can't be inspected
+    class FakeProcess:
+        def __init__(self, pid, paths):
+            self.pid = pid
+            self.paths = paths
+
+        def open_files(self):
+            if self.paths is None:
+                raise PermissionError("access denied")
+            return [SimpleNamespace(path=p) for p in self.paths]
+
+    calls = []
+
+    def process_iter():
+        calls.append(1)
+        return [FakeProcess(pid, paths) for pid, paths in open_files.items()]
+
+    return SimpleNamespace(process_iter=process_iter), calls
+
+
+class TestLockHolderIndex:
+    def test_single_scan(self):
+        psutil, calls = _psutil({1: None, 5: ["/a.mp4"], 6: ["/a.mp4", "/b.mp4"]})
+        index = LockHolderIndex(psutil)
+        assert index.holders("/a.mp4") == [5, 6]
+        assert index.holders("/b.mp4") == [6]
+        assert len(calls) == 1
+
+    def test_refresh_on_miss(self):
+        open_files = {10: ["/a.mp4"]}
+        psutil, calls = _psutil(open_files)
+        index = LockHolderIndex(psutil)
+        assert index.holders("/c.mp4") == []
+        open_files[30] = ["/c.mp4"]
+        assert index.holders("/a.mp4") == [10]
+        assert len(calls) == 1
+        assert index.holders("/c.mp4") == [30]
+        assert index.scans == 2
+
+    def test_clear_scans_again(self):
+        open_files = {10: ["/a.mp4"]}
+        psutil, _ = _psutil(open_files)
+        index = LockHolderIndex(psutil)
+        assert index.holders("/a.mp4") == [10]
+        # pid 10 ended, its number now belongs to another process
+        open_files[10] = []
+        index.clear()
+        assert index.holders("/a.mp4") == []
+        assert index.scans == 2
+
+    def test_unavailable(self):
+        index = LockHolderIndex(None)
+        assert not index.available
+        assert index.holders("/a.mp4") == []
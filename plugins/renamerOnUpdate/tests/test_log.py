@@ -0,0 +1,76 @@
+"""
+Unit tests for log.py
+"""
+
+import multiprocessing
+import os
+
+import pytest
+
+import log
+
+
+def _child_logs():
+    log.LogInfo("child")
+    log.flush()
+
+
+@pytest.fixture(autouse=True)
+def reset_log():
+    log.flush()
+    yield
+    log.flush()
+    log.configure()
+
+
+class TestLog:
+    def test_wire_format(self, capsys):
+        log.LogInfo("hello")
+        log.LogProgress(1.5)
+        log.flush()
+        assert capsys.readouterr().err == "\x01i\x02hello\n\n\x01p\x021\n\n"
+
+    def test_suppressed_messages_are_not_formatted(self, capsys):
+        log.configure("info")
+        called = []
+        log.LogDebug(lambda: called.append(1) or "costly")
+        log.LogTrace("%s", object())
+        log.LogInfo(lambda: "built")
+        log.flush()
+        assert called == []
+        assert capsys.readouterr().err == "\x01i\x02built\n\n"
+        assert not log.enabled("debug")
+
+    def test_percent_args(self, capsys):
+        log.LogDebug("[%s] Scene information: %s", "7", {"title": "x"})
+        log.LogDebug("100% done")
+        log.flush()
+        assert capsys.readouterr().err == (
+            "\x01d\x02[7] Scene information: {'title': 'x'}\n\n\x01d\x02100% done\n\n"
+        )
+
+    def test_batches(self, capsys):
+        log.configure(batch_size=3, flush_ms=60000)
+        log.LogInfo("1")
+        log.LogInfo("2")
+        assert capsys.readouterr().err == ""
+        log.LogInfo("3")
+        assert capsys.readouterr().err.count("\x01i\x02") == 3
+
+    def test_errors_are_written_at_once(self, capsys):
+        log.configure(batch_size=100, flush_ms=60000)
+        log.LogInfo("before")
+        log.LogError("failed")
+        assert capsys.readouterr().err == "\x01i\x02before\n\n\x01e\x02failed\n\n"
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="fork only")
+    def test_forked_process_starts_empty(self, capfd):
+        log.configure(batch_size=100, flush_ms=60000)
+        log.LogInfo("before fork")
+        with multiprocessing.get_context("fork").Pool(2) as pool:
+            pool.apply(_child_logs)
+            pool.apply(_child_logs)
+        log.flush()
+        err = capfd.readouterr().err
+        assert err.count("before fork") == 1
+        assert err.count("child") == 2
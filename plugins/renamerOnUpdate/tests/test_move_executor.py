@@ -0,0 +1,136 @@
+"""
+Unit tests for move_executor.py
+"""
+
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+import move_executor
+from move_executor import MoveExecutor, device_of
+
+# fake st_dev by path prefix: /a and /b are two disks
+DEVICES = {"/a": 1, "/b": 2, "/c": 3}
+
+
+def _fake_device(path):
+    return DEVICES[path[:2]]
+
+
+@pytest.fixture
+def fake_devices():
+    with mock.patch.object(move_executor, "device_of", _fake_device):
+        yield
+
+
+class TestDeviceOf:
+    def test_missing_destination_uses_parent(self, tmp_path):
+        assert device_of(str(tmp_path / "new" / "deeper" / "file.mp4")) == device_of(str(tmp_path))
+
+
+class TestMoveExecutor:
+    def test_group_order_is_kept(self, fake_devices):
+        done = []
+        lock = threading.Lock()
+
+        def move(item):
+            time.sleep(0.001)
+            with lock:
+                done.append(item)
+            return item * 10
+
+        items = [(i, "/a/src", "/b/dst" if i % 2 else "/a/dst") for i in range(40)]
+        with MoveExecutor(move, workers=4, max_pending=8) as executor:
+            results = list(executor.map(items))
+        assert sorted(item for item, _, _ in results) == list(range(40))
+        assert all(result == item * 10 for item, result, _ in results)
+        # each (src, dst) device group ran in submission order
+        assert [i for i in done if i % 2] == list(range(1, 40, 2))
+        assert [i for i in done if not i % 2] == list(range(0, 40, 2))
+
+    def test_move_into_a_path_being_left_waits(self, fake_devices):
+        # A leaves /a/x for another disk (slow copy), B renames /a/y to /a/x (instant)
+        done = []
+
+        def move(item):
+            if item == "A":
+                time.sleep(0.05)
+            done.append(item)
+
+        items = [("A", "/a/x", "/b/x"), ("B", "/a/y", "/a/x"), ("C", "/a/z", "/a/y")]
+        with MoveExecutor(move, workers=4) as executor:
+            list(executor.map(items))
+        assert done == ["A", "B", "C"]
+
+    def test_idle_while_waiting(self, fake_devices):
+        calls = []
+
+        def idle():
+            calls.append(time.perf_counter())
+            return 0.01
+
+        def move(item):
+            time.sleep(0.1)
+            return item
+
+        with MoveExecutor(move, workers=2) as executor:
+            results = list(executor.map([(1, "/a/src", "/b/dst")], idle))
+        assert [item for item, _, _ in results] == [1]
+        # called again and again during the slow move, not only once it ended
+        assert len(calls) >= 5
+
+    def test_inline(self, fake_devices):
+        threads = set()
+
+        def move(item):
+            threads.add(threading.get_ident())
+            if item == 1:
+                raise OSError("disk full")
+            return item
+
+        items = [(i, "/a/src", "/b/dst") for i in range(3)]
+        with MoveExecutor(move, workers=0) as executor:
+            results = list(executor.map(items))
+        assert threads == {threading.get_ident()}
+        assert [(item, result) for item, result, _ in results] == [(0, 0), (1, None), (2, 2)]
+        assert isinstance(results[1][2], OSError)
+
+    def test_per_device_limit(self, fake_devices):
+        running = {1: 0, 2: 0, 3: 0}
+        peak = {1: 0, 2: 0, 3: 0}
+        lock = threading.Lock()
+
+        def move(item):
+            devices = {_fake_device(item[0]), _fake_device(item[1])}
+            with lock:
+                for d in devices:
+                    running[d] += 1
+                    peak[d] = max(peak[d], running[d])
+            time.sleep(0.01)
+            with lock:
+                for d in devices:
+                    running[d] -= 1
+
+        # three groups all touching /a
+        items = [((s, d), s, d) for s, d in [("/a", "/b"), ("/a", "/c"), ("/a", "/a")] * 4]
+        with MoveExecutor(move, workers=3, per_device=1) as executor:
+            list(executor.map(items))
+        assert peak[1] == 1
+
+    def test_error_is_returned(self, fake_devices):
+        def move(item):
+            if item == 2:
+                raise OSError("disk full")
+            return item
+
+        with MoveExecutor(move) as executor:
+            results = {item: err for item, _, err in executor.map((i, "/a", "/b") for i in range(4))}
+        assert isinstance(results[2], OSError)
+        assert results[1] is None
+
+    def test_paths_not_created_yet(self):
+        with MoveExecutor(lambda item: item) as executor:
+            results = list(executor.map([(1, "/nonexistent/src.mp4", "/nonexistent/dst.mp4")]))
+        assert results == [(1, 1, None)]
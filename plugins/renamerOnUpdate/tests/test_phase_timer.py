@@ -0,0 +1,69 @@
+"""
+Unit tests for phase_timer.py
+"""
+
+import json
+import threading
+
+from phase_timer import PhaseTimer, percentile
+
+
+class TestPhaseTimer:
+    def test_summary(self):
+        timer = PhaseTimer()
+        for i in range(1, 101):
+            timer.add("move", i / 1000, str(i))
+        timer.add("fetch", 0.5)
+        timer.add("db", 0.2, "100")
+        summary = timer.summary(slowest=2)
+        # phases in pipeline order
+        assert list(summary["phases"]) == ["fetch", "move", "db"]
+        move = summary["phases"]["move"]
+        assert move["count"] == 100
+        assert move["p50"] == 0.05
+        assert move["p95"] == 0.095
+        assert move["max"] == 0.1
+        assert [s["scene_id"] for s in summary["slowest_scenes"]] == ["100", "99"]
+        assert summary["slowest_scenes"][0]["phases"] == {"move": 0.1, "db": 0.2}
+
+    def test_measure_and_threads(self):
+        timer = PhaseTimer()
+
+        def work():
+            for _ in range(200):
+                with timer.measure("move", "1"):
+                    pass
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert timer.summary()["phases"]["move"]["count"] == 800
+
+    def test_export_merge(self):
+        worker = PhaseTimer()
+        worker.add("extract_info", 0.01, "5")
+        main = PhaseTimer()
+        main.add("extract_info", 0.03, "5")
+        main.merge(worker.export())
+        assert not worker
+        assert main.summary()["phases"]["extract_info"]["count"] == 2
+        assert main.scenes["5"]["extract_info"] == 0.04
+
+    def test_report_and_json(self, tmp_path):
+        timer = PhaseTimer()
+        assert not timer
+        timer.add("db", 0.004, "9")
+        lines = timer.report()
+        assert lines[1].split() == ["db", "1", "0.00", "4.0", "4.0", "4.0"]
+        assert lines[-1] == "Slow scene 9: 4 ms (db 4 ms)"
+        path = tmp_path / "timing.json"
+        timer.write_json(str(path))
+        assert json.loads(path.read_text())["phases"]["db"]["count"] == 1
+
+
+def test_percentile():
+    assert percentile([], 0.5) == 0.0
+    assert percentile([1.0], 0.95) == 1.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.5) == 2.0
@@ -0,0 +1,37 @@
+"""
+Unit tests for profiling.py
+"""
+
+import pstats
+import tracemalloc
+
+from profiling import Profiler
+
+
+def plan_something():
+    return [str(i) * 10 for i in range(20000)]
+
+
+class TestProfiler:
+    def test_write(self, tmp_path):
+        profiler = Profiler().start()
+        kept = plan_something()
+        prof, report = tmp_path / "renamerOnUpdate.prof", tmp_path / "renamerOnUpdate_profile.txt"
+        profiler.write(str(prof), str(report), top=5)
+        assert not tracemalloc.is_tracing()
+        functions = {name for _, _, name in pstats.Stats(str(prof)).stats}
+        assert "plan_something" in functions
+        lines = report.read_text(encoding="utf-8").splitlines()
+        assert lines[0].startswith("Profiled ")
+        # the list still allocated is the biggest allocation
+        assert "test_profiling.py:12" in lines[3]
+        assert "Top 5 functions by cumulative time" in lines
+        assert len(kept) == 20000
+
+    def test_stop_once(self):
+        profiler = Profiler().start()
+        profiler.stop()
+        snapshot = profiler.snapshot
+        profiler.stop()
+        assert profiler.snapshot is snapshot
+        assert profiler.peak >= 0
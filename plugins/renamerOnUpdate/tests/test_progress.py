@@ -0,0 +1,59 @@
+"""
+Unit tests for progress.py
+"""
+
+from progress import ProgressReporter, format_duration
+
+
+class TestProgressReporter:
+    def test_sent_by_step(self):
+        sent = []
+        reporter = ProgressReporter(10000, sent.append, step=0.1, interval=3600)
+        for _ in range(10000):
+            reporter.advance()
+        reporter.finish()
+        # first item, then every 10%
+        assert len(sent) <= 11
+        assert sent[-1] == 1.0
+        assert sent == sorted(sent)
+
+    def test_sent_by_interval(self):
+        sent = []
+        reporter = ProgressReporter(1000, sent.append, step=1, interval=2)
+        reporter.advance()
+        reporter.advance()
+        assert len(sent) == 1
+        reporter._last_sent -= 2
+        reporter.advance()
+        assert sent[-1] == 0.003
+
+    def test_range_and_resumed_items(self):
+        sent = []
+        reporter = ProgressReporter(100, sent.append, start=0.5, end=1.0, done=50)
+        reporter.advance()
+        assert sent == [0.755]
+        assert reporter.rate() > 0
+
+    def test_info_lines(self):
+        lines = []
+        reporter = ProgressReporter(200, lambda value: None, lines.append, info_interval=30)
+        reporter.advance()
+        assert lines == []
+        reporter._started -= 30
+        reporter._last_info -= 30
+        reporter.advance()
+        assert lines[0].startswith("Progress: 2/200 scenes (1.0%), ")
+        assert "ETA 49m30s" in lines[0]
+        reporter.finish()
+        assert lines[-1].startswith("Done: 2 scenes in 30s")
+
+    def test_empty_task(self):
+        sent = []
+        ProgressReporter(0, sent.append).finish()
+        assert sent == [1.0]
+
+
+def test_format_duration():
+    assert format_duration(42) == "42s"
+    assert format_duration(125) == "2m05s"
+    assert format_duration(7260) == "2h01m"
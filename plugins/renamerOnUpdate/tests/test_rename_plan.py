@@ -0,0 +1,113 @@
+"""
+Unit tests for rename_plan.py
+"""
+
+import os
+
+import pytest
+
+from rename_plan import PlanWriter, can_fork, iter_plan, make_entry, plan_map, read_plan
+
+
+def _info(current, new):
+    return {
+        "scene_id": "7",
+        "file_id": "12",
+        "file_index": 1,
+        "current_path": current,
+        "current_directory": os.path.dirname(current),
+        "current_filename": os.path.basename(current),
+        "new_directory": os.path.dirname(new),
+        "new_filename": os.path.basename(new),
+        "final_path": new,
+        "oshash": "abc",
+        "primary_file": False,
+        "title": "not part of the plan",
+    }
+
+
+def _square(x):
+    return x * x
+
+
+class TestMakeEntry:
+    def test_keeps_only_execution_keys(self):
+        entry = make_entry(_info("/a/x.mp4", "/a/y.mp4"), "_1", clean_tag=["3"])
+        assert "title" not in entry
+        assert entry["file_id"] == "12"
+        assert entry["suffix"] == "_1"
+        assert entry["clean_tag"] == ["3"]
+        assert entry["dry_run"] is False
+
+    @pytest.mark.parametrize(
+        "new, reason",
+        [("/a/y.mp4", "rename"), ("/b/x.mp4", "move"), ("/b/y.mp4", "move+rename")],
+    )
+    def test_reason(self, new, reason):
+        assert make_entry(_info("/a/x.mp4", new))["reason"] == reason
+
+
+class TestPlanFile:
+    def test_round_trip(self, tmp_path):
+        path = str(tmp_path / "plan.jsonl")
+        entries = [
+            make_entry(_info("/a/x.mp4", "/a/é.mp4")),
+            make_entry(_info("/a/z.mp4", "/b/z.mp4"), dry_run=True),
+        ]
+        with PlanWriter(path) as plan:
+            for entry in entries:
+                plan.write(entry)
+        assert plan.count == 2
+        assert list(read_plan(path)) == entries
+        assert not os.path.exists(path + ".tmp")
+
+    def test_interrupted_plan_keeps_previous(self, tmp_path):
+        path = tmp_path / "plan.jsonl"
+        path.write_text("{}\n")
+        with pytest.raises(RuntimeError):
+            with PlanWriter(str(path)) as plan:
+                plan.write(make_entry(_info("/a/x.mp4", "/a/y.mp4")))
+                raise RuntimeError("stop")
+        assert path.read_text() == "{}\n"
+        assert not os.path.exists(str(path) + ".tmp")
+
+    def test_resume_cuts_after_offset(self, tmp_path):
+        path = str(tmp_path / "plan.jsonl")
+        first = make_entry(_info("/a/1.mp4", "/b/1.mp4"))
+        plan = PlanWriter(path)
+        plan.write(first)
+        offset = plan.offset()
+        # written after the last checkpoint, then the run was killed
+        plan.write(make_entry(_info("/a/2.mp4", "/b/2.mp4")))
+        plan._file.close()
+        plan = PlanWriter(path, offset)
+        assert plan.resumed and plan.count == 1
+        plan.write(make_entry(_info("/a/3.mp4", "/b/3.mp4")))
+        plan.close()
+        assert [e["current_path"] for e in read_plan(path)] == ["/a/1.mp4", "/a/3.mp4"]
+
+    def test_resume_without_tmp_starts_over(self, tmp_path):
+        plan = PlanWriter(str(tmp_path / "plan.jsonl"), 100)
+        assert not plan.resumed and plan.count == 0
+        plan.discard()
+
+    def test_iter_plan_offsets(self, tmp_path):
+        path = str(tmp_path / "plan.jsonl")
+        with PlanWriter(path) as plan:
+            for name in ("1", "2", "3"):
+                plan.write(make_entry(_info(f"/a/{name}.mp4", f"/b/{name}.mp4")))
+        offsets = [end for _, end in iter_plan(path)]
+        assert offsets[-1] == os.path.getsize(path)
+        rest = [e["current_path"] for e, _ in iter_plan(path, offsets[0])]
+        assert rest == ["/a/2.mp4", "/a/3.mp4"]
+
+
+class TestPlanMap:
+    def test_sequential(self):
+        assert list(plan_map(_square, iter(range(5)))) == [0, 1, 4, 9, 16]
+
+    @pytest.mark.skipif(not can_fork(), reason="fork not available")
+    def test_pool_keeps_order(self):
+        assert list(plan_map(_square, iter(range(100)), workers=3, chunksize=7)) == [
+            x * x for x in range(100)
+        ]
@@ -0,0 +1,104 @@
+"""
+Unit tests for run_state.py
+"""
+
+import os
+from types import ModuleType
+
+from run_state import (
+    Checkpoint,
+    OrderedProgress,
+    config_hash,
+    load_watermark,
+    read_json,
+    save_watermark,
+    write_json,
+)
+
+
+def _config(**values):
+    config = ModuleType("config")
+    config.os = os
+    for name, value in values.items():
+        setattr(config, name, value)
+    return config
+
+
+class TestConfigHash:
+    def test_same_settings_same_hash(self):
+        a = _config(default_template="$date $title", tags_splitchar=" ")
+        b = _config(tags_splitchar=" ", default_template="$date $title")
+        assert config_hash(a) == config_hash(b)
+
+    def test_template_change(self):
+        assert config_hash(_config(default_template="$date $title")) != config_hash(
+            _config(default_template="$title")
+        )
+
+    def test_operational_settings_ignored(self):
+        a = _config(default_template="$title", dry_run=False, batch_page_size=500)
+        b = _config(default_template="$title", dry_run=True, batch_page_size=100)
+        assert config_hash(a) == config_hash(b)
+
+    def test_code_change(self, tmp_path):
+        code = tmp_path / "renamer.py"
+        code.write_text("v1")
+        before = config_hash(_config(), [str(code)])
+        code.write_text("v2")
+        assert config_hash(_config(), [str(code)]) != before
+
+
+class TestWatermark:
+    def test_round_trip(self, tmp_path):
+        path = str(tmp_path / "state.json")
+        assert load_watermark(path, "h1") is None
+        save_watermark(path, "2024-05-01T10:00:00+02:00", "h1")
+        # a scene updated in the same second is checked by the next run
+        assert load_watermark(path, "h1") == "2024-05-01T09:59:59+02:00"
+        # another config: full run
+        assert load_watermark(path, "h2") is None
+
+    def test_utc(self, tmp_path):
+        path = str(tmp_path / "state.json")
+        save_watermark(path, "2024-01-01T00:00:00Z", "h1")
+        assert load_watermark(path, "h1") == "2023-12-31T23:59:59+00:00"
+
+    def test_corrupted_state(self, tmp_path):
+        path = tmp_path / "state.json"
+        path.write_text("{not json")
+        assert load_watermark(str(path), "h1") is None
+
+    def test_atomic_write(self, tmp_path):
+        path = str(tmp_path / "state.json")
+        write_json(path, {"a": 1})
+        assert read_json(path) == {"a": 1}
+        assert not os.path.exists(path + ".tmp")
+
+
+class TestCheckpoint:
+    def test_save_load_clear(self, tmp_path):
+        path = str(tmp_path / "checkpoint.json")
+        checkpoint = Checkpoint(path, {"phase": "plan", "last_scene_id": 0}, interval=60)
+        assert not checkpoint.due()
+        checkpoint.save(last_scene_id=42)
+        assert Checkpoint.load(path) == {"phase": "plan", "last_scene_id": 42}
+        checkpoint.clear()
+        checkpoint.clear()
+        assert Checkpoint.load(path) is None
+
+    def test_due_after_interval(self, tmp_path):
+        checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"), {}, interval=5)
+        checkpoint._last_save -= 5
+        assert checkpoint.due()
+        checkpoint.save()
+        assert not checkpoint.due()
+
+
+class TestOrderedProgress:
+    def test_position_waits_for_earlier_items(self):
+        done = OrderedProgress(10)
+        for offset in (20, 30, 40):
+            done.submitted(offset)
+        assert done.finished(30) == 10
+        assert done.finished(20) == 30
+        assert done.finished(40) == 40
@@ -0,0 +1,94 @@
+"""
+Unit tests for studio_registry.py
+"""
+
+from studio_registry import StudioRegistry
+
+# Network > Site > Subsite, plus an unrelated studio
+STUDIOS = {
+    "1": {"id": "1", "name": "Network", "parent_studio": None},
+    "2": {"id": "2", "name": "Site", "parent_studio": {"id": "1", "name": "Network"}},
+    "3": {"id": "3", "name": "Subsite", "parent_studio": {"id": "2", "name": "Site"}},
+    "4": {"id": "4", "name": "Other", "parent_studio": None},
+}
+
+
+def _registry():
+    calls = []
+
+    def find_studio(studio_id):
+        calls.append(("findStudio", studio_id))
+        return STUDIOS.get(str(studio_id))
+
+    def find_studios(page, per_page):
+        calls.append(("findStudios", page))
+        studios = list(STUDIOS.values())[(page - 1) * per_page:page * per_page]
+        return {"count": len(STUDIOS), "studios": studios}
+
+    return StudioRegistry(find_studio, find_studios), calls
+
+
+class TestStudioRegistry:
+    def test_lazy_ancestors_memoized(self):
+        registry, calls = _registry()
+        names = [s["name"] for s in registry.ancestors("3")]
+        assert names == ["Site", "Network"]
+        registry.ancestors("3")
+        registry.ancestors("2")
+        assert len(calls) == 3
+        assert registry.calls_avoided > 0
+
+    def test_remember_skips_own_lookup(self):
+        registry, calls = _registry()
+        registry.remember(STUDIOS["3"])
+        registry.ancestors("3")
+        assert ("findStudio", "3") not in calls
+
+    def test_changed_studio_refreshes_its_chain(self):
+        registry, calls = _registry()
+        registry.ancestors("3")
+        registry.ancestors("4")
+        # Site renamed, as the next scene query returns it
+        registry.remember({"id": "3", "name": "Subsite", "parent_studio": {"id": "2", "name": "Site 2"}})
+        calls.clear()
+        assert [s["name"] for s in registry.ancestors("3")] == ["Site", "Network"]
+        assert calls == [("findStudio", "2"), ("findStudio", "1")]
+        # moved under another parent, still cached
+        registry.remember({"id": "3", "name": "Subsite", "parent_studio": {"id": "4", "name": "Other"}})
+        calls.clear()
+        assert [s["name"] for s in registry.ancestors("3")] == ["Other"]
+        assert calls == []
+
+    def test_unchanged_studio_stays_cached(self):
+        registry, calls = _registry()
+        registry.ancestors("3")
+        registry.remember(STUDIOS["3"])
+        registry.ancestors("3")
+        assert len(calls) == 3
+
+    def test_preload_serves_everything(self):
+        registry, calls = _registry()
+        assert registry.preload(page_size=3) == 4
+        assert calls == [("findStudios", 1), ("findStudios", 2)]
+        assert [s["name"] for s in registry.ancestors("3")] == ["Site", "Network"]
+        assert registry.get("2") == {
+            "id": "2",
+            "name": "Site",
+            "parent_studio": {"id": "1", "name": "Network"},
+        }
+        assert len(calls) == 2
+
+    def test_root_has_no_ancestors(self):
+        registry, _ = _registry()
+        assert registry.ancestors("4") == []
+
+    def test_unknown_studio(self):
+        registry, _ = _registry()
+        assert registry.get("99") is None
+        assert registry.ancestors("99") == []
+
+    def test_cycle_stops(self):
+        registry = StudioRegistry(lambda _id: None)
+        registry.remember({"id": "1", "name": "A", "parent_studio": {"id": "2"}})
+        registry.remember({"id": "2", "name": "B", "parent_studio": {"id": "1"}})
+        assert [s["name"] for s in registry.ancestors("1")] == ["B"]
@@ -0,0 +1,147 @@
+"""
+Unit tests for template_engine.py
+
+The compiled templates must render exactly like the previous
+str.replace-based field_replacer, which is replicated here as the reference.
+"""
+
+import re
+
+import pytest
+
+from template_engine import compile_template, template_fields
+
+
+def field_replacer(text: str, scene_information: dict, FIELD_REPLACER=None, PREVENT_TITLE_PERF=False):
+    """Replicated from renamerOnUpdate.py before templates were compiled."""
+    FIELD_REPLACER = FIELD_REPLACER or {}
+    field_found = re.findall(r"\$\w+", text)
+    result = text
+    title = None
+    replaced_word = ""
+    if field_found:
+        field_found.sort(key=len, reverse=True)
+    for i in range(0, len(field_found)):
+        f = field_found[i].replace("$", "").strip("_")
+        if (
+            f == "performer"
+            and len(field_found) > i + 1
+            and scene_information.get("performer")
+        ):
+            if (
+                field_found[i + 1] == "$title"
+                and scene_information.get("title")
+                and PREVENT_TITLE_PERF
+            ):
+                if re.search(
+                    f"^{scene_information['performer'].lower()}",
+                    scene_information["title"].lower(),
+                ):
+                    result = result.replace("$performer", "")
+                    continue
+        replaced_word = scene_information.get(f)
+        if not replaced_word:
+            replaced_word = ""
+        if FIELD_REPLACER.get(f"${f}"):
+            replaced_word = replaced_word.replace(
+                FIELD_REPLACER[f"${f}"]["replace"], FIELD_REPLACER[f"${f}"]["with"]
+            )
+        if f == "title":
+            title = replaced_word.strip()
+            continue
+        if replaced_word == "":
+            result = result.replace(field_found[i], replaced_word)
+        else:
+            result = result.replace(f"${f}", replaced_word)
+    return result, title
+
+
+INFO = {
+    "title": "Her Fantasy Ball",
+    "date": "2016-12-29",
+    "date_format": "29.12.2016",
+    "year": "2016",
+    "performer": "Eva Lovia",
+    "performer_path": "Eva Lovia",
+    "studio": "Sneaky Sex",
+    "parent_studio": "Reality Kings",
+    "studio_family": "Reality Kings",
+    "height": "1080p",
+    "tags": "Blowjob Cumshot",
+}
+
+TEMPLATES = [
+    "$title",
+    "$date $title",
+    "$date.$title",
+    "$year $title $height",
+    "$year_$title-$height",
+    "$date $performer - $title [$studio]",
+    "$parent_studio $date $performer - $title",
+    "$date $title - $tags",
+    "{[$studio] }{$date - }$title",
+    "[$studio_family] $date_format $title",
+    "$movie_title $title",
+    "no field at all",
+    "",
+]
+
+
+class TestCompiledTemplateParity:
+    @pytest.mark.parametrize("template", TEMPLATES)
+    def test_same_as_field_replacer(self, template):
+        assert compile_template(template).render(INFO) == field_replacer(template, INFO)
+
+    @pytest.mark.parametrize("template", TEMPLATES)
+    def test_same_with_missing_fields(self, template):
+        info = {"title": "Only Title"}
+        assert compile_template(template).render(info) == field_replacer(template, info)
+
+    def test_field_replacer_option(self):
+        replacer = {"$studio": {"replace": " ", "with": ""}}
+        template = "$date [$studio] $title"
+        assert compile_template(template).render(INFO, replacer) == field_replacer(template, INFO, replacer)
+
+    def test_performer_before_title(self):
+        info = dict(INFO, title="Eva Lovia in Her Fantasy Ball")
+        template = "$date $performer - $title"
+        rendered = compile_template(template).render(info, prevent_title_performer=True)
+        assert rendered == field_replacer(template, info, PREVENT_TITLE_PERF=True)
+        assert rendered[0] == "2016-12-29  - $title"
+
+    def test_performer_after_title_kept(self):
+        # the rule only applies when $performer comes right before $title
+        info = dict(INFO, title="Eva Lovia in Her Fantasy Ball")
+        rendered, _ = compile_template("$title - $performer").render(info, prevent_title_performer=True)
+        assert rendered == "$title - Eva Lovia"
+
+
+class TestCompileTemplate:
+    def test_cached(self):
+        assert compile_template("$date $title") is compile_template("$date $title")
+
+    def test_path_uses_performer_path(self):
+        compiled = compile_template("$studio/$performer", path=True)
+        assert compiled.fields == {"studio", "performer_path"}
+
+    def test_fields(self):
+        assert compile_template("{[$studio] }$year_$title").fields == {"studio", "year", "title"}
+
+    def test_required_excludes_optional_groups(self):
+        assert compile_template("{[$studio] }{$date - }$title").required == ["$title"]
+
+    def test_non_string_value(self):
+        rendered, _ = compile_template("$movie_title $movie_index").render({"movie_title": "M", "movie_index": 3})
+        assert rendered == "M 3"
+
+
+class TestTemplateFields:
+    def test_filename_and_path(self):
+        fields = template_fields("$date $title", r"/data/$studio_hierarchy/$performer")
+        assert fields == {"date", "title", "studio_hierarchy", "performer_path"}
+
+    def test_no_template(self):
+        assert template_fields(None, None) == set()
+
+    def test_simple_template_skips_expensive_fields(self):
+        assert "studio_hierarchy" not in template_fields("$date $title")
@@ -14,6 +14,7 @@ from config_operations import ConfigOperations
 from db_operations import DBOperations
 from file_operations import FileOperations
 from graphql_custom import graphql_getBuild
+from progress import ProgressReporter
 from scene_information import SceneInformation
 from text_operations import TextOperations, remove_consecutive
 
@@ -50,6 +51,8 @@ FRAGMENT = json.loads(sys.stdin.read())
 FRAGMENT_SERVER = FRAGMENT["server_connection"]
 PLUGIN_DIR = FRAGMENT_SERVER["PluginDir"]
 PLUGIN_ARGS = FRAGMENT["args"].get("mode")
+# set by the 'Profile rename' task only
+PROFILER = None
 
 stash_scheme = FRAGMENT_SERVER["Scheme"]
 stash_domain = FRAGMENT_SERVER["Host"]
@@ -430,9 +433,24 @@ def renamer_ng(scene_id):
     return None
 
 
+def write_profile():
+    # next to the log file, or in the plugin folder
+    folder = os.path.dirname(config.log_file) if config.log_file else PLUGIN_DIR
+    prof_path = os.path.join(folder, "renamerOnUpdateDevelop.prof")
+    report_path = os.path.join(folder, "renamerOnUpdateDevelop_profile.txt")
+    try:
+        PROFILER.write(prof_path, report_path, getattr(config, "profile_top", 25))
+    except OSError as err:
+        log.warning(f"Can't write the profile ({err})")
+        return
+    log.info(f"Profile written to {prof_path}, top allocations and functions in {report_path}")
+
+
 def exit_plugin(msg=None, _error=None):
     if msg is None and _error is None:
         msg = "plugin ended"
+    if PROFILER:
+        write_profile()
     log.debug("Execution time: {}s".format(round(time.time() - START_TIME, 5)))
     output_json = {"output": msg, "error": _error}
     print(json.dumps(output_json))
@@ -479,18 +497,24 @@ DB_VERSION = graphql_getBuild(FRAGMENT_SERVER)
 
 if PLUGIN_ARGS:
     if "bulk" in PLUGIN_ARGS:
-        scenes = stash.find_scene(config.batch_number_scene, "ASC")
+        limit = config.batch_number_scene
+        if "bulk_profile" in PLUGIN_ARGS:
+            from profiling import Profiler
+
+            limit = getattr(config, "profile_scenes", 200)
+            PROFILER = Profiler().start()
+            log.info(f"Profiling the renaming of {limit} scene(s)")
+        scenes = stash.find_scene(limit, "ASC")
         log.debug(f"Count scenes: {len(scenes["scenes"])}")
-        progress = 0
-        progress_step = 1 / len(scenes["scenes"])
+        reporter = ProgressReporter(len(scenes["scenes"]), log.progress, log.info)
         for scene in scenes["scenes"]:
             log.debug(f"** Checking scene: {scene["title"]} - {scene["id"]} **")
             try:
                 renamer_ng(scene)
             except Exception as err:
                 log.error(f"main function error: {err}")
-            progress += progress_step
-            log.progress(progress)
+            reporter.advance()
+        reporter.finish()
 else:
     try:
         renamer_ng(FRAGMENT_SCENE_ID)
@@ -248,6 +248,11 @@ alt_diff_display = False
 
 # number of scene process by the task renamer. -1 = all scenes
 batch_number_scene = -1
+# the 'Profile rename' task renames the first profile_scenes scenes (dry_run is respected) under cProfile
+# and tracemalloc, then writes renamerOnUpdateDevelop.prof and renamerOnUpdateDevelop_profile.txt
+# (next to log_file, or in the plugin folder) with the profile_top biggest allocations and slowest functions.
+profile_scenes = 200
+profile_top = 25
 
 # disable/enable the hook. You can edit this value in 'Plugin Tasks' inside of Stash.
 enable_hook = True